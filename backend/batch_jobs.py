@@ -0,0 +1,300 @@
+import asyncio
+import logging
+import uuid
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from pymongo import ASCENDING
+
+logger = logging.getLogger(__name__)
+
+Schedule = Tuple[str, List[Dict[str, Any]]]
+
+DONE = "done"
+FAILED = "failed"
+PENDING = "pending"
+
+
+class RunningJob:
+    def __init__(self, job_id: str, key_items: Dict[str, List[str]]):
+        self.job_id = job_id
+        self.key_items = key_items
+        self.subscribers: List[asyncio.Queue] = []
+        self.task: Optional[asyncio.Task] = None
+        # Resolved once the lease is claimed (True) or lost to another worker (False)
+        self.claimed: asyncio.Future = asyncio.get_running_loop().create_future()
+
+    def publish(self, event: Optional[Dict[str, Any]]) -> None:
+        for queue in self.subscribers:
+            queue.put_nowait(event)
+
+
+class BatchJobRunner:
+    """Runs recommendation batches in the background and keeps their state in Mongo.
+
+    ``jobs`` holds one status document per job, ``items`` maps every submitted
+    schedule to its dedup key and ``results`` holds one document per unique key.
+    A job that was interrupted (e.g. by a restart) resumes with the keys that
+    are not done yet.
+
+    A worker process runs a job only while it holds the job's lease: ``owner``
+    and ``lease_expires_at`` on the job document, claimed atomically and
+    renewed every ``lease_seconds / 3``. A job whose worker died can be resumed
+    elsewhere once its lease has expired.
+    """
+
+    def __init__(self, jobs, items, results, generate: Callable[[List[Dict[str, Any]]], Awaitable[str]],
+                 concurrency: int = 8, lease_seconds: float = 60.0):
+        self.jobs = jobs
+        self.items = items
+        self.results = results
+        self.generate = generate
+        self.concurrency = concurrency
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+        self._running: Dict[str, RunningJob] = {}
+
+    async def ensure_indexes(self) -> None:
+        await self.items.create_index([("job_id", ASCENDING), ("seq", ASCENDING)], name="job_id_seq")
+        await self.results.create_index([("job_id", ASCENDING), ("status", ASCENDING)], name="job_id_status")
+
+    async def create(self, schedules: List[Schedule], key_fn: Callable[[List[Dict[str, Any]]], str]) -> Dict[str, Any]:
+        job_id = str(uuid.uuid4())
+        now = datetime.utcnow()
+        unique: Dict[str, List[Dict[str, Any]]] = {}
+        items = []
+        for seq, (item_id, medications) in enumerate(schedules):
+            key = key_fn(medications)
+            unique.setdefault(key, medications)
+            items.append({"job_id": job_id, "seq": seq, "item_id": item_id, "key": key})
+
+        job = {
+            "_id": job_id,
+            "status": PENDING,
+            "total": len(items),
+            "unique": len(unique),
+            "completed": 0,
+            "failed": 0,
+            "created_at": now,
+            "updated_at": now
+        }
+        await self.jobs.insert_one(job)
+        for offset in range(0, len(items), 1000):
+            await self.items.insert_many(items[offset:offset + 1000], ordered=False)
+        results = [
+            {"_id": f"{job_id}:{key}", "job_id": job_id, "key": key, "medications": medications, "status": PENDING}
+            for key, medications in unique.items()
+        ]
+        for offset in range(0, len(results), 1000):
+            await self.results.insert_many(results[offset:offset + 1000], ordered=False)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = await self.jobs.find_one({"_id": job_id})
+        if job is not None:
+            job["job_id"] = job.pop("_id")
+            job.pop("owner", None)
+            lease_expires_at = job.pop("lease_expires_at", None)
+            job["running"] = lease_expires_at is not None and lease_expires_at > datetime.utcnow()
+            if job["status"] == "running" and not job["running"]:
+                job["status"] = "interrupted"  # its worker died without releasing the lease
+        return job
+
+    async def start(self, job_id: str) -> Optional[asyncio.Queue]:
+        """Start (or join) a job and return a queue of result events; ``None`` marks the end.
+
+        Returns None when another worker process holds the job's lease, or when
+        the job has already completed without failures.
+        """
+        queue: asyncio.Queue = asyncio.Queue()
+        running = self._running.get(job_id)
+        if running is not None:
+            # Subscribe before waiting so no event is missed once the claim resolves
+            running.subscribers.append(queue)
+            if not await asyncio.shield(running.claimed):
+                running.subscribers.remove(queue)
+                return None
+            return queue
+
+        # Registered before the claim is awaited so a concurrent start() joins this one
+        running = RunningJob(job_id, {})
+        running.subscribers.append(queue)
+        self._running[job_id] = running
+        try:
+            claimed = await self._claim(job_id)
+            if claimed:
+                async for item in self.items.find({"job_id": job_id}, {"_id": 0, "item_id": 1, "key": 1}).sort("seq", ASCENDING):
+                    running.key_items.setdefault(item["key"], []).append(item["item_id"])
+        except BaseException:
+            self._running.pop(job_id, None)
+            running.claimed.set_result(False)
+            raise
+        if not claimed:
+            self._running.pop(job_id, None)
+            running.claimed.set_result(False)
+            return None
+        running.task = asyncio.create_task(self._run(running))
+        running.claimed.set_result(True)
+        return queue
+
+    async def stream(self, job_id: str, queue: asyncio.Queue) -> AsyncIterator[Dict[str, Any]]:
+        """Yield events from ``queue``; a disconnected client only stops listening, the job keeps running"""
+        try:
+            while True:
+                event = await queue.get()
+                if event is None:
+                    return
+                yield event
+        finally:
+            running = self._running.get(job_id)
+            if running is not None and queue in running.subscribers:
+                running.subscribers.remove(queue)
+
+    async def results_for(self, job_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Per-item results recorded so far, in submission order"""
+        by_key = {}
+        async for result in self.results.find({"job_id": job_id, "status": {"$ne": PENDING}}, {"_id": 0, "medications": 0}):
+            by_key[result["key"]] = result
+        async for item in self.items.find({"job_id": job_id}, {"_id": 0, "item_id": 1, "key": 1}).sort("seq", ASCENDING):
+            result = by_key.get(item["key"])
+            yield self._item_event(item["item_id"], result) if result else {"id": item["item_id"], "status": PENDING}
+
+    async def shutdown(self) -> None:
+        tasks = [running.task for running in self._running.values() if running.task is not None]
+        for task in tasks:
+            task.cancel()
+        for task in tasks:
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+
+    async def _claim(self, job_id: str) -> bool:
+        now = datetime.utcnow()
+        job = await self.jobs.find_one_and_update(
+            {
+                "_id": job_id,
+                "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lt": now}}],
+                # A finished job has no lease left; only failed items give it something to redo
+                "$nor": [{"status": "completed", "failed": 0}]
+            },
+            {"$set": {
+                "status": "running",
+                "owner": self.owner,
+                "lease_expires_at": now + timedelta(seconds=self.lease_seconds),
+                "updated_at": now
+            }}
+        )
+        return job is not None
+
+    async def _keep_lease(self, job_id: str) -> None:
+        """Renew the lease until cancelled; returns if another worker has taken the job over"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            try:
+                result = await self.jobs.update_one(
+                    {"_id": job_id, "owner": self.owner},
+                    {"$set": {"lease_expires_at": datetime.utcnow() + timedelta(seconds=self.lease_seconds)}}
+                )
+            except Exception as e:
+                logger.error(f"Renewing the lease of batch job {job_id} failed: {str(e)}")
+                continue
+            if result.matched_count == 0:
+                return
+
+    async def _run(self, running: RunningJob) -> None:
+        job_id = running.job_id
+        status = "interrupted"
+        work: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+
+        async def feed():
+            async for result in self.results.find({"job_id": job_id, "status": {"$ne": DONE}}, {"key": 1, "medications": 1}):
+                await work.put(result)
+            for _ in range(self.concurrency):
+                await work.put(None)
+
+        async def worker():
+            while True:
+                result = await work.get()
+                if result is None:
+                    return
+                await self._process(running, result)
+
+        async def process():
+            tasks = [asyncio.create_task(feed())] + [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+            try:
+                await asyncio.gather(*tasks)
+            except BaseException:
+                for task in tasks:
+                    task.cancel()
+                raise
+
+        try:
+            processing = asyncio.create_task(process())
+            lease = asyncio.create_task(self._keep_lease(job_id))
+            try:
+                await asyncio.wait([processing, lease], return_when=asyncio.FIRST_COMPLETED)
+                if not processing.done():
+                    raise RuntimeError("another worker took over its lease")
+                processing.result()
+            finally:
+                lease.cancel()
+                processing.cancel()
+            status = "completed"
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error(f"Batch job {job_id} failed: {str(e)}")
+        finally:
+            self._running.pop(job_id, None)
+            await asyncio.shield(self._finish(job_id, status))
+            running.publish(None)
+
+    async def _process(self, running: RunningJob, result: Dict[str, Any]) -> None:
+        try:
+            update: Dict[str, Any] = {"status": DONE, "response": await self.generate(result["medications"])}
+        except Exception as e:
+            # HTTPException carries the useful message in ``detail``
+            update = {"status": FAILED, "error": str(getattr(e, "detail", None) or e)}
+        update["completed_at"] = datetime.utcnow()
+        await self.results.update_one({"_id": result["_id"]}, {"$set": update})
+
+        item_ids = running.key_items.get(result["key"], [])
+        counter = "completed" if update["status"] == DONE else "failed"
+        await self.jobs.update_one(
+            {"_id": running.job_id},
+            {"$inc": {counter: len(item_ids)}, "$set": {"updated_at": datetime.utcnow()}}
+        )
+        for item_id in item_ids:
+            running.publish(self._item_event(item_id, update))
+
+    async def _finish(self, job_id: str, status: str) -> None:
+        # Counters are recomputed so a resumed job does not double count
+        counts = {DONE: 0, FAILED: 0}
+        item_counts: Dict[str, int] = {}
+        async for item in self.items.find({"job_id": job_id}, {"_id": 0, "key": 1}):
+            item_counts[item["key"]] = item_counts.get(item["key"], 0) + 1
+        async for result in self.results.find({"job_id": job_id, "status": {"$in": [DONE, FAILED]}}, {"key": 1, "status": 1}):
+            counts[result["status"]] += item_counts.get(result["key"], 0)
+        # Releases the lease; a no-op when another worker has taken the job over
+        await self.jobs.update_one(
+            {"_id": job_id, "owner": self.owner},
+            {
+                "$set": {
+                    "status": status,
+                    "completed": counts[DONE],
+                    "failed": counts[FAILED],
+                    "updated_at": datetime.utcnow()
+                },
+                "$unset": {"owner": "", "lease_expires_at": ""}
+            }
+        )
+
+    @staticmethod
+    def _item_event(item_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        event = {"id": item_id, "status": result["status"]}
+        if result["status"] == DONE:
+            event["response"] = result["response"]
+        else:
+            event["error"] = result.get("error")
+        return event
@@ -0,0 +1,104 @@
+"""Storage saved by chat history compaction, and what archived reads cost.
+
+Seeds mongomock-motor (``pip install mongomock-motor``) with idle sessions. In
+each session every other message is a recommendation, drawn from a small set
+of schedules, so prompt bodies repeat the way they do in production. It then
+runs ``chat_archiver.compact()`` once. Sizes are BSON bytes of the stored
+documents, including the prompt store. Page latency is the mean time to read
+a first page through ``session_history``, before and after archiving. mongomock
+scans collections linearly, so its timings (compaction and live reads alike)
+say little about a real server; the sizes carry over.
+
+Usage: python benchmarks/chat_compaction.py [--sessions 100] [--messages 40]
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+import bson  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+
+SCHEDULES = [
+    [{"name": name, "time": time_, "days": [1, 2, 3, 4, 5]} for name, time_ in pairs]
+    for pairs in (
+        [("Metformin", "08:00"), ("Metformin", "20:00")],
+        [("Lisinopril", "09:00")],
+        [("Vitamin D", "08:00"), ("Omega-3", "08:00"), ("Atorvastatin", "21:00")],
+        [("Levothyroxine", "06:30")]
+    )
+]
+
+
+async def seed(sessions: int, messages: int) -> None:
+    rng = random.Random(5)
+    prompts = [server.build_recommendation_prompt(meds, server.analyze_schedule(meds)) for meds in SCHEDULES]
+    start = datetime.utcnow() - timedelta(days=server.CHAT_ARCHIVE_AFTER_DAYS + 30)
+    docs = []
+    for s in range(sessions):
+        for i in range(messages):
+            recommendation = i % 2 == 1
+            docs.append({
+                "id": str(uuid.uuid4()),
+                "session_id": f"session-{s}",
+                "user_message": rng.choice(prompts) if recommendation else "I keep forgetting my evening dose, any tips?",
+                "ai_response": "Try linking it to something you already do every evening, like brushing your teeth. " * 4,
+                "timestamp": start + timedelta(minutes=i),
+                "message_type": "recommendation" if recommendation else "general"
+            })
+    for offset in range(0, len(docs), 5000):
+        await server.db.chat_history.insert_many(docs[offset:offset + 5000])
+
+
+async def stored_bytes() -> dict:
+    sizes = {}
+    for name in ("chat_history", "chat_archives", "chat_prompts"):
+        sizes[name] = sum([len(bson.encode(doc)) async for doc in server.db[name].find()])
+    return sizes
+
+
+async def page_ms(sessions: int, limit: int, repeat: int = 200) -> float:
+    started = time.perf_counter()
+    for i in range(repeat):
+        projection = server.build_projection(None, server.ChatMessage)
+        [doc async for doc in server.session_history(f"session-{i % sessions}", None, projection, limit)]
+    return (time.perf_counter() - started) / repeat * 1000
+
+
+async def main(sessions: int, messages: int, limit: int) -> None:
+    server.bind_database(AsyncMongoMockClient()["chat_compaction_bench"])
+    await server.ensure_indexes()
+    await seed(sessions, messages)
+
+    before, live_ms = await stored_bytes(), await page_ms(sessions, limit)
+    result = await server.chat_archiver.compact()
+    after, archived_ms = await stored_bytes(), await page_ms(sessions, limit)
+
+    print(f"{sessions} sessions x {messages} messages, compaction took {result['seconds']:.2f}s "
+          f"({result['prompts_deduplicated']} prompts deduplicated, {result['messages_archived']} messages archived)")
+    print(f"{'collection':<16}{'before':>12}{'after':>12}")
+    for name in before:
+        print(f"{name:<16}{before[name]:>12,}{after[name]:>12,}")
+    total_before, total_after = sum(before.values()), sum(after.values())
+    print(f"{'total':<16}{total_before:>12,}{total_after:>12,}  ({1 - total_after / total_before:.0%} smaller)")
+    print(f"first page of {limit}: {live_ms:.2f} ms live, {archived_ms:.2f} ms archived")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=40, help="messages per session")
+    parser.add_argument("--limit", type=int, default=20, help="history page size")
+    args = parser.parse_args()
+    asyncio.run(main(args.sessions, args.messages, args.limit))
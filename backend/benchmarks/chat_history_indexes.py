@@ -0,0 +1,108 @@
+"""Seed a local mongod with chat history and time the history endpoint
+before and after ``server.ensure_indexes()``.
+
+Usage:
+    python benchmarks/chat_history_indexes.py --mongo-url mongodb://localhost:27017 \\
+        --messages 2000000 --sessions 50000 --requests 500
+
+Uses a throwaway database (default ``pill_reminder_bench``) that is dropped first.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from pymongo import MongoClient
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def seed(mongo_url: str, db_name: str, messages: int, sessions: int, batch_size: int = 10000) -> list:
+    client = MongoClient(mongo_url)
+    client.drop_database(db_name)
+    collection = client[db_name].chat_history
+    session_ids = [str(uuid.uuid4()) for _ in range(sessions)]
+    start = datetime.utcnow() - timedelta(days=365)
+
+    started = time.perf_counter()
+    for offset in range(0, messages, batch_size):
+        count = min(batch_size, messages - offset)
+        collection.insert_many([
+            {
+                "id": str(uuid.uuid4()),
+                "session_id": random.choice(session_ids),
+                "user_message": "How do I add a new medication?",
+                "ai_response": "Tap the + button at the bottom right and enter the medication name.",
+                "timestamp": start + timedelta(seconds=random.randint(0, 365 * 86400)),
+                "message_type": "support"
+            }
+            for _ in range(count)
+        ], ordered=False)
+    print(f"seeded {messages} messages in {sessions} sessions ({time.perf_counter() - started:.1f}s)")
+    client.close()
+    return session_ids
+
+
+def percentile(samples: list, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def measure(http, session_ids: list, requests: int) -> dict:
+    samples = []
+    for _ in range(requests):
+        session_id = random.choice(session_ids)
+        started = time.perf_counter()
+        response = await http.get(f"/api/ai/chat/history/{session_id}")
+        samples.append((time.perf_counter() - started) * 1000)
+        response.raise_for_status()
+    return {
+        "p50_ms": round(statistics.median(samples), 2),
+        "p99_ms": round(percentile(samples, 0.99), 2),
+        "mean_ms": round(statistics.fmean(samples), 2)
+    }
+
+
+async def run(args, session_ids: list) -> None:
+    import httpx
+    import server
+
+    server.connect_database()
+    await server.db.chat_history.drop_indexes()
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://bench") as http:
+        before = await measure(http, session_ids, args.requests)
+        print(f"without indexes: {before}")
+
+        started = time.perf_counter()
+        await server.ensure_indexes()
+        print(f"index build:     {time.perf_counter() - started:.1f}s")
+
+        after = await measure(http, session_ids, args.requests)
+        print(f"with indexes:    {after}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--db-name", default="pill_reminder_bench")
+    parser.add_argument("--messages", type=int, default=2_000_000)
+    parser.add_argument("--sessions", type=int, default=50_000)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+    session_ids = seed(args.mongo_url, args.db_name, args.messages, args.sessions)
+    asyncio.run(run(args, session_ids))
+
+
+if __name__ == "__main__":
+    main()
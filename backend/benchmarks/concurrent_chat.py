@@ -0,0 +1,83 @@
+"""Load test: concurrent OpenAIChat.send_message calls against the local fake API.
+
+With a blocking transport the calls run one after another (total ~= N x latency)
+and the event loop stalls for the whole duration. With the pooled async client
+they overlap (total ~= latency) and the loop keeps ticking.
+
+With --identical every call sends the same message, so single-flight
+coalescing should collapse them into one upstream request.
+
+Usage: python benchmarks/concurrent_chat.py [--concurrency 20] [--latency 0.5] [--identical]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_openai import app as fake_app, start_fake_openai  # noqa: E402
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Return the worst delay seen between scheduled ticks of the event loop."""
+    worst = 0.0
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - started - interval)
+    return worst
+
+
+async def run(concurrency: int, latency: float, identical: bool) -> None:
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    chat = server.OpenAIChat(api_key=server.OPENAI_API_KEY, system_message="You are a benchmark.")
+    # Warm up: build the client (TLS context, pool) outside the measured window
+    server.get_openai_http_client()
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+
+    started = time.perf_counter()
+    messages = ["question" if identical else f"question {i}" for i in range(concurrency)]
+    replies = await asyncio.gather(*(chat.send_message(message) for message in messages))
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    worst_lag = await lag_task
+    await server.get_openai_http_client().aclose()
+
+    serial = concurrency * latency
+    print(f"completions:        {len(replies)}")
+    print(f"upstream requests:  {fake_app.state.requests} (coalesced: {server.upstream_single_flight.coalesced})")
+    print(f"upstream latency:   {latency:.2f}s")
+    print(f"wall clock:         {elapsed:.2f}s (serial would be {serial:.2f}s)")
+    print(f"speedup vs serial:  {serial / elapsed:.1f}x")
+    print(f"worst loop lag:     {worst_lag * 1000:.1f}ms")
+    if not identical and elapsed > latency * 2:
+        raise SystemExit("calls were serialized: transport is blocking the event loop")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.5)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--identical", action="store_true", help="send the same message from every caller")
+    args = parser.parse_args()
+
+    start_fake_openai(port=args.port, latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+    asyncio.run(run(args.concurrency, args.latency, args.identical))
+
+
+if __name__ == "__main__":
+    main()
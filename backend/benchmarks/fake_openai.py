@@ -0,0 +1,144 @@
+"""Local stand-in for the OpenAI chat completions API used by the benchmarks.
+
+Run standalone with ``python benchmarks/fake_openai.py --port 9100 --latency 0.5``
+or start it in-process with ``start_fake_openai()``. ``latency`` is the delay
+before the first token; ``token_delay`` is the gap between streamed tokens
+(non-streaming requests wait for all of them before answering).
+
+Faults can be injected with ``throttle_rate`` (fraction of requests answered
+with 429 + Retry-After) and ``outage`` (every request gets a 503), either via
+``configure_faults()`` or ``POST /_control`` with the same fields as JSON.
+"""
+import argparse
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+FAKE_REPLY = "Take your medications at the same time every day and keep a glass of water nearby."
+
+app = FastAPI(title="Fake OpenAI")
+app.state.latency = 0.5
+app.state.token_delay = 0.0
+app.state.requests = 0
+app.state.throttle_rate = 0.0
+app.state.retry_after = 1.0
+app.state.outage = False
+app.state.throttled = 0
+app.state.failed = 0
+
+
+def configure_faults(throttle_rate: float = None, retry_after: float = None, outage: bool = None) -> None:
+    if throttle_rate is not None:
+        app.state.throttle_rate = throttle_rate
+    if retry_after is not None:
+        app.state.retry_after = retry_after
+    if outage is not None:
+        app.state.outage = outage
+
+
+@app.post("/_control")
+async def control(request: Request):
+    configure_faults(**await request.json())
+    return {
+        "throttle_rate": app.state.throttle_rate,
+        "retry_after": app.state.retry_after,
+        "outage": app.state.outage
+    }
+
+
+def usage_for(payload: dict) -> dict:
+    prompt_tokens = sum(len(m.get("content", "").split()) for m in payload.get("messages", []))
+    completion_tokens = len(FAKE_REPLY.split())
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens
+    }
+
+
+def stream_chunks(completion_id: str, model: str):
+    for token in FAKE_REPLY.split(" "):
+        yield {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "delta": {"content": token + " "}, "finish_reason": None}]
+        }
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    payload = await request.json()
+    app.state.requests += 1
+
+    if app.state.outage:
+        app.state.failed += 1
+        return JSONResponse({"error": {"message": "The server is overloaded"}}, status_code=503)
+    if random.random() < app.state.throttle_rate:
+        app.state.throttled += 1
+        return JSONResponse(
+            {"error": {"message": "Rate limit reached", "type": "requests"}},
+            status_code=429,
+            headers={"Retry-After": str(app.state.retry_after)}
+        )
+    await asyncio.sleep(app.state.latency)
+
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = payload.get("model", "gpt-4o")
+
+    if payload.get("stream"):
+        async def event_stream():
+            for chunk in stream_chunks(completion_id, model):
+                yield f"data: {json.dumps(chunk)}\n\n"
+                await asyncio.sleep(app.state.token_delay)
+            if payload.get("stream_options", {}).get("include_usage"):
+                usage_chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                               "choices": [], "usage": usage_for(payload)}
+                yield f"data: {json.dumps(usage_chunk)}\n\n"
+            yield "data: [DONE]\n\n"
+        return StreamingResponse(event_stream(), media_type="text/event-stream")
+
+    await asyncio.sleep(app.state.token_delay * len(FAKE_REPLY.split(" ")))
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "message": {"role": "assistant", "content": FAKE_REPLY},
+            "finish_reason": "stop"
+        }],
+        "usage": usage_for(payload)
+    }
+
+
+def start_fake_openai(port: int = 9100, latency: float = 0.5, token_delay: float = 0.0) -> uvicorn.Server:
+    """Serve the fake API from a background thread and wait until it accepts requests."""
+    app.state.latency = latency
+    app.state.token_delay = token_delay
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--port", type=int, default=9100)
+    parser.add_argument("--latency", type=float, default=0.5, help="seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="seconds between tokens")
+    args = parser.parse_args()
+    app.state.latency = args.latency
+    app.state.token_delay = args.token_delay
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
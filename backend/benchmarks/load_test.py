@@ -0,0 +1,333 @@
+"""Mixed-traffic load test of the API against local stand-ins.
+
+Starts ``fake_openai.py`` and ``serve.py`` (in-memory Mongo unless --mongo is a
+URL) as subprocesses. It then drives a weighted mix of chat, streamed chat,
+recommendations, history reads and /health at each concurrency stage.
+
+It reports throughput, p50/p95/p99 latency per endpoint and the server's
+event-loop lag, taken from its /metrics histogram. Results are written as JSON.
+``--baseline`` compares them with an earlier file and flags regressions.
+
+Per-client rate limits and quotas are switched off in the server under test.
+
+Usage:
+    python benchmarks/load_test.py --stages 1,10,50 --duration 10 --latency 0.3
+    python benchmarks/load_test.py --mix chat=1,health=1 --baseline benchmarks/results/<earlier>.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import re
+import subprocess
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+BENCH_DIR = Path(__file__).resolve().parent
+RESULTS_DIR = BENCH_DIR / "results"
+
+DEFAULT_MIX = "chat=30,chat_stream=10,recommendations=20,history=30,health=10"
+
+SESSIONS = [f"bench-session-{i}" for i in range(40)]
+SUPPORT_QUESTIONS = [
+    "How do I add a new medication?",
+    "How do I change a reminder time?",
+    "How do I delete a medication?",
+    "Why am I not getting notifications?",
+]
+GENERAL_QUESTIONS = [
+    "I keep forgetting my evening dose, any tips?",
+    "Is it fine to take my vitamins with coffee?",
+    "How can I remember to refill my prescription?",
+    "What should I do if I miss a dose?",
+]
+MEDICATION_NAMES = ["Metformin", "Lisinopril", "Vitamin D", "Omega-3", "Atorvastatin", "Levothyroxine"]
+
+
+def schedule_pool(size: int = 30, seed: int = 11) -> List[List[Dict]]:
+    """A fixed set of schedules, so repeated ones exercise the recommendation cache like real users"""
+    rng = random.Random(seed)
+    return [
+        [
+            {"name": name, "time": f"{rng.choice([7, 8, 12, 18, 21]):02d}:{rng.choice([0, 30]):02d}",
+             "days": sorted(rng.sample(range(7), rng.randint(3, 7)))}
+            for name in rng.sample(MEDICATION_NAMES, rng.randint(1, 4))
+        ]
+        for _ in range(size)
+    ]
+
+
+SCHEDULES = schedule_pool()
+
+
+def build_request(kind: str, rng: random.Random) -> tuple:
+    """(method, path, json body) for one request of ``kind``"""
+    session_id = rng.choice(SESSIONS)
+    if kind in ("chat", "chat_stream"):
+        if rng.random() < 0.3:
+            body = {"message": rng.choice(SUPPORT_QUESTIONS), "message_type": "support"}
+        else:
+            body = {"message": rng.choice(GENERAL_QUESTIONS), "message_type": "general", "session_id": session_id}
+        return "POST", "/api/ai/chat/stream" if kind == "chat_stream" else "/api/ai/chat", body
+    if kind == "recommendations":
+        return "POST", "/api/ai/recommendations", {"medications": rng.choice(SCHEDULES), "session_id": session_id}
+    if kind == "history":
+        return "GET", f"/api/ai/chat/history/{session_id}", None
+    if kind == "health":
+        return "GET", "/health", None
+    raise ValueError(f"Unknown request kind: {kind}")
+
+
+def parse_mix(mix: str) -> Dict[str, float]:
+    weights = {}
+    for part in mix.split(","):
+        kind, _, weight = part.partition("=")
+        build_request(kind.strip(), random.Random())  # validates the kind
+        weights[kind.strip()] = float(weight or 1)
+    return weights
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def latency_summary(samples: List[float]) -> Dict[str, float]:
+    return {
+        "p50": round(percentile(samples, 0.50) * 1000, 2),
+        "p95": round(percentile(samples, 0.95) * 1000, 2),
+        "p99": round(percentile(samples, 0.99) * 1000, 2),
+        "max": round(max(samples) * 1000, 2) if samples else 0.0
+    }
+
+
+LAG_BUCKET = re.compile(r'^event_loop_lag_distribution_seconds_bucket\{le="([^"]+)"\} (\S+)$', re.M)
+LAG_TOTAL = re.compile(r'^event_loop_lag_distribution_seconds_(sum|count) (\S+)$', re.M)
+
+
+async def scrape_loop_lag(http: httpx.AsyncClient) -> Dict[str, float]:
+    text = (await http.get("/metrics")).text
+    snapshot = {f"le:{bound}": float(value) for bound, value in LAG_BUCKET.findall(text)}
+    snapshot.update({name: float(value) for name, value in LAG_TOTAL.findall(text)})
+    return snapshot
+
+
+def loop_lag_delta(before: Dict[str, float], after: Dict[str, float]) -> Dict[str, Optional[float]]:
+    """Mean and bucketed p99 of the event-loop lag observed between two scrapes"""
+    count = after.get("count", 0) - before.get("count", 0)
+    if count <= 0:
+        return {"samples": 0, "mean_ms": None, "p99_ms": None}
+    buckets = sorted(
+        (float("inf") if key == "le:+Inf" else float(key[3:]), after[key] - before.get(key, 0))
+        for key in after if key.startswith("le:")
+    )
+    p99 = next((bound for bound, cumulative in buckets if cumulative >= 0.99 * count), float("inf"))
+    return {
+        "samples": int(count),
+        "mean_ms": round((after["sum"] - before.get("sum", 0)) / count * 1000, 3),
+        "p99_ms": None if p99 == float("inf") else round(p99 * 1000, 3)
+    }
+
+
+async def run_stage(http: httpx.AsyncClient, concurrency: int, duration: float,
+                    weights: Dict[str, float], seed: int) -> dict:
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors: Dict[str, Counter] = defaultdict(Counter)
+    kinds, kind_weights = list(weights), list(weights.values())
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+
+    async def worker(index: int) -> None:
+        rng = random.Random(seed * 1000 + index)
+        while loop.time() < deadline:
+            kind = rng.choices(kinds, kind_weights)[0]
+            method, path, body = build_request(kind, rng)
+            started = time.perf_counter()
+            try:
+                async with http.stream(method, path, json=body) as response:
+                    await response.aread()
+                status = response.status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            samples[kind].append(time.perf_counter() - started)
+            if not isinstance(status, int) or status >= 400:
+                errors[kind][str(status)] += 1
+
+    lag_before = await scrape_loop_lag(http)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    lag_after = await scrape_loop_lag(http)
+
+    all_samples = [value for values in samples.values() for value in values]
+    return {
+        "concurrency": concurrency,
+        "duration_s": round(elapsed, 2),
+        "requests": len(all_samples),
+        "throughput_rps": round(len(all_samples) / elapsed, 2),
+        "errors": sum(sum(counter.values()) for counter in errors.values()),
+        "latency_ms": latency_summary(all_samples),
+        "endpoints": {
+            kind: {
+                "requests": len(values),
+                "throughput_rps": round(len(values) / elapsed, 2),
+                "errors": dict(errors[kind]),
+                "latency_ms": latency_summary(values)
+            }
+            for kind, values in sorted(samples.items())
+        },
+        "event_loop_lag": loop_lag_delta(lag_before, lag_after)
+    }
+
+
+def start_process(args: List[str], env: dict) -> subprocess.Popen:
+    return subprocess.Popen([sys.executable] + args, cwd=BENCH_DIR.parent, env=env)
+
+
+async def wait_until_healthy(base_url: str, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=base_url, timeout=2) as http:
+        while time.monotonic() < deadline:
+            try:
+                if (await http.get("/health")).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.1)
+    raise RuntimeError(f"Server at {base_url} did not become healthy within {timeout:.0f}s")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_stage(stage: dict) -> None:
+    lag = stage["event_loop_lag"]
+    lag_text = f"loop lag mean {lag['mean_ms']} ms, p99 <= {lag['p99_ms']} ms" if lag["samples"] else "loop lag n/a"
+    print(f"\nconcurrency {stage['concurrency']}: {stage['requests']} requests, "
+          f"{stage['throughput_rps']} req/s, {stage['errors']} errors, {lag_text}")
+    print(f"  {'endpoint':<16}{'req/s':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for kind, result in stage["endpoints"].items():
+        latency = result["latency_ms"]
+        print(f"  {kind:<16}{result['throughput_rps']:>8}{latency['p50']:>10}{latency['p95']:>10}"
+              f"{latency['p99']:>10}{sum(result['errors'].values()):>8}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> List[str]:
+    """Regressions beyond ``tolerance`` (fraction) in throughput or p95 latency, per stage and endpoint"""
+    regressions = []
+    previous = {stage["concurrency"]: stage for stage in baseline["stages"]}
+    for stage in results["stages"]:
+        old = previous.get(stage["concurrency"])
+        if old is None:
+            continue
+        if stage["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"c={stage['concurrency']}: throughput {old['throughput_rps']} -> {stage['throughput_rps']} req/s")
+        for kind, result in stage["endpoints"].items():
+            old_result = old["endpoints"].get(kind)
+            if old_result and result["latency_ms"]["p95"] > old_result["latency_ms"]["p95"] * (1 + tolerance):
+                regressions.append(f"c={stage['concurrency']} {kind}: p95 {old_result['latency_ms']['p95']} -> {result['latency_ms']['p95']} ms")
+    return regressions
+
+
+async def run(args, weights: Dict[str, float]) -> dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    limits = httpx.Limits(max_connections=max(args.stages), max_keepalive_connections=max(args.stages))
+    stages = []
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as http:
+        # Warm up: fill caches and history so reads have something to return
+        await run_stage(http, 4, args.warmup, weights, seed=0)
+        for index, concurrency in enumerate(args.stages, start=1):
+            stage = await run_stage(http, concurrency, args.duration, weights, seed=index)
+            print_stage(stage)
+            stages.append(stage)
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "upstream_latency_s": args.latency,
+            "token_delay_s": args.token_delay,
+            "mongo": args.mongo,
+            "mix": weights
+        },
+        "stages": stages
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stages", default="1,5,10,25,50", help="comma-separated concurrency levels")
+    parser.add_argument("--duration", type=float, default=10, help="seconds per stage")
+    parser.add_argument("--warmup", type=float, default=3, help="seconds of warm-up traffic")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help="request mix as kind=weight,...")
+    parser.add_argument("--latency", type=float, default=0.3, help="fake upstream seconds before the first token")
+    parser.add_argument("--token-delay", type=float, default=0.01, help="fake upstream seconds between tokens")
+    parser.add_argument("--mongo", default="memory", help='"memory" or a MongoDB URL')
+    parser.add_argument("--port", type=int, default=8200)
+    parser.add_argument("--openai-port", type=int, default=9200)
+    parser.add_argument("--timeout", type=float, default=60, help="per-request timeout in seconds")
+    parser.add_argument("--output", type=Path, help="result file (default: benchmarks/results/load-<time>-<commit>.json)")
+    parser.add_argument("--baseline", type=Path, help="earlier result file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed regression as a fraction")
+    args = parser.parse_args()
+    args.stages = [int(value) for value in args.stages.split(",")]
+    weights = parse_mix(args.mix)
+
+    env = dict(
+        os.environ,
+        OPENAI_BASE_URL=f"http://127.0.0.1:{args.openai_port}/v1",
+        OPENAI_API_KEY=os.environ.get("OPENAI_API_KEY", "sk-benchmark"),
+        RATE_LIMIT_PER_MINUTE="0",
+        RATE_LIMIT_IP_PER_MINUTE="0",
+        DAILY_TOKEN_QUOTA="0",
+        CHAT_WRITE_SPILL_PATH=os.environ.get("CHAT_WRITE_SPILL_PATH", "/tmp/pill_reminder_bench_spill.jsonl")
+    )
+    processes = [
+        start_process(["benchmarks/fake_openai.py", "--port", str(args.openai_port),
+                       "--latency", str(args.latency), "--token-delay", str(args.token_delay)], env),
+        start_process(["benchmarks/serve.py", "--port", str(args.port), "--mongo", args.mongo], env)
+    ]
+    try:
+        asyncio.run(wait_until_healthy(f"http://127.0.0.1:{args.port}", 60))
+        results = asyncio.run(run(args, weights))
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+    output = args.output or RESULTS_DIR / f"load-{datetime.utcnow():%Y%m%d-%H%M%S}-{results['meta']['commit'] or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2))
+    print(f"\nresults written to {output}")
+
+    if args.baseline:
+        regressions = compare(results, json.loads(args.baseline.read_text()), args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,160 @@
+"""Token counts of the system prompt before and after the template rewrite.
+
+``legacy_system_message`` is the previous f-string implementation, kept here
+verbatim for comparison. Counts use tiktoken when it is installed and the
+~4 chars/token estimate otherwise.
+
+Usage: python benchmarks/prompt_tokens.py
+"""
+import os
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+import server  # noqa: E402
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("o200k_base")
+
+    def count_tokens(text: str) -> int:
+        return len(_encoding.encode(text))
+    TOKENIZER = "tiktoken o200k_base"
+except Exception:
+    # Not installed, or the encoding file cannot be downloaded (offline)
+    count_tokens = server.estimate_tokens
+    TOKENIZER = "chars/4 estimate"
+
+
+def legacy_system_message(message_type: str, medications: Optional[List[Dict]] = None, user_context: Optional[Dict] = None) -> str:
+    base_prompt = """You are a helpful AI assistant for a medication reminder app called "Simple Pill Reminder". 
+    You provide friendly, informative support while being mindful that you're not a doctor and should not provide medical advice.
+    
+    Always be helpful, concise, and encourage users to consult healthcare professionals for medical decisions.
+    
+    IMPORTANT: You have access to user's personal medication data and can provide personalized insights.
+    """
+    
+    personal_context = ""
+    if user_context:
+        adherence_rate = user_context.get('adherence_rate', 0)
+        consecutive_days = user_context.get('consecutive_days', 0)
+        total_medications = user_context.get('total_medications', 0)
+        missed_doses = user_context.get('missed_doses', 0)
+        
+        personal_context = f"""
+        
+        USER'S PERSONAL CONTEXT:
+        - Adherence rate: {adherence_rate}%
+        - Consecutive days: {consecutive_days}
+        - Total medications: {total_medications}
+        - Recent missed doses: {missed_doses}
+        - Needs motivation: {user_context.get('needs_motivation', False)}
+        - Recent achievements: {user_context.get('recent_achievements', [])}
+        - Current concerns: {user_context.get('current_concerns', [])}
+        
+        Use this information to provide personalized responses. Be encouraging and supportive.
+        """
+    
+    if message_type == "support":
+        return base_prompt + personal_context + """
+        Your role is to help users with:
+        - How to use the app features
+        - Troubleshooting app issues
+        - General questions about medication reminders
+        - Technical support
+        - Personal medication management based on their data
+        
+        Keep responses friendly and helpful. If you see concerning patterns in their data, gently suggest consulting their healthcare provider.
+        Be encouraging about their progress and provide practical tips.
+        """
+    
+    elif message_type == "recommendation":
+        med_context = ""
+        if medications:
+            med_context = f"\n\nUser's current medications: {medications}"
+            
+        return base_prompt + personal_context + med_context + f"""
+        Your role is to provide personalized wellness and medication management tips based on the user's medication schedule and adherence data.
+        
+        Focus on:
+        - Personalized schedule optimization
+        - Adherence improvement strategies based on their actual performance
+        - Celebrating their successes and gently addressing concerns
+        - Practical tips that fit their lifestyle patterns
+        
+        Be specific and actionable. Use their personal data to make relevant suggestions.
+        """
+    
+    elif message_type == "general":
+        return base_prompt + personal_context + """
+        Your role is to provide general health and medication information while considering their personal medication journey.
+        
+        Focus on:
+        - General health education appropriate to their situation
+        - Motivation and psychological support based on their progress
+        - When to consult healthcare providers
+        - Wellness tips that complement their medication routine
+        
+        Be encouraging and acknowledge their efforts in managing their health.
+        """
+    
+    return base_prompt
+
+
+def medication_fixture(count: int) -> List[Dict]:
+    names = ["Vitamin D", "Metformin", "Lisinopril", "Omega-3", "Atorvastatin", "Levothyroxine",
+             "Magnesium", "Aspirin", "Iron", "Vitamin B12"]
+    return [
+        {
+            "id": f"med-{i}",
+            "name": f"{names[i % len(names)]} {i // len(names) + 1}" if count > len(names) else names[i],
+            "time": f"{6 + (i * 3) % 16:02d}:{(i * 15) % 60:02d}",
+            "days": [0, 1, 2, 3, 4, 5, 6] if i % 3 else [1, 3, 5],
+            "icon": "💊",
+            "created_at": "2024-05-01T08:00:00.000Z"
+        }
+        for i in range(count)
+    ]
+
+
+USER_CONTEXT = {
+    "adherence_rate": 86,
+    "consecutive_days": 12,
+    "total_medications": 5,
+    "missed_doses": 2,
+    "needs_motivation": False,
+    "recent_achievements": ["7 day streak", "Perfect week"],
+    "current_concerns": ["Evening doses missed twice"]
+}
+
+FIXTURES = [
+    ("support, no context", "support", None, None),
+    ("support, user context", "support", None, USER_CONTEXT),
+    ("general, user context", "general", None, USER_CONTEXT),
+    ("recommendation, 1 med", "recommendation", medication_fixture(1), USER_CONTEXT),
+    ("recommendation, 5 meds", "recommendation", medication_fixture(5), USER_CONTEXT),
+    ("recommendation, 30 meds", "recommendation", medication_fixture(30), USER_CONTEXT),
+]
+
+
+def main() -> None:
+    print(f"tokenizer: {TOKENIZER}")
+    print(f"{'fixture':<26}{'before':>8}{'after':>8}{'saved':>8}{'static prefix':>15}")
+    total_before = total_after = 0
+    for label, message_type, medications, user_context in FIXTURES:
+        before = count_tokens(legacy_system_message(message_type, medications, user_context))
+        after = count_tokens(server.get_system_message(message_type, medications, user_context))
+        prefix = count_tokens(server.SYSTEM_PROMPT_PREFIXES[message_type])
+        total_before += before
+        total_after += after
+        print(f"{label:<26}{before:>8}{after:>8}{(1 - after / before) * 100:>7.0f}%{prefix:>15}")
+    print(f"{'total':<26}{total_before:>8}{total_after:>8}{(1 - total_after / total_before) * 100:>7.0f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+"""Latency of the rule-based schedule checks for growing medication lists.
+
+The checks run on every recommendation request (as prompt input) and are the
+whole answer in insights mode, so they should stay in the low milliseconds.
+
+Usage: python benchmarks/schedule_analyzer.py [--repeat 200]
+"""
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from schedule_analyzer import ScheduleAnalyzer  # noqa: E402
+
+
+def medication_fixture(count: int, seed: int = 7):
+    rng = random.Random(seed)
+    return [
+        {
+            "name": f"Medication {i}",
+            "time": f"{rng.choice([0, 7, 8, 8, 12, 18, 21, 23]):02d}:{rng.choice([0, 10, 15, 30, 45]):02d}",
+            "days": sorted(rng.sample(range(7), rng.randint(1, 7)))
+        }
+        for i in range(count)
+    ]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    analyzer = ScheduleAnalyzer()
+    print(f"{'medications':>12}{'insights':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for count in (1, 5, 20, 100, 1000):
+        medications = medication_fixture(count)
+        insights = len(analyzer.analyze(medications)["insights"])
+        timings = []
+        for _ in range(args.repeat):
+            started = time.perf_counter()
+            analyzer.analyze(medications)
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        p99 = timings[min(len(timings) - 1, int(len(timings) * 0.99))]
+        print(f"{count:>12}{insights:>10}{statistics.median(timings):>10.3f}{p99:>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
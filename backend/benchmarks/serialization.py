@@ -0,0 +1,156 @@
+"""Serialization cost of the history and status responses.
+
+Compares, per page:
+  pydantic   the original handlers: a model per row (``ChatMessage(**msg)``,
+             ``StatusCheck(**doc)``), then FastAPI's response_model validation /
+             jsonable_encoder and json.dumps
+  json       rows streamed with ``json.dumps`` (the first keyset pagination version)
+  current    ``server.stream_page`` as the endpoints use it now
+
+Rows come from an in-memory async cursor, so only serialization is measured.
+Allocations are the tracemalloc peak for one page.
+
+Usage: python benchmarks/serialization.py [--seconds 1.0]
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+import tracemalloc
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from pydantic import TypeAdapter  # noqa: E402
+
+import server  # noqa: E402
+
+
+class ListCursor:
+    def __init__(self, docs: list):
+        self.docs = docs
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for doc in self.docs:
+            yield doc
+
+
+def history_fixture(count: int) -> list:
+    start = datetime(2024, 6, 1, 8, 0)
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "session_id": "bench-session",
+            "user_message": "I keep forgetting my evening dose, any tips?",
+            "ai_response": "Try linking it to something you already do every evening, like brushing your teeth. " * 3,
+            "timestamp": start + timedelta(minutes=i),
+            "message_type": "support"
+        }
+        for i in range(count)
+    ]
+
+
+def status_fixture(count: int) -> list:
+    start = datetime(2024, 6, 1, 8, 0)
+    return [
+        {"id": str(uuid.uuid4()), "client_name": f"client-{i % 17}", "timestamp": start + timedelta(seconds=i)}
+        for i in range(count)
+    ]
+
+
+STATUS_LIST = TypeAdapter(List[server.StatusCheck])
+
+
+async def pydantic_history(docs: list) -> bytes:
+    content = {"session_id": "bench-session", "messages": [server.ChatMessage(**msg) for msg in docs]}
+    return json.dumps(jsonable_encoder(content), ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def pydantic_status(docs: list) -> bytes:
+    models = [server.StatusCheck(**doc) for doc in docs]
+    # FastAPI dumps the returned models, validates them against response_model and serializes again
+    validated = STATUS_LIST.validate_python([model.model_dump() for model in models])
+    content = jsonable_encoder(STATUS_LIST.dump_python(validated, mode="json"))
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+async def json_stream(envelope: dict, items_key: str, docs: list) -> bytes:
+    def default(value):
+        return value.isoformat()
+    parts = [json.dumps(envelope)[:-1] + (", " if envelope else "") + json.dumps(items_key) + ": ["]
+    parts.append(",".join(json.dumps(doc, default=default) for doc in docs))
+    parts.append("], " + json.dumps({"next_cursor": None})[1:])
+    return "".join(parts).encode()
+
+
+async def current(envelope: dict, items_key: str, docs: list, limit: int) -> bytes:
+    response = await server.stream_page(envelope, items_key, ListCursor(docs), limit)
+    chunks = []
+    async for chunk in response.body_iterator:
+        chunks.append(chunk if isinstance(chunk, bytes) else chunk.encode())
+    return b"".join(chunks)
+
+
+def measure(make_call, seconds: float) -> dict:
+    loop = asyncio.new_event_loop()
+    try:
+        loop.run_until_complete(make_call())  # warm up
+        tracemalloc.start()
+        loop.run_until_complete(make_call())
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        calls = 0
+        started = time.perf_counter()
+        while time.perf_counter() - started < seconds:
+            loop.run_until_complete(make_call())
+            calls += 1
+        elapsed = time.perf_counter() - started
+    finally:
+        loop.close()
+    return {"pages_per_s": calls / elapsed, "peak_kib": peak / 1024}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seconds", type=float, default=1.0, help="measuring time per case")
+    args = parser.parse_args()
+
+    cases = []
+    for rows in (20, 200, 1000):
+        docs = history_fixture(rows)
+        envelope = {"session_id": "bench-session"}
+        cases.append((f"history x{rows}", {
+            "pydantic": lambda docs=docs: pydantic_history(docs),
+            "json": lambda docs=docs: json_stream(envelope, "messages", docs),
+            "current": lambda docs=docs, rows=rows: current(envelope, "messages", docs, rows + 1),
+        }))
+    docs = status_fixture(1000)
+    cases.append(("status x1000", {
+        "pydantic": lambda: pydantic_status(docs),
+        "json": lambda: json_stream({}, "status_checks", docs),
+        "current": lambda: current({}, "status_checks", docs, 1001),
+    }))
+
+    print(f"{'case':<16}{'variant':<10}{'pages/s':>10}{'speedup':>9}{'peak KiB':>10}")
+    for label, variants in cases:
+        baseline = None
+        for name, make_call in variants.items():
+            result = measure(make_call, args.seconds)
+            baseline = baseline or result["pages_per_s"]
+            print(f"{label:<16}{name:<10}{result['pages_per_s']:>10.0f}{result['pages_per_s'] / baseline:>8.1f}x{result['peak_kib']:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""Run the API under uvicorn for load tests, optionally on an in-memory Mongo.
+
+With ``--mongo memory`` the app is bound to a mongomock-motor database before
+startup (``pip install mongomock-motor``), so no mongod is needed; any other
+value is used as the MongoDB URL. Point OPENAI_BASE_URL at the fake API
+(``benchmarks/fake_openai.py``) before starting.
+
+Usage: OPENAI_BASE_URL=http://127.0.0.1:9100/v1 python benchmarks/serve.py --port 8001 --mongo memory
+"""
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+import uvicorn
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--mongo", default="memory", help='"memory" or a MongoDB URL')
+    parser.add_argument("--db-name", default="pill_reminder_bench")
+    parser.add_argument("--log-level", default="warning")
+    args = parser.parse_args()
+
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ["DB_NAME"] = args.db_name
+    os.environ["MONGO_URL"] = "mongodb://localhost:27017" if args.mongo == "memory" else args.mongo
+
+    import server
+    logging.getLogger().setLevel(args.log_level.upper())
+
+    if args.mongo == "memory":
+        from mongomock_motor import AsyncMongoMockClient
+        server.bind_database(AsyncMongoMockClient()[args.db_name])
+
+    uvicorn.run(server.app, host="127.0.0.1", port=args.port, log_level=args.log_level)
+
+
+if __name__ == "__main__":
+    main()
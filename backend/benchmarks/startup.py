@@ -0,0 +1,123 @@
+"""Cold-start timings: ``import server`` and time until the first healthy /health.
+
+Each measurement runs in a fresh interpreter, like a new Render instance or a
+restarted worker. The /health phase starts the production entrypoint
+(gunicorn with uvicorn workers, see gunicorn.conf.py) and needs a reachable
+MongoDB; pass --server uvicorn to time a single uvicorn process instead.
+
+Usage:
+    python benchmarks/startup.py --mongo-url mongodb://localhost:27017 [--workers 2] [--runs 5]
+"""
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import httpx
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = "import time; t = time.perf_counter(); import server; print(time.perf_counter() - t)"
+
+
+def time_import(env: dict) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", IMPORT_SNIPPET],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    return float(result.stdout.strip().splitlines()[-1])
+
+
+def slowest_imports(env: dict, top: int = 8) -> list:
+    """Modules with the largest cumulative import time, from ``python -X importtime``"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import server"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        parts = line.split("|")
+        if len(parts) == 3 and parts[1].strip().isdigit():
+            depth = len(parts[2]) - len(parts[2].lstrip())
+            # ``server`` itself is indented by one space, its direct imports by three
+            if depth == 3:
+                rows.append((int(parts[1]), parts[2].strip()))
+    return sorted(rows, reverse=True)[:top]
+
+
+def server_command(server: str, port: int, workers: int) -> list:
+    if server == "uvicorn":
+        return [sys.executable, "-m", "uvicorn", "server:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"]
+    return [sys.executable, "-m", "gunicorn", "server:app", "-c", "gunicorn.conf.py", "--bind", f"127.0.0.1:{port}", "--workers", str(workers)]
+
+
+def time_to_health(env: dict, server: str, port: int, workers: int, timeout: float) -> dict:
+    """Seconds until the port accepts connections and until /health first returns 200"""
+    started = time.perf_counter()
+    process = subprocess.Popen(server_command(server, port, workers), cwd=BACKEND_DIR, env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    listening = healthy = None
+    try:
+        while listening is None and time.perf_counter() - started < timeout and process.poll() is None:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                listening = time.perf_counter() - started
+            except OSError:
+                time.sleep(0.02)
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=2) as http:
+            while listening is not None and time.perf_counter() - started < timeout and process.poll() is None:
+                try:
+                    if http.get("/health").status_code == 200:
+                        healthy = time.perf_counter() - started
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.02)
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=30)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    return {"listening": listening, "healthy": healthy}
+
+
+def describe(samples: list) -> str:
+    samples = [s for s in samples if s is not None]
+    if not samples:
+        return "n/a"
+    return f"median {statistics.median(samples) * 1000:.0f} ms, min {min(samples) * 1000:.0f} ms, max {max(samples) * 1000:.0f} ms"
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongo-url", default="mongodb://localhost:27017")
+    parser.add_argument("--server", choices=["gunicorn", "uvicorn"], default="gunicorn")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--timeout", type=float, default=60, help="give up on /health after this many seconds")
+    args = parser.parse_args()
+
+    env = dict(os.environ, MONGO_URL=args.mongo_url, PYTHONDONTWRITEBYTECODE="0")
+    env.setdefault("OPENAI_API_KEY", "sk-benchmark")
+
+    imports = [time_import(env) for _ in range(args.runs)]
+    print(f"import server:      {describe(imports)}")
+    for micros, name in slowest_imports(env):
+        print(f"    {micros / 1000:>8.1f} ms  {name}")
+
+    results = [time_to_health(env, args.server, args.port, args.workers, args.timeout) for _ in range(args.runs)]
+    print(f"{args.server} x{args.workers if args.server == 'gunicorn' else 1}")
+    print(f"  accepting:        {describe([r['listening'] for r in results])}")
+    print(f"  first healthy:    {describe([r['healthy'] for r in results])}")
+    if any(r["healthy"] is None for r in results):
+        print(f"  {sum(r['healthy'] is None for r in results)}/{len(results)} runs never became healthy (is MongoDB reachable at {args.mongo_url}?)")
+
+
+if __name__ == "__main__":
+    main()
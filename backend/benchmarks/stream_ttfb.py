@@ -0,0 +1,66 @@
+"""Compare time-to-first-token of streamed vs. buffered completions.
+
+Usage: python benchmarks/stream_ttfb.py [--latency 0.3] [--token-delay 0.05]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_openai import start_fake_openai  # noqa: E402
+
+
+async def run(rounds: int) -> None:
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    chat = server.OpenAIChat(api_key=server.OPENAI_API_KEY, system_message="You are a benchmark.")
+    server.get_openai_http_client()
+
+    buffered, first_token, streamed_total = [], [], []
+    for i in range(rounds):
+        started = time.perf_counter()
+        await chat.send_message(f"question {i}")
+        buffered.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        first = None
+        async for _ in chat.stream_message(f"question {i}"):
+            if first is None:
+                first = time.perf_counter() - started
+        first_token.append(first)
+        streamed_total.append(time.perf_counter() - started)
+
+    await server.get_openai_http_client().aclose()
+
+    def avg(values):
+        return sum(values) / len(values) * 1000
+
+    print(f"buffered response:     {avg(buffered):.0f}ms to first byte")
+    print(f"streamed first token:  {avg(first_token):.0f}ms")
+    print(f"streamed full text:    {avg(streamed_total):.0f}ms")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--token-delay", type=float, default=0.05)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    start_fake_openai(port=args.port, latency=args.latency, token_delay=args.token_delay)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+    asyncio.run(run(args.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""Exercise the upstream scheduler against injected throttling and outages.
+
+Scenarios (each against benchmarks/fake_openai.py):
+  1. throttling  - a share of requests get 429 + Retry-After; calls should
+                   still succeed through retries and the shared pause
+  2. outage      - every request gets 503; the circuit should open and later
+                   calls should fail fast without reaching the upstream
+  3. recovery    - after the reset timeout a single probe closes the circuit
+
+Usage: python benchmarks/upstream_faults.py [--concurrency 20] [--throttle-rate 0.3]
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from fake_openai import app as fake_app, configure_faults, start_fake_openai  # noqa: E402
+
+
+async def burst(chat, concurrency: int, label: str):
+    from fastapi import HTTPException
+
+    async def one(i):
+        started = time.perf_counter()
+        try:
+            await chat.send_message(f"{label} {i}")
+            return "ok", time.perf_counter() - started
+        except HTTPException as e:
+            return str(e.status_code), time.perf_counter() - started
+
+    results = await asyncio.gather(*(one(i) for i in range(concurrency)))
+    outcomes = {}
+    for outcome, _ in results:
+        outcomes[outcome] = outcomes.get(outcome, 0) + 1
+    slowest = max(elapsed for _, elapsed in results)
+    return outcomes, slowest
+
+
+async def run(args) -> None:
+    import server
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    logging.getLogger("resilience").setLevel(logging.ERROR)
+    logging.getLogger("server").setLevel(logging.CRITICAL)
+    chat = server.OpenAIChat(api_key=server.OPENAI_API_KEY, system_message="You are a benchmark.")
+    scheduler = server.upstream_scheduler
+    failures = []
+
+    configure_faults(throttle_rate=args.throttle_rate, retry_after=0.2)
+    outcomes, slowest = await burst(chat, args.concurrency, "throttled")
+    print(f"throttling: {outcomes}, 429s from upstream: {fake_app.state.throttled}, "
+          f"retries: {scheduler.retries}, slowest: {slowest:.2f}s")
+    if outcomes.get("ok", 0) < args.concurrency * 0.9:
+        failures.append("throttled burst should mostly succeed through retries")
+
+    configure_faults(throttle_rate=0.0, outage=True)
+    before = fake_app.state.requests
+    await burst(chat, args.concurrency, "outage")
+    reached = fake_app.state.requests - before
+    outcomes, slowest = await burst(chat, args.concurrency, "fail-fast")
+    print(f"outage: circuit {scheduler.breaker.state}, upstream requests during outage: {reached}, "
+          f"follow-up burst {outcomes} in {slowest * 1000:.1f}ms")
+    if scheduler.breaker.state != "open" or slowest > 0.05:
+        failures.append("circuit should be open and fail fast")
+
+    configure_faults(outage=False)
+    await asyncio.sleep(scheduler.breaker.reset_timeout)
+    outcomes, slowest = await burst(chat, args.concurrency, "recovered")
+    print(f"recovery: circuit {scheduler.breaker.state}, {outcomes}")
+    if scheduler.breaker.state != "closed":
+        failures.append("circuit should close after a successful probe")
+
+    await server.get_openai_http_client().aclose()
+    if failures:
+        raise SystemExit("; ".join(failures))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--throttle-rate", type=float, default=0.3)
+    parser.add_argument("--latency", type=float, default=0.05)
+    parser.add_argument("--port", type=int, default=9100)
+    args = parser.parse_args()
+
+    start_fake_openai(port=args.port, latency=args.latency)
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("OPENAI_CIRCUIT_RESET", "1")
+    os.environ.setdefault("OPENAI_BACKOFF_BASE", "0.05")
+    os.environ.setdefault("OPENAI_MAX_RETRIES", "4")
+
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
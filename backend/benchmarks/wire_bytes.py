@@ -0,0 +1,94 @@
+"""Bytes on the wire for the help endpoints and a chat history page.
+
+Requests go through the full app (middleware included) over an in-process
+ASGI transport, with history in mongomock-motor (``pip install mongomock-motor``).
+Each endpoint is fetched as a first visit with no compression, gzip and br
+(if ``brotli`` is installed), then as a repeat visit that revalidates its
+ETag. Server time per request is the mean over ``--repeat`` requests.
+
+Usage: python benchmarks/wire_bytes.py [--history 100] [--repeat 200]
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark")
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+
+import httpx  # noqa: E402
+from mongomock_motor import AsyncMongoMockClient  # noqa: E402
+
+import server  # noqa: E402
+
+SESSION_ID = "bench-session"
+
+
+async def seed_history(count: int) -> None:
+    start = datetime(2024, 6, 1, 8, 0)
+    await server.db.chat_history.insert_many([
+        {
+            "id": f"msg-{i}",
+            "session_id": SESSION_ID,
+            "user_message": "I keep forgetting my evening dose, any tips?",
+            "ai_response": "Try linking it to something you already do every evening, like brushing your teeth. " * 3,
+            "timestamp": start + timedelta(minutes=i),
+            "message_type": "general"
+        }
+        for i in range(count)
+    ])
+
+
+async def fetch(http: httpx.AsyncClient, path: str, repeat: int, **headers) -> tuple:
+    """(status, ETag, mean ms per request)"""
+    started = time.perf_counter()
+    for _ in range(repeat):
+        response = await http.get(path, headers=headers)
+        await response.aread()
+    elapsed = (time.perf_counter() - started) / repeat * 1000
+    return response.status_code, response.headers.get("etag"), elapsed
+
+
+async def main(history: int, repeat: int) -> None:
+    server.bind_database(AsyncMongoMockClient()["wire_bytes_bench"])
+    await seed_history(history)
+    encodings = ["identity", "gzip"] + (["br"] if "br" in server.quick_tips_payload.encoded else [])
+    paths = {
+        "quick-tips": "/api/ai/quick-tips",
+        "app-help": "/api/ai/app-help",
+        f"history ({history} msgs)": f"/api/ai/chat/history/{SESSION_ID}?limit={history}"
+    }
+
+    transport = httpx.ASGITransport(app=server.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        print(f"{'endpoint':<22}{'request':<14}{'status':>7}{'bytes':>9}{'saved':>8}{'ms':>8}")
+        for name, path in paths.items():
+            identity_bytes = None
+            etag = None
+            for encoding in encodings:
+                status, etag_value, ms = await fetch(http, path, repeat, **{"Accept-Encoding": encoding})
+                raw = await raw_size(http, path, encoding)
+                identity_bytes = identity_bytes or raw
+                etag = etag or etag_value
+                print(f"{name:<22}{encoding:<14}{status:>7}{raw:>9}{1 - raw / identity_bytes:>8.0%}{ms:>8.2f}")
+            if etag:
+                status, _, ms = await fetch(http, path, repeat, **{"Accept-Encoding": "gzip", "If-None-Match": etag})
+                print(f"{name:<22}{'revalidate':<14}{status:>7}{0:>9}{1:>8.0%}{ms:>8.2f}")
+
+
+async def raw_size(http: httpx.AsyncClient, path: str, encoding: str) -> int:
+    # Raw bytes as the server sent them, before httpx decodes the body
+    async with http.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+        return sum([len(chunk) async for chunk in response.aiter_raw()])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--history", type=int, default=100, help="messages in the history page")
+    parser.add_argument("--repeat", type=int, default=200, help="requests per measurement")
+    args = parser.parse_args()
+    asyncio.run(main(args.history, args.repeat))
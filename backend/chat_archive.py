@@ -0,0 +1,361 @@
+import asyncio
+import hashlib
+import logging
+import time
+import uuid
+import zlib
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator, Dict, Iterable, List, Optional, Tuple
+
+import bson
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+LOCK_ID = "chat_compaction"
+SESSIONS_BACKFILL_ID = "chat_sessions_backfill"
+
+
+class PromptStore:
+    """Prompt bodies stored once by SHA-256, with an LRU of recently resolved ones"""
+
+    def __init__(self, collection, cache_size: int = 512):
+        self.collection = collection
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def digest(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    async def save(self, texts: Dict[str, str]) -> None:
+        """Insert {digest: text} bodies that are not stored yet; ``saved_at`` is bumped on every save"""
+        if not texts:
+            return
+        now = datetime.utcnow()
+        await self.collection.bulk_write([
+            UpdateOne(
+                {"_id": digest},
+                {
+                    "$setOnInsert": {"text": text, "bytes": len(text.encode()), "created_at": now},
+                    "$set": {"saved_at": now}
+                },
+                upsert=True
+            )
+            for digest, text in texts.items()
+        ], ordered=False)
+
+    async def get(self, digest: str) -> str:
+        text = self._cache.get(digest)
+        if text is not None:
+            self._cache.move_to_end(digest)
+            return text
+        doc = await self.collection.find_one({"_id": digest}, {"text": 1})
+        text = doc["text"] if doc else ""
+        if doc is None:
+            logger.error(f"Prompt {digest} referenced from chat history is missing")
+        self._cache[digest] = text
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return text
+
+    async def delete(self, digests: List[str], saved_before: datetime) -> int:
+        """Drop the given prompts unless one was saved again since ``saved_before``"""
+        result = await self.collection.delete_many({"_id": {"$in": digests}, "saved_at": {"$lt": saved_before}})
+        for digest in digests:
+            self._cache.pop(digest, None)
+        return result.deleted_count
+
+    async def resolve(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        """Put the prompt body back into a history row that holds a reference"""
+        digest = doc.pop("user_message_ref", None)
+        if digest is not None:
+            doc["user_message"] = await self.get(digest)
+        return doc
+
+
+def pack_messages(messages: List[Dict[str, Any]]) -> Tuple[bytes, int]:
+    """zlib-compressed BSON of the messages, and its uncompressed size"""
+    raw = bson.encode({"messages": messages})
+    return zlib.compress(raw, 6), len(raw)
+
+
+def unpack_messages(data: bytes) -> List[Dict[str, Any]]:
+    return bson.decode(zlib.decompress(data))["messages"]
+
+
+class ChatArchiver:
+    """Background compaction of ``chat_history``.
+
+    Each run does the following:
+    - Replaces the prompt bodies of ``prompt_types`` messages with a
+      ``user_message_ref`` into the prompt store.
+    - Moves every session whose newest message is older than ``archive_after``
+      into zlib-compressed BSON chunks of up to ``chunk_size`` messages in
+      ``archives``. Idle sessions are found through ``sessions``, which holds
+      each session's ``last_activity`` (kept by ``record_activity``).
+    - When ``expire_after`` is set, drops archive chunks older than it, as the
+      history TTL does for live rows.
+    - Sweeps prompt bodies that no live row or archive chunk references any
+      more. Clearing a session sweeps its own prompts right away.
+
+    Archiving writes the chunk before deleting the live rows. A chunk's id is
+    derived from its messages, so a run that was interrupted is simply redone.
+    A Mongo lease makes sure only one worker process compacts at a time.
+    """
+
+    def __init__(self, history, archives, prompts: PromptStore, locks, archive_after: Optional[timedelta],
+                 expire_after: Optional[timedelta] = None, prompt_types: Tuple[str, ...] = ("recommendation",),
+                 chunk_size: int = 500, batch_size: int = 500, max_sessions: int = 1000,
+                 interval: float = 3600.0, lease_seconds: float = 900.0):
+        self.history = history
+        self.archives = archives
+        self.prompts = prompts
+        self.locks = locks
+        self.sessions = None
+        self.archive_after = archive_after
+        self.expire_after = expire_after
+        self.prompt_types = list(prompt_types)
+        self.chunk_size = chunk_size
+        self.batch_size = batch_size
+        self.max_sessions = max_sessions
+        self.interval = interval
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+        self._task: Optional[asyncio.Task] = None
+        self.runs = 0
+        self.last_run: Dict[str, Any] = {}
+        self._backfilled = False
+
+    async def ensure_indexes(self) -> None:
+        await self.archives.create_index(
+            [("session_id", ASCENDING), ("last_timestamp", DESCENDING)],
+            name="session_id_last_timestamp"
+        )
+        await self.archives.create_index("last_timestamp", name="last_timestamp")
+        await self.archives.create_index("prompt_refs", name="prompt_refs")
+        await self.history.create_index("user_message_ref", sparse=True, name="user_message_ref")
+        await self.sessions.create_index("last_activity", name="last_activity")
+
+    async def record_activity(self, docs: List[Dict[str, Any]]) -> None:
+        """Move the sessions' ``last_activity`` up to the newest of the stored ``docs``"""
+        newest: Dict[str, datetime] = {}
+        for doc in docs:
+            session_id, timestamp = doc.get("session_id"), doc.get("timestamp")
+            if session_id is None or timestamp is None:
+                continue
+            if session_id not in newest or timestamp > newest[session_id]:
+                newest[session_id] = timestamp
+        if newest:
+            await self.sessions.bulk_write([
+                UpdateOne({"_id": session_id}, {"$max": {"last_activity": timestamp}}, upsert=True)
+                for session_id, timestamp in newest.items()
+            ], ordered=False)
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def compact(self) -> Dict[str, Any]:
+        """One full pass; returns what it did (``skipped`` when another worker holds the lease)"""
+        if not await self._acquire():
+            return {"skipped": True}
+        started = time.perf_counter()
+        try:
+            deduplicated = await self.dedupe_prompts()
+            sessions, messages = await self.archive_sessions() if self.archive_after else (0, 0)
+            expired = await self.expire_archives() if self.expire_after else 0
+            # Also catches prompts whose rows the history TTL index removed
+            swept = await self.sweep_prompts()
+        finally:
+            await self._release()
+        self.runs += 1
+        self.last_run = {
+            "prompts_deduplicated": deduplicated,
+            "sessions_archived": sessions,
+            "messages_archived": messages,
+            "archive_chunks_expired": expired,
+            "prompts_swept": swept,
+            "seconds": round(time.perf_counter() - started, 3),
+            "finished_at": datetime.utcnow().isoformat()
+        }
+        return self.last_run
+
+    async def dedupe_prompts(self) -> int:
+        deduplicated = 0
+        query = {"message_type": {"$in": self.prompt_types}, "user_message": {"$type": "string"}}
+        while True:
+            docs = await self.history.find(query, {"_id": 1, "user_message": 1}).limit(self.batch_size).to_list(self.batch_size)
+            if not docs:
+                return deduplicated
+            digests = {doc["_id"]: PromptStore.digest(doc["user_message"]) for doc in docs}
+            # Bodies first, references second: a row never points at a missing prompt
+            await self.prompts.save({digests[doc["_id"]]: doc["user_message"] for doc in docs})
+            await self.history.bulk_write([
+                UpdateOne({"_id": doc_id}, {"$set": {"user_message_ref": digest}, "$unset": {"user_message": ""}})
+                for doc_id, digest in digests.items()
+            ], ordered=False)
+            deduplicated += len(docs)
+
+    async def archive_sessions(self) -> Tuple[int, int]:
+        await self.backfill_sessions()
+        cutoff = datetime.utcnow() - self.archive_after
+        stale = await self.sessions.find({"last_activity": {"$lt": cutoff}}, {"_id": 1}).limit(
+            self.max_sessions
+        ).to_list(self.max_sessions)
+        archived = 0
+        for session in stale:
+            archived += await self.archive_session(session["_id"])
+            # Kept when a message arrived meanwhile: that session is live again
+            await self.sessions.delete_one({"_id": session["_id"], "last_activity": {"$lt": cutoff}})
+        return len(stale), archived
+
+    async def backfill_sessions(self) -> None:
+        """Seed ``sessions`` from history written before activity was tracked (once per database)"""
+        if self._backfilled:
+            return
+        if await self.locks.find_one({"_id": SESSIONS_BACKFILL_ID}) is None:
+            newest = await self.history.aggregate([
+                {"$group": {"_id": "$session_id", "timestamp": {"$max": "$timestamp"}}}
+            ]).to_list(None)
+            await self.record_activity([{"session_id": doc["_id"], "timestamp": doc["timestamp"]} for doc in newest])
+            await self.locks.replace_one(
+                {"_id": SESSIONS_BACKFILL_ID}, {"_id": SESSIONS_BACKFILL_ID, "done_at": datetime.utcnow()}, upsert=True
+            )
+        self._backfilled = True
+
+    async def archive_session(self, session_id: str) -> int:
+        docs = await self.history.find({"session_id": session_id}, {"_id": 0}).sort(
+            [("timestamp", ASCENDING), ("id", ASCENDING)]
+        ).to_list(None)
+        for offset in range(0, len(docs), self.chunk_size):
+            chunk = docs[offset:offset + self.chunk_size]
+            ids = [doc["id"] for doc in chunk]
+            data, raw_bytes = pack_messages(chunk)
+            chunk_id = hashlib.sha256("\n".join([session_id] + ids).encode()).hexdigest()[:32]
+            await self.archives.replace_one({"_id": chunk_id}, {
+                "_id": chunk_id,
+                "session_id": session_id,
+                "count": len(chunk),
+                "first_timestamp": chunk[0]["timestamp"],
+                "last_timestamp": chunk[-1]["timestamp"],
+                "raw_bytes": raw_bytes,
+                "stored_bytes": len(data),
+                "messages": bson.Binary(data),
+                "prompt_refs": sorted({doc["user_message_ref"] for doc in chunk if "user_message_ref" in doc}),
+                "archived_at": datetime.utcnow()
+            }, upsert=True)
+            # Only the rows that went into the chunk, so a message written meanwhile stays live
+            await self.history.delete_many({"session_id": session_id, "id": {"$in": ids}})
+        return len(docs)
+
+    async def expire_archives(self) -> int:
+        result = await self.archives.delete_many({"last_timestamp": {"$lt": datetime.utcnow() - self.expire_after}})
+        return result.deleted_count
+
+    async def sweep_prompts(self, digests: Optional[Iterable[str]] = None) -> int:
+        """Delete prompts (all of them, or just ``digests``) that nothing references; returns how many.
+
+        Prompts saved within ``lease_seconds`` are left alone: a compaction
+        run may have stored them and not written the references yet.
+        """
+        saved_before = datetime.utcnow() - timedelta(seconds=self.lease_seconds)
+        if digests is None:
+            cursor = self.prompts.collection.find({"saved_at": {"$lt": saved_before}}, {"_id": 1})
+            digests = [doc["_id"] async for doc in cursor]
+        digests = list(digests)
+        swept = 0
+        for offset in range(0, len(digests), self.batch_size):
+            batch = digests[offset:offset + self.batch_size]
+            referenced = set(await self.history.distinct("user_message_ref", {"user_message_ref": {"$in": batch}}))
+            referenced.update(await self.archives.distinct("prompt_refs", {"prompt_refs": {"$in": batch}}))
+            unreferenced = [digest for digest in batch if digest not in referenced]
+            if unreferenced:
+                swept += await self.prompts.delete(unreferenced, saved_before)
+        return swept
+
+    async def archived_messages(self, session_id: str, before: Optional[Tuple[datetime, str]] = None,
+                                fields: Optional[List[str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Archived messages of a session, newest first, strictly before the (timestamp, id) keyset position"""
+        query: Dict[str, Any] = {"session_id": session_id}
+        if before is not None:
+            query["first_timestamp"] = {"$lte": before[0]}
+        chunks = self.archives.find(query, {"messages": 1}).sort("last_timestamp", DESCENDING)
+        async for chunk in chunks:
+            for doc in reversed(unpack_messages(chunk["messages"])):
+                if before is not None and (doc["timestamp"], doc["id"]) >= before:
+                    continue
+                doc = await self.prompts.resolve(doc)
+                yield {key: doc[key] for key in fields if key in doc} if fields else doc
+
+    async def session_stats(self, session_id: str) -> Dict[str, Any]:
+        live_messages = live_bytes = prompt_refs = 0
+        async for doc in self.history.find({"session_id": session_id}):
+            live_messages += 1
+            live_bytes += len(bson.encode(doc))
+            prompt_refs += "user_message_ref" in doc
+        archived = {"chunks": 0, "messages": 0, "raw_bytes": 0, "stored_bytes": 0}
+        async for chunk in self.archives.find({"session_id": session_id}, {"messages": 0}):
+            archived["chunks"] += 1
+            archived["messages"] += chunk["count"]
+            archived["raw_bytes"] += chunk["raw_bytes"]
+            archived["stored_bytes"] += chunk["stored_bytes"]
+        return {
+            "session_id": session_id,
+            "live": {"messages": live_messages, "bytes": live_bytes, "prompt_refs": prompt_refs},
+            "archived": archived,
+            "total_messages": live_messages + archived["messages"],
+            "total_bytes": live_bytes + archived["stored_bytes"]
+        }
+
+    async def delete_session(self, session_id: str) -> Dict[str, int]:
+        """Delete a session's live rows, archive chunks and the prompts only it referenced"""
+        digests = set(await self.history.distinct("user_message_ref", {"session_id": session_id}))
+        digests.update(await self.archives.distinct("prompt_refs", {"session_id": session_id}))
+        messages = await self.history.delete_many({"session_id": session_id})
+        chunks = await self.archives.delete_many({"session_id": session_id})
+        await self.sessions.delete_one({"_id": session_id})
+        return {
+            "messages": messages.deleted_count,
+            "archive_chunks": chunks.deleted_count,
+            "prompts": await self.sweep_prompts(digests) if digests else 0
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        return {"runs": self.runs, "running": self._task is not None and not self._task.done(), "last_run": self.last_run}
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                result = await self.compact()
+                if not result.get("skipped"):
+                    logger.info(f"Chat history compacted: {result}")
+            except Exception as e:
+                logger.error(f"Chat history compaction failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def _acquire(self) -> bool:
+        now = datetime.utcnow()
+        try:
+            await self.locks.update_one(
+                {"_id": LOCK_ID, "expires_at": {"$lt": now}},
+                {"$set": {"expires_at": now + timedelta(seconds=self.lease_seconds), "owner": self.owner}},
+                upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return True
+
+    async def _release(self) -> None:
+        await self.locks.delete_one({"_id": LOCK_ID, "owner": self.owner})
@@ -0,0 +1,155 @@
+import gzip
+import hashlib
+import zlib
+from typing import Any, Dict, Optional, Sequence
+
+import orjson
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.requests import Request
+from starlette.responses import Response
+
+try:
+    import brotli
+except ImportError:  # optional: without it only gzip is offered
+    brotli = None
+
+
+def accepted_encodings(accept_encoding: str) -> Dict[str, float]:
+    """Parse an Accept-Encoding header into {coding: q}"""
+    accepted = {}
+    for part in accept_encoding.lower().split(","):
+        coding, _, params = part.strip().partition(";")
+        if not coding:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[coding.strip()] = q
+    return accepted
+
+
+def choose_encoding(accept_encoding: str, available: Sequence[str]) -> Optional[str]:
+    """Best of ``available`` (in preference order) the client accepts, or None for identity"""
+    accepted = accepted_encodings(accept_encoding)
+    wildcard = accepted.get("*", 0.0)
+    best, best_q = None, 0.0
+    for coding in available:
+        q = accepted.get(coding, wildcard)
+        if q > best_q:
+            best, best_q = coding, q
+    return best
+
+
+class StaticPayload:
+    """A JSON body serialized and compressed once, served with ETag and Cache-Control.
+
+    Each encoding is a separate representation with its own strong ETag
+    (``"<hash>"``, ``"<hash>-gzip"``, ``"<hash>-br"``). ``If-None-Match``
+    with any of them gets a 304, because they all carry the same content.
+    """
+
+    def __init__(self, content: Any, max_age: int = 3600):
+        self.body = orjson.dumps(content)
+        digest = hashlib.sha256(self.body).hexdigest()[:32]
+        self.encoded = {None: self.body}
+        if brotli is not None:
+            self.encoded["br"] = brotli.compress(self.body, quality=11)
+        self.encoded["gzip"] = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.etags = {coding: f'"{digest}-{coding}"' if coding else f'"{digest}"' for coding in self.encoded}
+        self.cache_control = f"public, max-age={max_age}"
+
+    def response(self, request: Request) -> Response:
+        coding = choose_encoding(request.headers.get("accept-encoding", ""), [c for c in self.encoded if c])
+        headers = {"ETag": self.etags[coding], "Cache-Control": self.cache_control, "Vary": "Accept-Encoding"}
+        if self.not_modified(request.headers.get("if-none-match")):
+            return Response(status_code=304, headers=headers)
+        if coding:
+            headers["Content-Encoding"] = coding
+        return Response(self.encoded[coding], media_type="application/json", headers=headers)
+
+    def not_modified(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        # If-None-Match uses weak comparison
+        tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return not tags.isdisjoint(self.etags.values())
+
+    def stats(self) -> Dict[str, int]:
+        return {coding or "identity": len(body) for coding, body in self.encoded.items()}
+
+
+class CompressionMiddleware:
+    """Gzip responses of at least ``minimum_size`` bytes for clients that accept it.
+
+    Streamed bodies are compressed chunk by chunk with a sync flush, so every
+    chunk the app yields reaches the client right away. Responses that are
+    already encoded are passed through, and so are ``skip_media_types``.
+    Event streams are skipped by default: their tokens are too small to gain
+    from compression.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, compresslevel: int = 6,
+                 skip_media_types: Sequence[str] = ("text/event-stream",)):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.compresslevel = compresslevel
+        self.skip_media_types = tuple(skip_media_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not choose_encoding(Headers(scope=scope).get("accept-encoding", ""), ["gzip"]):
+            await self.app(scope, receive, send)
+            return
+
+        start: Dict[str, Any] = {}
+        state = {"passthrough": False, "compressor": None}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                headers = Headers(raw=message["headers"])
+                media_type = headers.get("content-type", "").split(";")[0].strip()
+                state["passthrough"] = "content-encoding" in headers or media_type in self.skip_media_types
+                if state["passthrough"]:
+                    await send(message)
+                else:
+                    start.update(message)
+                return
+            if message["type"] != "http.response.body" or state["passthrough"]:
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            more_body = message.get("more_body", False)
+            if state["compressor"] is None:
+                if not more_body and len(body) < self.minimum_size:
+                    state["passthrough"] = True
+                    await send(start)
+                    await send(message)
+                    return
+                state["compressor"] = zlib.compressobj(self.compresslevel, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+                headers = MutableHeaders(raw=start["headers"])
+                headers["Content-Encoding"] = "gzip"
+                headers.add_vary_header("Accept-Encoding")
+                del headers["Content-Length"]
+                if not more_body:
+                    compressed = state["compressor"].compress(body) + state["compressor"].flush(zlib.Z_FINISH)
+                    headers["Content-Length"] = str(len(compressed))
+                    await send(start)
+                    await send({"type": "http.response.body", "body": compressed})
+                    return
+                await send(start)
+
+            compressor = state["compressor"]
+            flush_mode = zlib.Z_SYNC_FLUSH if more_body else zlib.Z_FINISH
+            await send({
+                "type": "http.response.body",
+                "body": compressor.compress(body) + compressor.flush(flush_mode),
+                "more_body": more_body
+            })
+
+        await self.app(scope, receive, send_wrapper)
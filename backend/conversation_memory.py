@@ -0,0 +1,130 @@
+import re
+import time
+from collections import OrderedDict, deque
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Deque, Dict, List, Optional, Tuple
+
+Turn = Tuple[str, str]
+TurnLoader = Callable[[str, int], Awaitable[List[Turn]]]
+
+SENTENCE_END = re.compile(r"(?<=[.!?])\s")
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English text; close enough for budgeting
+    return (len(text) + 3) // 4
+
+
+def first_sentence(text: str, max_chars: int = 120) -> str:
+    sentence = SENTENCE_END.split(" ".join(text.split()), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 1].rstrip() + "…"
+
+
+@dataclass
+class SessionMemory:
+    turns: Deque[Turn] = field(default_factory=deque)
+    summary_items: Deque[str] = field(default_factory=deque)
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    @property
+    def summary(self) -> str:
+        if not self.summary_items:
+            return ""
+        return "Summary of earlier conversation: " + " ".join(self.summary_items)
+
+
+class ConversationMemory:
+    """Per-session chat turns kept within a token budget, cached in an in-process LRU.
+
+    Turns that no longer fit the budget are folded into a short extractive
+    summary (the question plus the first sentence of the answer), which is
+    itself bounded by ``summary_token_budget``.
+    """
+
+    def __init__(self, max_sessions: int = 1000, token_budget: int = 1500,
+                 summary_token_budget: int = 200, max_turns: int = 20, ttl_seconds: float = 600,
+                 token_counter: Callable[[str], int] = estimate_tokens):
+        self.max_sessions = max_sessions
+        self.token_budget = token_budget
+        self.summary_token_budget = summary_token_budget
+        self.max_turns = max_turns
+        self.ttl_seconds = ttl_seconds
+        self.count_tokens = token_counter
+        self._sessions: "OrderedDict[str, SessionMemory]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    async def get(self, session_id: str, loader: TurnLoader) -> SessionMemory:
+        memory = self._sessions.get(session_id)
+        if memory is not None and time.monotonic() - memory.loaded_at < self.ttl_seconds:
+            self._sessions.move_to_end(session_id)
+            self.hits += 1
+            return memory
+
+        self.misses += 1
+        memory = SessionMemory()
+        for user_message, ai_response in await loader(session_id, self.max_turns):
+            self._add_turn(memory, user_message, ai_response)
+        self._store(session_id, memory)
+        return memory
+
+    def messages(self, memory: SessionMemory) -> List[Dict[str, str]]:
+        """Chat-completion messages for the remembered part of the conversation"""
+        messages = []
+        if memory.summary:
+            messages.append({"role": "system", "content": memory.summary})
+        for user_message, ai_response in memory.turns:
+            messages.append({"role": "user", "content": user_message})
+            messages.append({"role": "assistant", "content": ai_response})
+        return messages
+
+    def append(self, session_id: str, user_message: str, ai_response: str) -> None:
+        """Add a turn to a session cached in this process.
+
+        An uncached session is left alone rather than started empty: the next
+        ``get`` loads it from the store, which by then includes this turn
+        (or will once the write-behind queue flushes).
+        """
+        memory = self._sessions.get(session_id)
+        if memory is None:
+            return
+        self._sessions.move_to_end(session_id)
+        self._add_turn(memory, user_message, ai_response)
+
+    def invalidate(self, session_id: str) -> None:
+        self._sessions.pop(session_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions
+        }
+
+    def _store(self, session_id: str, memory: SessionMemory) -> None:
+        self._sessions[session_id] = memory
+        self._sessions.move_to_end(session_id)
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.evictions += 1
+
+    def _add_turn(self, memory: SessionMemory, user_message: str, ai_response: str) -> None:
+        memory.turns.append((user_message, ai_response))
+        while len(memory.turns) > self.max_turns:
+            self._fold_oldest(memory)
+        while len(memory.turns) > 1 and self._turn_tokens(memory) > self.token_budget - self.summary_token_budget:
+            self._fold_oldest(memory)
+
+    def _turn_tokens(self, memory: SessionMemory) -> int:
+        return sum(self.count_tokens(user) + self.count_tokens(ai) for user, ai in memory.turns)
+
+    def _fold_oldest(self, memory: SessionMemory) -> None:
+        user_message, ai_response = memory.turns.popleft()
+        memory.summary_items.append(
+            f'User asked "{first_sentence(user_message, 80)}"; you answered: {first_sentence(ai_response)}'
+        )
+        while len(memory.summary_items) > 1 and self.count_tokens(memory.summary) > self.summary_token_budget:
+            memory.summary_items.popleft()
@@ -0,0 +1,128 @@
+import re
+import zlib
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+STOPWORDS = {
+    "a", "an", "the", "i", "my", "me", "do", "does", "is", "are", "to", "of", "in",
+    "on", "it", "can", "you", "your", "this", "that", "for", "and", "or", "please"
+}
+# Apostrophes are stripped before matching, so "don't" arrives as "dont"
+NEGATIONS = {
+    "not", "no", "never", "without", "cant", "cannot", "dont", "doesnt", "didnt", "isnt", "arent",
+    "wasnt", "werent", "wont", "wouldnt", "shouldnt", "havent", "hasnt", "hadnt"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    words = [w for w in TOKEN_PATTERN.findall(text.lower().replace("'", "")) if w not in STOPWORDS]
+    # Light stemming so "medications"/"medication" and "notifications"/"notification" match
+    words = [w[:-1] if len(w) > 3 and w.endswith("s") and not w.endswith("ss") else w for w in words]
+    # A negation is folded into the word it negates: "not taken" shares no token with "taken"
+    negated, negate = [], False
+    for word in words:
+        if word in NEGATIONS:
+            negated.append("not")
+            negate = True
+        elif negate:
+            negated.append(f"not_{word}")
+            negate = False
+        else:
+            negated.append(word)
+    words = negated
+    bigrams = [f"{a}_{b}" for a, b in zip(words, words[1:])]
+    return words + bigrams
+
+
+class FAQIndex:
+    """Hashed bag-of-words vectors with cosine-similarity lookup, kept in one NumPy matrix.
+
+    The matrix is allocated for ``max_entries`` rows up front. Entries fill it
+    in order; once it is full, a new entry overwrites the slot of the oldest
+    learned one (or of the oldest entry, when all are seeded).
+    """
+
+    def __init__(self, dimensions: int = 2048, max_entries: int = 2000):
+        self.dimensions = dimensions
+        self.max_entries = max_entries
+        self.questions: List[str] = []
+        self.answers: List[str] = []
+        self.sources: List[str] = []
+        self._vectors = np.zeros((max_entries, dimensions), dtype=np.float32)
+        self._keys: Dict[str, int] = {}
+        self._slot_keys: List[str] = []
+        # Slots in insertion order, learned entries apart so they are evicted first
+        self._learned: deque = deque()
+        self._permanent: deque = deque()
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def vectorize(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        tokens = tokenize(text)
+        if not tokens:
+            return vector
+        buckets = np.fromiter(
+            (zlib.crc32(token.encode("utf-8")) % self.dimensions for token in tokens),
+            dtype=np.int64,
+            count=len(tokens)
+        )
+        np.add.at(vector, buckets, 1.0)
+        np.log1p(vector, out=vector)
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector
+
+    def add(self, question: str, answer: str, source: str = "learned") -> None:
+        key = " ".join(tokenize(question))
+        if not key:
+            return
+        vector = self.vectorize(question)
+        existing = self._keys.get(key)
+        if existing is not None:
+            self.answers[existing] = answer
+            if (source == "learned") != (self.sources[existing] == "learned"):
+                self._slot_order(self.sources[existing]).remove(existing)
+                self._slot_order(source).append(existing)
+            self.sources[existing] = source
+            return
+
+        if len(self.questions) < self.max_entries:
+            slot = len(self.questions)
+            self.questions.append(question)
+            self.answers.append(answer)
+            self.sources.append(source)
+            self._slot_keys.append(key)
+        else:
+            # Seeded help content is permanent; overwrite the oldest learned answer instead
+            slot = (self._learned or self._permanent).popleft()
+            del self._keys[self._slot_keys[slot]]
+            self.questions[slot] = question
+            self.answers[slot] = answer
+            self.sources[slot] = source
+            self._slot_keys[slot] = key
+        self._keys[key] = slot
+        self._slot_order(source).append(slot)
+        self._vectors[slot] = vector
+
+    def search(self, query: str, threshold: float) -> Optional[Tuple[str, float, str]]:
+        """Return (answer, score, matched question) for the closest entry above threshold"""
+        if not self.questions:
+            return None
+        query_vector = self.vectorize(query)
+        if not query_vector.any():
+            return None
+        scores = self._vectors[:len(self.questions)] @ query_vector
+        best = int(np.argmax(scores))
+        score = float(scores[best])
+        if score < threshold:
+            return None
+        return self.answers[best], score, self.questions[best]
+
+    def _slot_order(self, source: str) -> deque:
+        return self._learned if source == "learned" else self._permanent
@@ -0,0 +1,23 @@
+# Production server settings, read by `gunicorn -c gunicorn.conf.py server:app`
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Each worker has its own event loop, OpenAI pool and MONGO_MAX_POOL_SIZE connections
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count(), 4)))
+
+# Streamed AI answers can take a while; the timeout only kills workers that stop heartbeating
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 120))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', 5))
+
+# Recycle workers now and then to bound memory growth of the in-process caches; the
+# jitter keeps workers from restarting together (GUNICORN_MAX_REQUESTS=0 turns it off)
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = "-" if os.environ.get('GUNICORN_ACCESS_LOG', 'false').lower() == 'true' else None
+errorlog = "-"
+loglevel = os.environ.get('GUNICORN_LOG_LEVEL', 'info')
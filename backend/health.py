@@ -0,0 +1,120 @@
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+OK = "ok"
+DEGRADED = "degraded"
+DOWN = "down"
+
+CheckResult = Tuple[str, Dict[str, Any]]
+
+
+class HealthMonitor:
+    """Runs health checks in the background and serves the last report to probes.
+
+    Every ``interval`` seconds each registered check returns ``(status,
+    details)``; an exception or a run past ``timeout`` counts as ``down``. A
+    check that has worked before is only reported down after
+    ``failure_threshold`` failures in a row. Until then it counts as degraded,
+    so one slow ping does not take the instance out of rotation. The service
+    is unready while a critical check is down. Non-critical checks (e.g. the
+    shared upstream) can only degrade it.
+    """
+
+    def __init__(self, interval: float = 10.0, timeout: float = 2.0, failure_threshold: int = 3):
+        self.interval = interval
+        self.timeout = timeout
+        self.failure_threshold = failure_threshold
+        self._checks: Dict[str, Tuple[Callable[[], Awaitable[CheckResult]], bool]] = {}
+        self._failures: Dict[str, int] = {}
+        self._ever_ok: Dict[str, bool] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.report: Optional[Dict[str, Any]] = None
+        self.refreshed_at = 0.0
+        self.refreshes = 0
+
+    def add_check(self, name: str, check: Callable[[], Awaitable[CheckResult]], critical: bool = True) -> None:
+        self._checks[name] = (check, critical)
+
+    @property
+    def ready(self) -> bool:
+        return self.report is not None and self.report["ready"]
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        """The cached report (``starting`` before the first refresh) with its age"""
+        if self.report is None:
+            return {"status": "starting", "ready": False, "checks": {}}
+        return {**self.report, "age_seconds": round(time.monotonic() - self.refreshed_at, 3)}
+
+    async def refresh(self) -> Dict[str, Any]:
+        results = await asyncio.gather(*(self._run_check(name, check) for name, (check, _) in self._checks.items()))
+        checks = {}
+        ready, degraded = True, False
+        for (name, (_, critical)), (status, details) in zip(self._checks.items(), results):
+            status = self._debounce(name, status)
+            if status == DOWN and critical:
+                ready = False
+            elif status != OK:
+                degraded = True
+            checks[name] = {"status": status, "critical": critical, **details}
+            if self._failures.get(name):
+                checks[name]["consecutive_failures"] = self._failures[name]
+        self.report = {
+            "status": "unhealthy" if not ready else "degraded" if degraded else "healthy",
+            "ready": ready,
+            "checks": checks,
+            "checked_at": datetime.utcnow().isoformat()
+        }
+        self.refreshed_at = time.monotonic()
+        self.refreshes += 1
+        return self.report
+
+    async def _run(self) -> None:
+        # A refresh awaited before start() already produced the first report
+        if self.report is not None:
+            await asyncio.sleep(self.interval)
+        while True:
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.error(f"Health refresh failed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def _run_check(self, name: str, check: Callable[[], Awaitable[CheckResult]]) -> CheckResult:
+        started = time.perf_counter()
+        try:
+            status, details = await asyncio.wait_for(check(), self.timeout)
+        except asyncio.TimeoutError:
+            status, details = DOWN, {"error": f"timed out after {self.timeout:g}s"}
+        except Exception as e:
+            status, details = DOWN, {"error": str(e)}
+        details.setdefault("latency_ms", round((time.perf_counter() - started) * 1000, 2))
+        return status, details
+
+    def _debounce(self, name: str, status: str) -> str:
+        if status != DOWN:
+            self._failures[name] = 0
+            self._ever_ok[name] = True
+            return status
+        failures = self._failures[name] = self._failures.get(name, 0) + 1
+        # Never worked (e.g. at startup): report it as it is
+        if not self._ever_ok.get(name) or failures >= self.failure_threshold:
+            return DOWN
+        return DEGRADED
@@ -0,0 +1,197 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+
+def seconds_until_midnight_utc() -> float:
+    now = datetime.utcnow()
+    tomorrow = datetime(now.year, now.month, now.day) + timedelta(days=1)
+    return (tomorrow - now).total_seconds()
+
+
+class ClientRateLimiter:
+    """Token bucket per client key, held in an LRU so idle clients fall out.
+
+    With a ``collection`` the local check is followed by a fixed-window
+    counter in Mongo, so the limit also holds across worker processes. The
+    shared counter fails open: if Mongo is unreachable only the local bucket
+    applies.
+    """
+
+    def __init__(self, per_minute: float, burst: float, max_clients: int = 10000,
+                 collection=None, window_seconds: int = 60):
+        self.rate = per_minute / 60
+        self.capacity = max(1.0, burst)
+        self.max_clients = max_clients
+        self.collection = collection
+        self.window_seconds = window_seconds
+        self.window_limit = max(1, int(per_minute * window_seconds / 60))
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self.allowed = 0
+        self.limited = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    async def check(self, key: str) -> float:
+        """Take one token for ``key``; return 0 when allowed, else seconds until it would be"""
+        if not self.enabled:
+            return 0.0
+        wait = self._check_local(key)
+        if not wait and self.collection is not None:
+            wait = await self._check_shared(key)
+        if wait:
+            self.limited += 1
+        else:
+            self.allowed += 1
+        return wait
+
+    async def ensure_indexes(self) -> None:
+        if self.collection is not None:
+            await self.collection.create_index("expires_at", name="expires_at_ttl", expireAfterSeconds=0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._buckets),
+            "allowed": self.allowed,
+            "limited": self.limited,
+            "shared": self.collection is not None
+        }
+
+    def _check_local(self, key: str) -> float:
+        now = time.monotonic()
+        tokens, updated = self._buckets.pop(key, (self.capacity, now))
+        tokens = min(self.capacity, tokens + (now - updated) * self.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / self.rate
+        self._buckets[key] = (tokens, now)
+        while len(self._buckets) > self.max_clients:
+            self._buckets.popitem(last=False)
+        return wait
+
+    async def _check_shared(self, key: str) -> float:
+        now = time.time()
+        window_start = int(now // self.window_seconds) * self.window_seconds
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": f"{key}:{window_start}"},
+                {
+                    "$inc": {"count": 1},
+                    "$setOnInsert": {"expires_at": datetime.utcfromtimestamp(window_start + 2 * self.window_seconds)}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.warning(f"Shared rate limit check failed: {str(e)}")
+            return 0.0
+        if doc["count"] > self.window_limit:
+            return max(0.0, window_start + self.window_seconds - now)
+        return 0.0
+
+
+class TokenQuota:
+    """Daily upstream token budget per client, charged from the usage the upstream reports.
+
+    Totals are kept per UTC day in an in-process LRU. With a ``collection``
+    they are summed across workers in Mongo; the local copy is refreshed at
+    most every ``refresh_seconds`` when checking.
+    """
+
+    def __init__(self, daily_tokens: int, collection=None, max_clients: int = 10000,
+                 refresh_seconds: float = 5.0):
+        self.daily_tokens = daily_tokens
+        self.collection = collection
+        self.max_clients = max_clients
+        self.refresh_seconds = refresh_seconds
+        # key -> (day, tokens used, monotonic time of the last shared read)
+        self._usage: "OrderedDict[str, Tuple[str, int, float]]" = OrderedDict()
+        self.exceeded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.daily_tokens > 0
+
+    async def retry_after(self, key: str) -> float:
+        """0 while ``key`` is under its daily budget, else seconds until the budget resets"""
+        if not self.enabled:
+            return 0.0
+        used = await self.used(key)
+        if used < self.daily_tokens:
+            return 0.0
+        self.exceeded += 1
+        return seconds_until_midnight_utc()
+
+    async def used(self, key: str) -> int:
+        day = datetime.utcnow().strftime("%Y-%m-%d")
+        entry = self._usage.get(key)
+        tokens = entry[1] if entry is not None and entry[0] == day else 0
+        stale = entry is None or entry[0] != day or time.monotonic() - entry[2] > self.refresh_seconds
+        if self.collection is not None and stale:
+            try:
+                doc = await self.collection.find_one({"_id": f"{key}:{day}"}, {"tokens": 1})
+            except Exception as e:
+                logger.warning(f"Shared token quota read failed: {str(e)}")
+            else:
+                tokens = doc["tokens"] if doc else 0
+                self._store(key, day, tokens, time.monotonic())
+        return tokens
+
+    async def add(self, key: str, tokens: int) -> None:
+        if not self.enabled or tokens <= 0:
+            return
+        day = datetime.utcnow().strftime("%Y-%m-%d")
+        entry = self._usage.get(key)
+        used = entry[1] if entry is not None and entry[0] == day else 0
+        refreshed = entry[2] if entry is not None and entry[0] == day else 0.0
+        self._store(key, day, used + tokens, refreshed)
+        if self.collection is None:
+            return
+        try:
+            doc = await self.collection.find_one_and_update(
+                {"_id": f"{key}:{day}"},
+                {
+                    "$inc": {"tokens": tokens},
+                    "$setOnInsert": {"expires_at": datetime.utcnow() + timedelta(days=2)}
+                },
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception as e:
+            logger.warning(f"Shared token quota update failed: {str(e)}")
+        else:
+            self._store(key, day, doc["tokens"], time.monotonic())
+
+    async def ensure_indexes(self) -> None:
+        if self.collection is not None:
+            await self.collection.create_index("expires_at", name="expires_at_ttl", expireAfterSeconds=0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "clients": len(self._usage),
+            "daily_tokens": self.daily_tokens,
+            "exceeded": self.exceeded,
+            "shared": self.collection is not None
+        }
+
+    def _store(self, key: str, day: str, tokens: int, refreshed: float) -> None:
+        self._usage[key] = (day, tokens, refreshed)
+        self._usage.move_to_end(key)
+        while len(self._usage) > self.max_clients:
+            self._usage.popitem(last=False)
+
+
+def usage_tokens(usage: Optional[Dict[str, Any]]) -> int:
+    if not usage:
+        return 0
+    return int(usage.get('total_tokens') or usage.get('prompt_tokens', 0) + usage.get('completion_tokens', 0))
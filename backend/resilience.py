@@ -0,0 +1,222 @@
+import asyncio
+import logging
+import random
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the upstream while the circuit is open"""
+
+    def __init__(self, retry_after: float):
+        super().__init__(f"Upstream circuit open, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+
+def parse_retry_after(headers: httpx.Headers) -> Optional[float]:
+    """Seconds to wait from Retry-After / retry-after-ms, or None when absent"""
+    millis = headers.get("retry-after-ms")
+    if millis:
+        try:
+            return max(0.0, float(millis) / 1000)
+        except ValueError:
+            pass
+    value = headers.get("retry-after")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Request rate limiter; ``pause`` holds every caller back, e.g. for a Retry-After"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+
+    async def acquire(self) -> None:
+        while True:
+            now = time.monotonic()
+            if now < self._paused_until:
+                await asyncio.sleep(self._paused_until - now)
+                continue
+            if self.rate <= 0:
+                return
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    @property
+    def paused_for(self) -> float:
+        return max(0.0, self._paused_until - time.monotonic())
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures, then lets a single probe through after ``reset_timeout``"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self.rejected = 0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+
+    def before_call(self) -> None:
+        if self.state == self.CLOSED:
+            return
+        now = time.monotonic()
+        elapsed = now - self.opened_at
+        if self.state == self.OPEN and elapsed >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probe_in_flight = False
+        # A probe that never reported back (e.g. cancelled) must not wedge the breaker
+        probe_stale = now - self._probe_started > self.reset_timeout
+        if self.state == self.HALF_OPEN and (not self._probe_in_flight or probe_stale):
+            self._probe_in_flight = True
+            self._probe_started = now
+            return
+        self.rejected += 1
+        raise CircuitOpenError(max(0.0, self.reset_timeout - elapsed))
+
+    def record_success(self) -> None:
+        if self.state != self.CLOSED:
+            logger.info("Upstream circuit closed")
+        self.state = self.CLOSED
+        self.failures = 0
+        self._probe_in_flight = False
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self.times_opened += 1
+                logger.warning(f"Upstream circuit opened after {self.failures} failures")
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+            self._probe_in_flight = False
+
+
+class UpstreamScheduler:
+    """Runs upstream HTTP calls through a concurrency cap, a rate limiter,
+    jittered retries on 429/5xx/transport errors and a circuit breaker.
+    """
+
+    def __init__(self, max_concurrency: int = 16, rate: float = 0, burst: float = 1,
+                 max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 breaker: Optional[CircuitBreaker] = None):
+        self.max_concurrency = max_concurrency
+        self.semaphore = asyncio.Semaphore(max_concurrency)
+        self.bucket = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.in_flight = 0
+        self.retries = 0
+        self.throttled = 0
+
+    def backoff(self, attempt: int) -> float:
+        # Full jitter: spread retries from many callers over the whole window
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    @asynccontextmanager
+    async def request(self, call: Callable[[], Awaitable[httpx.Response]]) -> AsyncIterator[httpx.Response]:
+        """Yield the first acceptable response, or the last one once retries run out.
+
+        ``call`` may open a streaming response; the concurrency slot is held
+        until the caller leaves the block and the response is closed.
+        """
+        attempt = 0
+        while True:
+            self.breaker.before_call()
+            await self.bucket.acquire()
+            await self.semaphore.acquire()
+            self.in_flight += 1
+            try:
+                response = await call()
+            except httpx.TransportError:
+                self._release()
+                self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.backoff(attempt)
+            except BaseException:
+                self._release()
+                raise
+            else:
+                status = response.status_code
+                if status not in RETRYABLE_STATUS:
+                    self.breaker.record_success()
+                    break
+                retry_after = parse_retry_after(response.headers)
+                if status == 429:
+                    # Throttling means the upstream is alive; slow everyone down instead of tripping
+                    self.throttled += 1
+                    self.breaker.record_success()
+                    self.bucket.pause(retry_after if retry_after is not None else self.backoff(attempt))
+                else:
+                    self.breaker.record_failure()
+                if attempt >= self.max_retries:
+                    break
+                await response.aclose()
+                self._release()
+                delay = max(retry_after or 0.0, self.backoff(attempt))
+            attempt += 1
+            self.retries += 1
+            logger.warning(f"Retrying upstream call in {delay:.2f}s (attempt {attempt + 1})")
+            await asyncio.sleep(delay)
+
+        try:
+            yield response
+        finally:
+            await response.aclose()
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "retries": self.retries,
+            "throttled": self.throttled,
+            "rate_limit_paused_seconds": round(self.bucket.paused_for, 3),
+            "circuit_state": self.breaker.state,
+            "circuit_failures": self.breaker.failures,
+            "circuit_times_opened": self.breaker.times_opened,
+            "circuit_rejected": self.breaker.rejected
+        }
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self.semaphore.release()
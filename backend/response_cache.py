@@ -0,0 +1,116 @@
+import hashlib
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_medications(medications: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Reduce a medication list to the fields that shape the AI answer, in a stable order"""
+    normalized = []
+    for med in medications:
+        name = " ".join(str(med.get('name', 'Unknown')).split()).casefold()
+        time_of_day = str(med.get('time', 'Unknown')).strip()
+        days = sorted({int(day) for day in med.get('days') or [] if str(day).strip().isdigit()})
+        normalized.append({"name": name, "time": time_of_day, "days": days})
+    normalized.sort(key=lambda med: (med["time"], med["name"], med["days"]))
+    return normalized
+
+
+def make_cache_key(namespace: str, model: str, prompt_version: str, payload: Any) -> str:
+    body = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    digest = hashlib.sha256(f"{namespace}|{model}|{prompt_version}|{body}".encode("utf-8")).hexdigest()
+    return f"{namespace}:{digest}"
+
+
+class ResponseCache:
+    """Two-tier TTL cache: an in-process LRU in front of an optional shared Mongo collection"""
+
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 3600, collection=None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.collection = collection
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bypassed = 0
+
+    async def ensure_indexes(self) -> None:
+        if self.collection is not None:
+            await self.collection.create_index("expires_at", expireAfterSeconds=0)
+
+    async def get(self, key: str) -> Optional[str]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+
+        if self.collection is not None:
+            try:
+                doc = await self.collection.find_one(
+                    {"_id": key, "expires_at": {"$gt": datetime.utcnow()}},
+                    {"value": 1, "expires_at": 1}
+                )
+            except Exception as e:
+                logger.warning(f"Shared cache read failed: {str(e)}")
+                doc = None
+            if doc is not None:
+                remaining = (doc["expires_at"] - datetime.utcnow()).total_seconds()
+                self._store_local(key, doc["value"], remaining)
+                self.shared_hits += 1
+                return doc["value"]
+
+        self.misses += 1
+        return None
+
+    async def set(self, key: str, value: str) -> None:
+        self._store_local(key, value, self.ttl_seconds)
+        if self.collection is not None:
+            try:
+                await self.collection.replace_one(
+                    {"_id": key},
+                    {"_id": key, "value": value, "expires_at": datetime.utcnow() + timedelta(seconds=self.ttl_seconds)},
+                    upsert=True
+                )
+            except Exception as e:
+                logger.warning(f"Shared cache write failed: {str(e)}")
+
+    def record_bypass(self) -> None:
+        self.bypassed += 1
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.shared_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "shared_tier": self.collection is not None,
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "bypassed": self.bypassed,
+            "hit_rate": round((self.hits + self.shared_hits) / lookups, 4) if lookups else 0.0
+        }
+
+    def _store_local(self, key: str, value: str, ttl_seconds: float) -> None:
+        if self.max_entries <= 0 or ttl_seconds <= 0:
+            return
+        self._entries[key] = (time.monotonic() + ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
@@ -0,0 +1,215 @@
+from typing import Any, Dict, List, Tuple
+
+import numpy as np
+
+# Day indexes follow JavaScript's Date.getDay(), as stored by the frontend
+DAY_NAMES = ("Sun", "Mon", "Tue", "Wed", "Thu", "Fri", "Sat")
+MINUTES_PER_DAY = 24 * 60
+
+
+def parse_time(value: Any) -> int:
+    """Minutes after midnight for "HH:MM", or -1 when the value is not a valid time"""
+    try:
+        hours, minutes = str(value).strip().split(":")[:2]
+        hours, minutes = int(hours), int(minutes)
+    except (TypeError, ValueError):
+        return -1
+    if 0 <= hours < 24 and 0 <= minutes < 60:
+        return hours * 60 + minutes
+    return -1
+
+
+def format_minutes(minutes: int) -> str:
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def in_window(minutes: np.ndarray, start: int, end: int) -> np.ndarray:
+    """Whether each time falls in [start, end), a window that may wrap past midnight"""
+    return (minutes - start) % MINUTES_PER_DAY < (end - start) % MINUTES_PER_DAY
+
+
+def join_names(names: List[str]) -> str:
+    return ", ".join(names[:-1]) + f" and {names[-1]}" if len(names) > 1 else "".join(names)
+
+
+class ScheduleAnalyzer:
+    """Deterministic checks over a medication schedule, computed on NumPy arrays.
+
+    Each medication becomes a time-of-day in minutes and a row of a
+    medications x weekdays matrix, so every check is a handful of array
+    operations regardless of how many medications there are.
+    """
+
+    def __init__(self, cluster_window: int = 30, cluster_size: int = 3, max_daily_doses: int = 6,
+                 quiet_start: int = 23 * 60, quiet_end: int = 5 * 60):
+        self.cluster_window = cluster_window
+        self.cluster_size = cluster_size
+        self.max_daily_doses = max_daily_doses
+        self.quiet_start = quiet_start
+        self.quiet_end = quiet_end
+
+    def analyze(self, medications: List[Dict[str, Any]]) -> Dict[str, Any]:
+        names = [str(med.get('name') or 'Unknown') for med in medications]
+        minutes, days = self._arrays(medications)
+        valid = minutes >= 0
+        scheduled = valid & days.any(axis=1)
+        doses_per_day = days[scheduled].sum(axis=0)
+
+        insights = []
+        insights.extend(self._invalid_entries(names, valid, days))
+        insights.extend(self._clusters(names, minutes, days, scheduled))
+        insights.extend(self._odd_hours(names, minutes, scheduled))
+        insights.extend(self._empty_days(doses_per_day, scheduled))
+        insights.extend(self._heavy_days(doses_per_day))
+
+        busiest = int(doses_per_day.argmax()) if scheduled.any() else None
+        return {
+            "insights": insights,
+            "summary": {
+                "medications": len(medications),
+                "doses_per_week": int(doses_per_day.sum()),
+                "doses_per_day": {DAY_NAMES[day]: int(count) for day, count in enumerate(doses_per_day)},
+                "max_daily_doses": int(doses_per_day.max()) if scheduled.any() else 0,
+                "busiest_day": DAY_NAMES[busiest] if busiest is not None else None
+            }
+        }
+
+    def _arrays(self, medications: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        minutes = np.fromiter((parse_time(med.get('time')) for med in medications), dtype=np.int32, count=len(medications))
+        days = np.zeros((len(medications), 7), dtype=bool)
+        for row, med in enumerate(medications):
+            for day in med.get('days') or []:
+                if str(day).strip().isdigit() and 0 <= int(day) < 7:
+                    days[row, int(day)] = True
+        return minutes, days
+
+    def _invalid_entries(self, names: List[str], valid: np.ndarray, days: np.ndarray) -> List[Dict[str, Any]]:
+        insights = []
+        bad_time = np.flatnonzero(~valid)
+        if bad_time.size:
+            affected = [names[i] for i in bad_time]
+            insights.append({
+                "type": "data",
+                "urgency": "medium",
+                "message": f"{join_names(affected)} {'has' if len(affected) == 1 else 'have'} no valid reminder time.",
+                "suggestion": "Set a time in HH:MM format so reminders can fire",
+                "medications": affected
+            })
+        no_days = np.flatnonzero(valid & ~days.any(axis=1))
+        if no_days.size:
+            affected = [names[i] for i in no_days]
+            insights.append({
+                "type": "data",
+                "urgency": "medium",
+                "message": f"{join_names(affected)} {'is' if len(affected) == 1 else 'are'} not scheduled on any day.",
+                "suggestion": "Pick the days of the week for this medication",
+                "medications": affected
+            })
+        return insights
+
+    def _clusters(self, names: List[str], minutes: np.ndarray, days: np.ndarray,
+                  scheduled: np.ndarray) -> List[Dict[str, Any]]:
+        rows = np.flatnonzero(scheduled)
+        if rows.size < self.cluster_size:
+            return []
+        rows = rows[np.argsort(minutes[rows], kind="stable")]
+        times = minutes[rows]
+        # Times sit on a 24h circle: the gap after the last dose runs to the first one tomorrow
+        gaps = np.diff(times, append=times[0] + MINUTES_PER_DAY)
+        breaks = np.flatnonzero(gaps > self.cluster_window)
+        if breaks.size:
+            # Start the walk after a wide gap, so a cluster spanning midnight stays in one piece
+            shift = (breaks[-1] + 1) % rows.size
+            rows, times, gaps = np.roll(rows, -shift), np.roll(times, -shift), np.roll(gaps, -shift)
+            ends = np.flatnonzero(gaps > self.cluster_window) + 1
+        else:
+            ends = np.array([rows.size])
+        starts = np.append(0, ends[:-1])
+
+        insights = []
+        for start, end in zip(starts, ends):
+            for members, group_days in self._shared_days(rows[start:end], days):
+                member_times = times[start:end][np.isin(rows[start:end], members)]
+                window = format_minutes(int(member_times[0]))
+                if member_times[-1] != member_times[0]:
+                    window += f"-{format_minutes(int(member_times[-1]))}"
+                affected = [names[i] for i in members]
+                day_names = [DAY_NAMES[day] for day in group_days]
+                when = "every day" if len(day_names) == 7 else f"on {join_names(day_names)}"
+                insights.append({
+                    "type": "cluster",
+                    "urgency": "low",
+                    "message": f"{len(affected)} medications are due around {window} {when}: {join_names(affected)}.",
+                    "suggestion": "A pill organizer helps with grouped doses; ask your pharmacist whether any of them should be spaced apart",
+                    "medications": affected,
+                    "time": window,
+                    "days": day_names
+                })
+        return insights
+
+    def _shared_days(self, rows: np.ndarray, days: np.ndarray) -> List[Tuple[np.ndarray, List[int]]]:
+        """Groups of at least ``cluster_size`` rows taken on the same days, with those days.
+
+        Each day contributes the rows scheduled on it; a group contained in a
+        larger one is left out, so medications that never share a day are
+        never listed together.
+        """
+        groups: Dict[Tuple[int, ...], List[int]] = {}
+        for day in range(7):
+            members = tuple(int(row) for row in rows[days[rows, day]])
+            if len(members) >= self.cluster_size:
+                groups.setdefault(members, []).append(day)
+        return [
+            (np.array(members), group_days) for members, group_days in groups.items()
+            if not any(set(members) < set(other) for other in groups)
+        ]
+
+    def _odd_hours(self, names: List[str], minutes: np.ndarray, scheduled: np.ndarray) -> List[Dict[str, Any]]:
+        odd = np.flatnonzero(scheduled & in_window(minutes, self.quiet_start, self.quiet_end))
+        if not odd.size:
+            return []
+        affected = [f"{names[i]} ({format_minutes(int(minutes[i]))})" for i in odd]
+        return [{
+            "type": "timing",
+            "urgency": "medium",
+            "message": f"{join_names(affected)} {'falls' if len(affected) == 1 else 'fall'} during usual sleeping hours.",
+            "suggestion": "Check whether these doses can move to bedtime or wake-up time so they are not missed",
+            "medications": [names[i] for i in odd]
+        }]
+
+    def _empty_days(self, doses_per_day: np.ndarray, scheduled: np.ndarray) -> List[Dict[str, Any]]:
+        if not scheduled.any():
+            return []
+        empty = np.flatnonzero(doses_per_day == 0)
+        if not empty.size:
+            return []
+        day_names = [DAY_NAMES[day] for day in empty]
+        return [{
+            "type": "gap",
+            "urgency": "low",
+            "message": f"No doses are scheduled on {join_names(day_names)}.",
+            "suggestion": "If that is intended, keep the routine on the other days; otherwise review the selected days",
+            "days": day_names
+        }]
+
+    def _heavy_days(self, doses_per_day: np.ndarray) -> List[Dict[str, Any]]:
+        heavy = np.flatnonzero(doses_per_day > self.max_daily_doses)
+        if not heavy.size:
+            return []
+        day_names = [DAY_NAMES[day] for day in heavy]
+        return [{
+            "type": "load",
+            "urgency": "medium",
+            "message": f"Up to {int(doses_per_day.max())} doses a day on {join_names(day_names)}.",
+            "suggestion": "Ask your doctor or pharmacist whether the regimen can be simplified",
+            "days": day_names
+        }]
+
+
+def format_insights(analysis: Dict[str, Any]) -> str:
+    """Plain-text rendering, used as prompt input and as the rules-only answer"""
+    if not analysis["insights"]:
+        return "No schedule issues found."
+    return "\n".join(
+        f"- {insight['message']} {insight['suggestion']}." for insight in analysis["insights"]
+    )
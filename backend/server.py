@@ -1,18 +1,45 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, ORJSONResponse, Response
+from starlette.background import BackgroundTask
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
 import os
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Literal
 import uuid
-from datetime import datetime
-import requests
+import base64
+from datetime import datetime, timedelta
+import httpx
 import json
+import orjson
+import hashlib
+import hmac
+import asyncio
+import time
+import math
+from response_cache import ResponseCache, make_cache_key, normalize_medications
+from faq_index import FAQIndex
+from write_queue import WriteBehindQueue
+from single_flight import SingleFlight
+from metrics import MetricsRegistry, MetricsMiddleware, MongoPoolMetrics, monitor_event_loop_lag
+from resilience import CircuitBreaker, CircuitOpenError, UpstreamScheduler, parse_retry_after
+from conversation_memory import ConversationMemory, estimate_tokens
+from batch_jobs import BatchJobRunner
+from schedule_analyzer import ScheduleAnalyzer, format_insights
+from rate_limit import ClientRateLimiter, TokenQuota, usage_tokens
+from health import HealthMonitor, OK, DEGRADED, DOWN
+from compression import CompressionMiddleware, StaticPayload
+from chat_archive import ChatArchiver, PromptStore
 
 # Setup logging
-logging.basicConfig(level=logging.INFO)
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
 logger = logging.getLogger(__name__)
 
 # Load environment variables
@@ -27,91 +54,631 @@ OPENAI_API_KEY = os.environ.get('OPENAI_API_KEY')
 if not OPENAI_API_KEY:
     raise ValueError("OPENAI_API_KEY environment variable is required")
 
+OPENAI_MODEL = "gpt-4o"
+
+# Upstream HTTP transport settings
+OPENAI_BASE_URL = os.environ.get('OPENAI_BASE_URL', 'https://api.openai.com/v1')
+OPENAI_MAX_CONNECTIONS = int(os.environ.get('OPENAI_MAX_CONNECTIONS', 50))
+OPENAI_MAX_KEEPALIVE = int(os.environ.get('OPENAI_MAX_KEEPALIVE', 20))
+OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get('OPENAI_KEEPALIVE_EXPIRY', 30))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get('OPENAI_CONNECT_TIMEOUT', 5))
+OPENAI_READ_TIMEOUT = float(os.environ.get('OPENAI_READ_TIMEOUT', 30))
+
+# Shared pooled client, opened in lifespan and reused by every OpenAIChat
+openai_http_client: Optional[httpx.AsyncClient] = None
+
+def create_openai_http_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        base_url=OPENAI_BASE_URL,
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY
+        ),
+        timeout=httpx.Timeout(
+            OPENAI_READ_TIMEOUT,
+            connect=OPENAI_CONNECT_TIMEOUT
+        )
+    )
+
+def get_openai_http_client() -> httpx.AsyncClient:
+    # Lazily create the client when used outside the app lifespan (scripts, benchmarks)
+    global openai_http_client
+    if openai_http_client is None or openai_http_client.is_closed:
+        openai_http_client = create_openai_http_client()
+    return openai_http_client
+
+# Metrics, served in Prometheus text format at /metrics
+metrics = MetricsRegistry()
+HTTP_REQUESTS = metrics.counter("http_requests_total", "HTTP requests by route and status", ["method", "route", "status"])
+HTTP_LATENCY = metrics.histogram("http_request_duration_seconds", "HTTP request latency by route", ["method", "route"])
+HTTP_IN_PROGRESS = metrics.gauge("http_requests_in_progress", "HTTP requests currently being served")
+AI_STAGE_SECONDS = metrics.histogram("ai_stage_duration_seconds", "Time spent in each AI pipeline stage", ["endpoint", "stage"])
+AI_ANSWERS = metrics.counter("ai_answers_total", "AI answers by endpoint and source", ["endpoint", "source"])
+UPSTREAM_LATENCY = metrics.histogram("openai_request_duration_seconds", "Upstream completion latency", ["mode", "status"])
+UPSTREAM_TOKENS = metrics.counter("openai_tokens_total", "Tokens reported by the upstream usage field", ["direction"])
+EVENT_LOOP_LAG = metrics.gauge("event_loop_lag_seconds", "Most recent event loop scheduling delay")
+EVENT_LOOP_LAG_HIST = metrics.histogram(
+    "event_loop_lag_distribution_seconds", "Event loop scheduling delay",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+)
+MONGO_POOL_OPEN = metrics.gauge("mongo_pool_connections", "Open connections in the Mongo pool")
+MONGO_POOL_CHECKED_OUT = metrics.gauge("mongo_pool_checked_out", "Mongo connections currently in use")
+MONGO_POOL_MAX = metrics.gauge("mongo_pool_max_size", "Configured Mongo pool size per server")
+MONGO_CHECKOUT_FAILURES = metrics.counter("mongo_pool_checkout_failures_total", "Failed Mongo connection checkouts", ["reason"])
+mongo_pool_metrics = MongoPoolMetrics(MONGO_POOL_OPEN, MONGO_POOL_CHECKED_OUT, MONGO_CHECKOUT_FAILURES)
+
+def record_token_usage(usage: Optional[Dict[str, Any]]) -> None:
+    if usage:
+        UPSTREAM_TOKENS.inc(usage.get('prompt_tokens', 0), direction="prompt")
+        UPSTREAM_TOKENS.inc(usage.get('completion_tokens', 0), direction="completion")
+
+# Client-side scheduling of upstream calls: concurrency cap, rate limit, retries, circuit breaker
+upstream_scheduler = UpstreamScheduler(
+    max_concurrency=int(os.environ.get('OPENAI_MAX_CONCURRENCY', 32)),
+    rate=float(os.environ.get('OPENAI_RATE_LIMIT_RPS', 0)),
+    burst=float(os.environ.get('OPENAI_RATE_LIMIT_BURST', 10)),
+    max_retries=int(os.environ.get('OPENAI_MAX_RETRIES', 2)),
+    backoff_base=float(os.environ.get('OPENAI_BACKOFF_BASE', 0.5)),
+    backoff_max=float(os.environ.get('OPENAI_BACKOFF_MAX', 8)),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get('OPENAI_CIRCUIT_FAILURES', 5)),
+        reset_timeout=float(os.environ.get('OPENAI_CIRCUIT_RESET', 30))
+    )
+)
+
+def upstream_unavailable(response: Optional[httpx.Response] = None, retry_after: Optional[float] = None) -> HTTPException:
+    # Throttled or circuit open: tell the client when to come back instead of a bare 500
+    if response is not None:
+        retry_after = parse_retry_after(response.headers)
+    retry_after = retry_after if retry_after is not None else upstream_scheduler.backoff_max
+    return HTTPException(
+        status_code=503,
+        detail="AI service is busy, please retry shortly",
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+# Identical concurrent completions share one upstream call
+OPENAI_COALESCE = os.environ.get('OPENAI_COALESCE', 'true').lower() == 'true'
+upstream_single_flight = SingleFlight()
+
 # Simple OpenAI Chat Integration
 class OpenAIChat:
-    def __init__(self, api_key: str, model: str = "gpt-4o", system_message: str = ""):
+    def __init__(self, api_key: str, model: str = "gpt-4o", system_message: str = "", http_client: Optional[httpx.AsyncClient] = None, history: Optional[List[Dict[str, str]]] = None):
         self.api_key = api_key
         self.model = model
         self.system_message = system_message
+        self.http_client = http_client
+        self.history = history or []
+        # Upstream usage of the last call, for per-client quota accounting
+        self.usage: Optional[Dict[str, Any]] = None
         self.headers = {
             "Authorization": f"Bearer {api_key}",
             "Content-Type": "application/json"
         }
         
+    def build_payload(self, user_message: str, stream: bool = False) -> Dict[str, Any]:
+        messages = []
+        if self.system_message:
+            messages.append({"role": "system", "content": self.system_message})
+        messages.extend(self.history)
+        messages.append({"role": "user", "content": user_message})
+        
+        payload = {
+            "model": self.model,
+            "messages": messages,
+            "max_tokens": 1000,
+            "temperature": 0.7
+        }
+        if stream:
+            payload["stream"] = True
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+        
+    def coalesce_key(self, payload: Dict[str, Any]) -> str:
+        return hashlib.sha256(orjson.dumps(payload, option=orjson.OPT_SORT_KEYS)).hexdigest()
+        
     async def send_message(self, user_message: str) -> str:
+        payload = self.build_payload(user_message)
+        if not OPENAI_COALESCE:
+            content, self.usage = await self._complete(payload)
+            return content
+        # Coalesced callers each get (and are charged for) the shared answer
+        content, self.usage = await upstream_single_flight.do(
+            self.coalesce_key(payload),
+            lambda: self._complete(payload)
+        )
+        return content
+        
+    async def _complete(self, payload: Dict[str, Any]) -> tuple:
         try:
-            messages = []
-            if self.system_message:
-                messages.append({"role": "system", "content": self.system_message})
-            messages.append({"role": "user", "content": user_message})
-            
-            payload = {
-                "model": self.model,
-                "messages": messages,
-                "max_tokens": 1000,
-                "temperature": 0.7
-            }
-            
-            response = requests.post(
-                "https://api.openai.com/v1/chat/completions",
+            http_client = self.http_client or get_openai_http_client()
+            started = time.perf_counter()
+            async with upstream_scheduler.request(lambda: http_client.post(
+                "/chat/completions",
                 headers=self.headers,
-                json=payload,
-                timeout=30
-            )
-            
-            if response.status_code != 200:
-                logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
-                raise HTTPException(status_code=500, detail="AI service unavailable")
+                json=payload
+            )) as response:
+                UPSTREAM_LATENCY.observe(time.perf_counter() - started, mode="complete", status=str(response.status_code))
                 
-            result = response.json()
-            return result['choices'][0]['message']['content']
+                if response.status_code == 429:
+                    raise upstream_unavailable(response)
+                if response.status_code != 200:
+                    logger.error(f"OpenAI API error: {response.status_code} - {response.text}")
+                    raise HTTPException(status_code=500, detail="AI service unavailable")
+                    
+                result = response.json()
+            record_token_usage(result.get('usage'))
+            return result['choices'][0]['message']['content'], result.get('usage')
             
-        except requests.exceptions.RequestException as e:
+        except HTTPException:
+            raise
+        except CircuitOpenError as e:
+            raise upstream_unavailable(retry_after=e.retry_after)
+        except httpx.HTTPError as e:
             logger.error(f"OpenAI request failed: {str(e)}")
             raise HTTPException(status_code=500, detail="AI service error")
         except Exception as e:
             logger.error(f"OpenAI processing error: {str(e)}")
             raise HTTPException(status_code=500, detail="AI processing error")
+    
+    async def stream_message(self, user_message: str) -> AsyncIterator[str]:
+        """Yield completion text deltas as the upstream produces them"""
+        try:
+            payload = self.build_payload(user_message, stream=True)
+            
+            http_client = self.http_client or get_openai_http_client()
+            started = time.perf_counter()
+            # Retries only happen before the first byte; a broken stream is not replayed
+            async with upstream_scheduler.request(lambda: http_client.send(
+                http_client.build_request(
+                    "POST",
+                    "/chat/completions",
+                    headers=self.headers,
+                    json=payload
+                ),
+                stream=True
+            )) as response:
+                UPSTREAM_LATENCY.observe(time.perf_counter() - started, mode="stream_first_byte", status=str(response.status_code))
+                if response.status_code == 429:
+                    raise upstream_unavailable(response)
+                if response.status_code != 200:
+                    body = await response.aread()
+                    logger.error(f"OpenAI API error: {response.status_code} - {body.decode(errors='replace')}")
+                    raise HTTPException(status_code=500, detail="AI service unavailable")
+                
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        break
+                    chunk = orjson.loads(data)
+                    if chunk.get('usage'):
+                        self.usage = chunk['usage']
+                        record_token_usage(self.usage)
+                    if not chunk.get('choices'):
+                        continue
+                    delta = chunk['choices'][0].get('delta', {}).get('content')
+                    if delta:
+                        yield delta
+                        
+        except HTTPException:
+            raise
+        except CircuitOpenError as e:
+            raise upstream_unavailable(retry_after=e.retry_after)
+        except httpx.HTTPError as e:
+            logger.error(f"OpenAI stream failed: {str(e)}")
+            raise HTTPException(status_code=500, detail="AI service error")
+        except Exception as e:
+            logger.error(f"OpenAI stream processing error: {str(e)}")
+            raise HTTPException(status_code=500, detail="AI processing error")
 
 # MongoDB connection for Atlas
 mongo_url = os.environ['MONGO_URL']
 db_name = os.environ.get('DB_NAME', 'pill_reminder')
 
-# Configure MongoDB client for Atlas
-client = AsyncIOMotorClient(
-    mongo_url,
-    tlsAllowInvalidCertificates=True,
-    maxPoolSize=10,
-    retryWrites=True
+# Pool size is per worker process: total connections = workers x MONGO_MAX_POOL_SIZE
+MONGO_MAX_POOL_SIZE = int(os.environ.get('MONGO_MAX_POOL_SIZE', 10))
+MONGO_MIN_POOL_SIZE = int(os.environ.get('MONGO_MIN_POOL_SIZE', 0))
+
+# Created in lifespan (or by connect_database() in scripts), not at import:
+# a mongodb+srv:// URL costs a DNS lookup when the client is built
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def create_mongo_client() -> AsyncIOMotorClient:
+    # Configure MongoDB client for Atlas
+    return AsyncIOMotorClient(
+        mongo_url,
+        tlsAllowInvalidCertificates=True,
+        maxPoolSize=MONGO_MAX_POOL_SIZE,
+        minPoolSize=MONGO_MIN_POOL_SIZE,
+        retryWrites=True,
+        event_listeners=[mongo_pool_metrics]
+    )
+
+# Recommendation response cache (in-process LRU, optionally shared through Mongo)
+RECOMMENDATION_PROMPT_VERSION = "2024-07-v3"
+RECOMMENDATION_CACHE_TTL = float(os.environ.get('RECOMMENDATION_CACHE_TTL', 6 * 3600))
+RECOMMENDATION_CACHE_SIZE = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 2048))
+RECOMMENDATION_CACHE_SHARED = os.environ.get('RECOMMENDATION_CACHE_SHARED', 'false').lower() == 'true'
+
+recommendation_cache = ResponseCache(
+    max_entries=RECOMMENDATION_CACHE_SIZE,
+    ttl_seconds=RECOMMENDATION_CACHE_TTL,
+    collection=None
 )
-db = client[db_name]
 
-from contextlib import asynccontextmanager
+# Rule-based schedule checks: prompt input, insights-only answers and the fallback
+# when the upstream is down
+schedule_analyzer = ScheduleAnalyzer(
+    cluster_window=int(os.environ.get('SCHEDULE_CLUSTER_WINDOW_MINUTES', 30)),
+    cluster_size=int(os.environ.get('SCHEDULE_CLUSTER_SIZE', 3)),
+    max_daily_doses=int(os.environ.get('SCHEDULE_MAX_DAILY_DOSES', 6))
+)
+RECOMMENDATION_FALLBACK = os.environ.get('RECOMMENDATION_FALLBACK', 'true').lower() == 'true'
 
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    # Startup
-    logger.info("🚀 Starting Pill Reminder API...")
+# Per-client limits on the AI endpoints (0 disables a limit). Requests are limited per
+# client IP and, when they carry one, per session; RATE_LIMIT_SHARED also counts them
+# in Mongo so the limits hold across workers
+RATE_LIMIT_PER_MINUTE = float(os.environ.get('RATE_LIMIT_PER_MINUTE', 20))
+RATE_LIMIT_BURST = float(os.environ.get('RATE_LIMIT_BURST', 10))
+RATE_LIMIT_IP_PER_MINUTE = float(os.environ.get('RATE_LIMIT_IP_PER_MINUTE', 60))
+RATE_LIMIT_IP_BURST = float(os.environ.get('RATE_LIMIT_IP_BURST', 30))
+RATE_LIMIT_SHARED = os.environ.get('RATE_LIMIT_SHARED', 'false').lower() == 'true'
+DAILY_TOKEN_QUOTA = int(os.environ.get('DAILY_TOKEN_QUOTA', 200000))
+# Proxies in front of the app that append to X-Forwarded-For. With the default of 0 the
+# header is ignored and the socket peer is the client; deployments behind a proxy (Render
+# adds one) must set this, otherwise every client shares the proxy's rate limit
+FORWARDED_HOPS = int(os.environ.get('FORWARDED_HOPS', 0))
+
+session_rate_limiter = ClientRateLimiter(RATE_LIMIT_PER_MINUTE, RATE_LIMIT_BURST)
+ip_rate_limiter = ClientRateLimiter(RATE_LIMIT_IP_PER_MINUTE, RATE_LIMIT_IP_BURST)
+token_quota = TokenQuota(DAILY_TOKEN_QUOTA)
+AI_RATE_LIMITED = metrics.counter("ai_rate_limited_total", "AI requests rejected with 429", ["endpoint", "reason"])
+
+def client_ip(request: Request) -> str:
+    forwarded = [ip.strip() for ip in request.headers.get("x-forwarded-for", "").split(",") if ip.strip()]
+    # Only the entries added by our own proxies can be trusted; the rest are client-supplied
+    if FORWARDED_HOPS > 0 and forwarded:
+        return forwarded[-min(FORWARDED_HOPS, len(forwarded))]
+    return request.client.host if request.client else "unknown"
+
+def too_many_requests(detail: str, retry_after: float) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=detail,
+        headers={"Retry-After": str(max(1, math.ceil(retry_after)))}
+    )
+
+async def enforce_client_limits(http_request: Request, session_id: Optional[str], endpoint: str, uses_upstream: bool = True) -> List[str]:
+    """Raise 429 for a client over its rate or daily quota; return the keys usage is charged to"""
+    ip_key = f"ip:{client_ip(http_request)}"
+    # The session id is chosen by the client, so the IP's quota always applies as well
+    quota_keys = [f"session:{session_id}", ip_key] if session_id else [ip_key]
+    
+    retry_after = await ip_rate_limiter.check(ip_key)
+    if not retry_after and session_id:
+        retry_after = await session_rate_limiter.check(quota_keys[0])
+    if retry_after:
+        AI_RATE_LIMITED.inc(endpoint=endpoint, reason="rate")
+        raise too_many_requests("Too many requests, please slow down", retry_after)
+    
+    if uses_upstream:
+        retry_after = max([await token_quota.retry_after(key) for key in quota_keys])
+        if retry_after:
+            AI_RATE_LIMITED.inc(endpoint=endpoint, reason="quota")
+            raise too_many_requests("Daily AI usage limit reached", retry_after)
+    return quota_keys
+
+async def charge_quota(quota_keys: Optional[List[str]], tokens: int) -> None:
+    for key in quota_keys or []:
+        await token_quota.add(key, tokens)
+
+# Batch jobs fan out to thousands of upstream calls, so they are for operators only
+BATCH_API_KEY = os.environ.get('BATCH_API_KEY', '')
+
+def require_batch_key(http_request: Request) -> None:
+    if not BATCH_API_KEY:
+        raise HTTPException(status_code=403, detail="Batch recommendations are disabled")
+    supplied = http_request.headers.get("x-api-key", "")
+    authorization = http_request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        supplied = authorization[7:].strip()
+    if not hmac.compare_digest(supplied.encode(), BATCH_API_KEY.encode()):
+        raise HTTPException(status_code=401, detail="Invalid API key", headers={"WWW-Authenticate": "Bearer"})
+
+# Bulk recommendation jobs (results are persisted so a job can be resumed)
+BATCH_CONCURRENCY = int(os.environ.get('BATCH_CONCURRENCY', 8))
+BATCH_MAX_SCHEDULES = int(os.environ.get('BATCH_MAX_SCHEDULES', 5000))
+BATCH_LEASE_SECONDS = float(os.environ.get('BATCH_LEASE_SECONDS', 60))
+
+# Chat records are written behind the response in batches
+chat_write_queue = WriteBehindQueue(
+    None,
+    max_size=int(os.environ.get('CHAT_WRITE_QUEUE_SIZE', 5000)),
+    batch_size=int(os.environ.get('CHAT_WRITE_BATCH_SIZE', 100)),
+    flush_interval=float(os.environ.get('CHAT_WRITE_FLUSH_INTERVAL', 0.5)),
+    spill_path=Path(os.environ.get('CHAT_WRITE_SPILL_PATH', ROOT_DIR / 'chat_history_spill.jsonl'))
+)
+
+# Multi-turn conversation memory: recent turns per session within a token budget
+conversation_memory = ConversationMemory(
+    max_sessions=int(os.environ.get('CONVERSATION_CACHE_SESSIONS', 1000)),
+    token_budget=int(os.environ.get('CONVERSATION_TOKEN_BUDGET', 1500)),
+    summary_token_budget=int(os.environ.get('CONVERSATION_SUMMARY_TOKEN_BUDGET', 200)),
+    max_turns=int(os.environ.get('CONVERSATION_MAX_TURNS', 20)),
+    ttl_seconds=float(os.environ.get('CONVERSATION_CACHE_TTL', 600))
+)
+
+async def load_session_turns(session_id: str, limit: int) -> List[tuple]:
+    try:
+        projection = {"_id": 0, "id": 1, "timestamp": 1, "user_message": 1, "ai_response": 1}
+        docs = [doc async for doc in session_history(session_id, None, projection, limit)]
+    except Exception as e:
+        logger.error(f"Loading conversation {session_id} failed: {str(e)}")
+        return []
+    return [(doc["user_message"], doc["ai_response"]) for doc in reversed(docs)]
+
+async def get_conversation_history(session_id: Optional[str]) -> List[Dict[str, str]]:
+    # New sessions have nothing to load
+    if not session_id:
+        return []
+    memory = await conversation_memory.get(session_id, load_session_turns)
+    return conversation_memory.messages(memory)
+
+# Copy component stats into metrics at scrape time: running totals as counters, levels as gauges
+WRITE_QUEUE_DEPTH = metrics.gauge("chat_write_queue_depth", "Chat records waiting to be flushed")
+WRITE_QUEUE_FLUSHED = metrics.counter("chat_write_queue_flushed_total", "Chat records flushed")
+WRITE_QUEUE_SPILLED = metrics.counter("chat_write_queue_spilled_total", "Chat records spilled to the local file")
+WRITE_QUEUE_FLUSH_MS = metrics.gauge("chat_write_queue_flush_ms", "Write-behind flush latency", ["stat"])
+COALESCED_CALLS = metrics.counter("openai_coalesced_calls_total", "Completion calls by single-flight role", ["role"])
+RESPONSE_CACHE = metrics.counter("recommendation_cache_events_total", "Recommendation cache lookups by outcome", ["outcome"])
+CONVERSATION_CACHE = metrics.gauge("conversation_cache", "Conversation memory cache size", ["stat"])
+CONVERSATION_CACHE_EVENTS = metrics.counter("conversation_cache_events_total", "Conversation memory cache events", ["event"])
+UPSTREAM_IN_FLIGHT = metrics.gauge("openai_scheduler_in_flight", "Upstream calls in flight")
+UPSTREAM_SCHEDULER = metrics.counter("openai_scheduler_events_total", "Upstream scheduler events", ["event"])
+UPSTREAM_CIRCUIT_STATE = metrics.gauge("openai_circuit_state", "Upstream circuit breaker state (1 for the current state)", ["state"])
+
+def collect_component_stats() -> None:
+    queue_stats = chat_write_queue.stats()
+    WRITE_QUEUE_DEPTH.set(queue_stats["depth"])
+    WRITE_QUEUE_FLUSHED.set_total(queue_stats["flushed"])
+    WRITE_QUEUE_SPILLED.set_total(queue_stats["spilled"])
+    for stat in ("last", "avg", "max"):
+        WRITE_QUEUE_FLUSH_MS.set(queue_stats[f"{stat}_flush_ms"], stat=stat)
+    COALESCED_CALLS.set_total(upstream_single_flight.calls, role="leader")
+    COALESCED_CALLS.set_total(upstream_single_flight.coalesced, role="coalesced")
+    cache_stats = recommendation_cache.stats()
+    for outcome in ("hits", "shared_hits", "misses", "bypassed", "evictions"):
+        RESPONSE_CACHE.set_total(cache_stats[outcome], outcome=outcome)
+    memory_stats = conversation_memory.stats()
+    for stat in ("sessions", "max_sessions"):
+        CONVERSATION_CACHE.set(memory_stats[stat], stat=stat)
+    for event in ("hits", "misses", "evictions"):
+        CONVERSATION_CACHE_EVENTS.set_total(memory_stats[event], event=event)
+    scheduler_stats = upstream_scheduler.stats()
+    UPSTREAM_IN_FLIGHT.set(scheduler_stats["in_flight"])
+    for event in ("retries", "throttled", "circuit_times_opened", "circuit_rejected"):
+        UPSTREAM_SCHEDULER.set_total(scheduler_stats[event], event=event)
+    for state in (CircuitBreaker.CLOSED, CircuitBreaker.HALF_OPEN, CircuitBreaker.OPEN):
+        UPSTREAM_CIRCUIT_STATE.set(1 if upstream_scheduler.breaker.state == state else 0, state=state)
+
+metrics.on_collect(collect_component_stats)
+
+# Readiness is computed off the request path; probes only read the cached report
+HEALTH_CHECK_INTERVAL = float(os.environ.get('HEALTH_CHECK_INTERVAL', 10))
+HEALTH_CHECK_TIMEOUT = float(os.environ.get('HEALTH_CHECK_TIMEOUT', 2))
+HEALTH_FAILURE_THRESHOLD = int(os.environ.get('HEALTH_FAILURE_THRESHOLD', 3))
+HEALTH_MONGO_SLOW_MS = float(os.environ.get('HEALTH_MONGO_SLOW_MS', 250))
+HEALTH_SATURATION = float(os.environ.get('HEALTH_SATURATION', 0.9))
+health_monitor = HealthMonitor(
+    interval=HEALTH_CHECK_INTERVAL,
+    timeout=HEALTH_CHECK_TIMEOUT,
+    failure_threshold=HEALTH_FAILURE_THRESHOLD
+)
+HEALTH_CHECK_STATUS = metrics.gauge("health_check_status", "Last health check result (0 ok, 1 degraded, 2 down)", ["check"])
+
+async def check_mongo():
+    if db is None:
+        return DOWN, {"error": "not connected"}
+    started = time.perf_counter()
+    await db.command("ping")
+    latency_ms = (time.perf_counter() - started) * 1000
+    checked_out = MONGO_POOL_CHECKED_OUT.value()
+    saturation = checked_out / MONGO_MAX_POOL_SIZE if MONGO_MAX_POOL_SIZE else 0.0
+    slow = latency_ms > HEALTH_MONGO_SLOW_MS or saturation >= HEALTH_SATURATION
+    return DEGRADED if slow else OK, {
+        "latency_ms": round(latency_ms, 2),
+        "pool_checked_out": int(checked_out),
+        "pool_max_size": MONGO_MAX_POOL_SIZE,
+        "pool_saturation": round(saturation, 2)
+    }
+
+async def check_upstream():
+    # Only the scheduler's own state: probing OpenAI from every worker would cost tokens
+    stats = upstream_scheduler.stats()
+    saturation = stats["in_flight"] / stats["max_concurrency"] if stats["max_concurrency"] else 0.0
+    healthy = stats["circuit_state"] == CircuitBreaker.CLOSED and saturation < HEALTH_SATURATION
+    return OK if healthy else DEGRADED, {
+        "circuit_state": stats["circuit_state"],
+        "circuit_failures": stats["circuit_failures"],
+        "in_flight": stats["in_flight"],
+        "max_concurrency": stats["max_concurrency"],
+        "saturation": round(saturation, 2)
+    }
+
+async def check_write_queue():
+    stats = chat_write_queue.stats()
+    fill = stats["depth"] / stats["max_size"] if stats["max_size"] else 0.0
+    healthy = chat_write_queue.running and fill < HEALTH_SATURATION
+    return OK if healthy else DEGRADED, {
+        "depth": stats["depth"],
+        "max_size": stats["max_size"],
+        "fill": round(fill, 2),
+        "spilled": stats["spilled"],
+        "failed_flushes": stats["failed_flushes"]
+    }
+
+# Without Mongo nothing works; a busy upstream or a backed-up queue only degrades the service
+health_monitor.add_check("mongo", check_mongo)
+health_monitor.add_check("upstream", check_upstream, critical=False)
+health_monitor.add_check("write_queue", check_write_queue, critical=False)
+
+def collect_health_stats() -> None:
+    report = health_monitor.report
+    if report is None:
+        return
+    for name, check in report["checks"].items():
+        HEALTH_CHECK_STATUS.set((OK, DEGRADED, DOWN).index(check["status"]), check=name)
+
+metrics.on_collect(collect_health_stats)
+
+# Optional expiry of old chat records (0 keeps history forever)
+CHAT_HISTORY_TTL_DAYS = float(os.environ.get('CHAT_HISTORY_TTL_DAYS', 0))
+CHAT_HISTORY_TTL_INDEX = "chat_history_ttl"
+
+# Background compaction: prompt bodies stored once, idle sessions moved to compressed archives
+CHAT_ARCHIVE_AFTER_DAYS = float(os.environ.get('CHAT_ARCHIVE_AFTER_DAYS', 90))
+CHAT_COMPACTION_INTERVAL = float(os.environ.get('CHAT_COMPACTION_INTERVAL', 3600))
+prompt_store = PromptStore(None, cache_size=int(os.environ.get('CHAT_PROMPT_CACHE_SIZE', 512)))
+chat_archiver = ChatArchiver(
+    None, None, prompt_store, None,
+    archive_after=timedelta(days=CHAT_ARCHIVE_AFTER_DAYS) if CHAT_ARCHIVE_AFTER_DAYS > 0 else None,
+    expire_after=timedelta(days=CHAT_HISTORY_TTL_DAYS) if CHAT_HISTORY_TTL_DAYS > 0 else None,
+    chunk_size=int(os.environ.get('CHAT_ARCHIVE_CHUNK_SIZE', 500)),
+    interval=CHAT_COMPACTION_INTERVAL
+)
+# Every stored chat record moves its session's last_activity, which archiving selects on
+chat_write_queue.on_write = chat_archiver.record_activity
+
+async def ensure_indexes():
+    """Create the indexes the API queries rely on (no-op when they already exist)"""
+    # History reads filter by session and sort newest first; deletes filter by session
+    # (id is the keyset pagination tie-breaker)
+    await db.chat_history.create_index(
+        [("session_id", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)],
+        name="session_id_timestamp_id"
+    )
+    await db.chat_history.create_index("id", unique=True, name="id_unique")
+    await db.status_checks.create_index("id", unique=True, name="id_unique")
+    await db.status_checks.create_index(
+        [("timestamp", ASCENDING), ("id", ASCENDING)],
+        name="timestamp_id"
+    )
+    
+    if CHAT_HISTORY_TTL_DAYS > 0:
+        expire_after = int(CHAT_HISTORY_TTL_DAYS * 86400)
+        try:
+            await db.chat_history.create_index(
+                "timestamp",
+                name=CHAT_HISTORY_TTL_INDEX,
+                expireAfterSeconds=expire_after
+            )
+        except OperationFailure as e:
+            if e.code != 85:  # IndexOptionsConflict: TTL changed since last start
+                raise
+            await db.command(
+                "collMod",
+                "chat_history",
+                index={"name": CHAT_HISTORY_TTL_INDEX, "expireAfterSeconds": expire_after}
+            )
+        logger.info(f"✅ Chat history expires after {CHAT_HISTORY_TTL_DAYS:g} days")
+    
+    await recommendation_cache.ensure_indexes()
+    await batch_runner.ensure_indexes()
+    await session_rate_limiter.ensure_indexes()
+    await token_quota.ensure_indexes()
+    await chat_archiver.ensure_indexes()
+
+def bind_database(database) -> None:
+    """Point the module and the Mongo-backed components at ``database``"""
+    global db
+    db = database
+    recommendation_cache.collection = database.ai_response_cache if RECOMMENDATION_CACHE_SHARED else None
+    chat_write_queue.collection = database.chat_history
+    prompt_store.collection = database.chat_prompts
+    chat_archiver.history = database.chat_history
+    chat_archiver.archives = database.chat_archives
+    chat_archiver.locks = database.maintenance_locks
+    chat_archiver.sessions = database.chat_sessions
+    batch_runner.jobs = database.recommendation_jobs
+    batch_runner.items = database.recommendation_job_items
+    batch_runner.results = database.recommendation_job_results
+    if RATE_LIMIT_SHARED:
+        session_rate_limiter.collection = database.rate_limits
+        ip_rate_limiter.collection = database.rate_limits
+        token_quota.collection = database.token_usage
+
+def connect_database():
+    """Create the client unless a database is already bound (e.g. an in-memory one in benchmarks)"""
+    global client
+    if db is None:
+        client = create_mongo_client()
+        MONGO_POOL_MAX.set(MONGO_MAX_POOL_SIZE)
+        bind_database(client[db_name])
+    return db
+
+async def bootstrap_database():
     try:
         # Test database connection
         await db.list_collection_names()
         logger.info("✅ Database connected successfully")
     except Exception as e:
         logger.error(f"❌ Database connection failed: {e}")
+        return
+    try:
+        await ensure_indexes()
+        logger.info("✅ Database indexes ready")
+    except Exception as e:
+        logger.error(f"❌ Index bootstrap failed: {e}")
+
+from contextlib import asynccontextmanager
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global openai_http_client, client, db
+    # Startup
+    logger.info("🚀 Starting Pill Reminder API...")
+    openai_http_client = create_openai_http_client()
+    logger.info(f"✅ OpenAI client ready (pool: {OPENAI_MAX_CONNECTIONS} connections)")
+    connect_database()
+    await bootstrap_database()
+    # Readiness reflects the bootstrapped database from the first probe on
+    await health_monitor.refresh()
+    
+    chat_write_queue.start()
+    health_monitor.start()
+    if CHAT_COMPACTION_INTERVAL > 0:
+        chat_archiver.start()
+    loop_lag_task = asyncio.create_task(monitor_event_loop_lag(EVENT_LOOP_LAG, EVENT_LOOP_LAG_HIST))
     
     yield
     
     # Shutdown
     logger.info("🔄 Shutting down Pill Reminder API...")
-    client.close()
-    logger.info("✅ Database connection closed")
+    loop_lag_task.cancel()
+    await health_monitor.stop()
+    await chat_archiver.stop()
+    await batch_runner.shutdown()
+    logger.info("✅ Batch jobs stopped (resumable)")
+    await chat_write_queue.stop()
+    logger.info(f"✅ Chat write queue flushed ({chat_write_queue.flushed} records written)")
+    await openai_http_client.aclose()
+    logger.info("✅ OpenAI client closed")
+    if client is not None:
+        client.close()
+        logger.info("✅ Database connection closed")
+        client, db = None, None
 
 # Create the main app without a prefix
 app = FastAPI(
     title="Simple Pill Reminder API",
     description="AI-powered medication reminder API with personalized insights",
     version="1.4.0",
-    lifespan=lifespan
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
 # Create a router with the /api prefix
@@ -152,6 +719,14 @@ class ChatResponse(BaseModel):
 class RecommendationRequest(BaseModel):
     medications: List[Dict[str, Any]]
     session_id: Optional[str] = None
+    bypass_cache: bool = False
+    # "insights" answers from the schedule checks alone, without calling the model
+    mode: Literal["ai", "insights"] = "ai"
+
+class RecommendationResponse(ChatResponse):
+    insights: List[Dict[str, Any]] = []
+    summary: Dict[str, Any] = {}
+    source: str = "model"
 
 # Medication Models for context
 class Medication(BaseModel):
@@ -162,94 +737,432 @@ class Medication(BaseModel):
     icon: str = "💊"
     created_at: str
 
+# Static help content, shared by the help endpoints and the FAQ index
+QUICK_TIPS = [
+    "💊 Take medications at the same time daily for better habit formation",
+    "⏰ Set up multiple reminder methods: app notifications + alarms",
+    "📅 Use a weekly pill organizer for complex schedules",
+    "🍽️ Link medication times to meals for better memory",
+    "📱 Keep your phone charged to ensure you get notifications",
+    "🩺 Never skip doses without consulting your healthcare provider",
+    "💧 Always take pills with enough water",
+    "📋 Keep an updated medication list for emergencies"
+]
+
+HELP_TOPICS = {
+    "adding_medications": {
+        "title": "Adding Medications",
+        "steps": [
+            "Tap the + button at the bottom right",
+            "Enter your medication name",
+            "Set the time you need to take it",
+            "Select the days of the week",
+            "Tap 'Add Medication'"
+        ]
+    },
+    "notifications": {
+        "title": "Setting Up Notifications",
+        "steps": [
+            "Allow notifications when prompted",
+            "Notifications are automatically set when you add medications",
+            "You can tap 'Taken' directly from the notification",
+            "Make sure your phone isn't in Do Not Disturb mode"
+        ]
+    },
+    "taking_medications": {
+        "title": "Marking Medications as Taken",
+        "steps": [
+            "Find your medication on today's schedule",
+            "Tap the 'Take' button",
+            "The medication will be marked with a green checkmark",
+            "You can also mark as taken from notifications"
+        ]
+    },
+    "managing_medications": {
+        "title": "Managing Your Medications",
+        "steps": [
+            "View all medications in the 'All Medications' section",
+            "Tap the three dots (⋯) to see options",
+            "Delete medications you no longer need",
+            "Use Settings to clear all data if needed"
+        ]
+    }
+}
+
+# Phrasings of the frontend's support quick questions that each help topic answers
+HELP_TOPIC_QUESTIONS = {
+    "adding_medications": [
+        "How do I add a new medication?",
+        "How can I add medications to the app?"
+    ],
+    "notifications": [
+        "Why didn't I get a notification?",
+        "How do I set up notifications?",
+        "Notifications are not working"
+    ],
+    "taking_medications": [
+        "How do I mark a medication as taken?",
+        "How do I take a dose in the app?"
+    ],
+    "managing_medications": [
+        "How do I delete a medication?",
+        "How do I manage or remove my medications?"
+    ]
+}
+
+# Help payloads never change while the process runs: serialize and compress them once
+STATIC_CACHE_MAX_AGE = int(os.environ.get('STATIC_CACHE_MAX_AGE', 3600))
+quick_tips_payload = StaticPayload({"tips": QUICK_TIPS}, max_age=STATIC_CACHE_MAX_AGE)
+app_help_payload = StaticPayload({"help_topics": HELP_TOPICS}, max_age=STATIC_CACHE_MAX_AGE)
+
+# Dynamic responses (chat history pages, batch results) are gzipped on the fly above this size
+GZIP_ENABLED = os.environ.get('GZIP_ENABLED', 'true').lower() == 'true'
+GZIP_MINIMUM_SIZE = int(os.environ.get('GZIP_MINIMUM_SIZE', 1024))
+GZIP_LEVEL = int(os.environ.get('GZIP_LEVEL', 6))
+
+# Semantic FAQ cache for non-personalized support questions
+FAQ_CACHE_ENABLED = os.environ.get('FAQ_CACHE_ENABLED', 'true').lower() == 'true'
+FAQ_CACHE_THRESHOLD = float(os.environ.get('FAQ_CACHE_THRESHOLD', 0.8))
+FAQ_CACHE_SIZE = int(os.environ.get('FAQ_CACHE_SIZE', 2000))
+
+def format_help_topic(topic: Dict[str, Any]) -> str:
+    steps = "\n".join(f"{i}. {step}" for i, step in enumerate(topic["steps"], 1))
+    return f"{topic['title']}:\n{steps}"
+
+def build_faq_index() -> FAQIndex:
+    index = FAQIndex(max_entries=FAQ_CACHE_SIZE)
+    for key, topic in HELP_TOPICS.items():
+        answer = format_help_topic(topic)
+        index.add(topic["title"], answer, source="help")
+        for question in HELP_TOPIC_QUESTIONS.get(key, []):
+            index.add(question, answer, source="help")
+    return index
+
+faq_index = build_faq_index()
+
 # AI Assistant Configuration
-def get_system_message(message_type: str, medications: Optional[List[Dict]] = None, user_context: Optional[Dict] = None) -> str:
-    base_prompt = """You are a helpful AI assistant for a medication reminder app called "Simple Pill Reminder". 
-    You provide friendly, informative support while being mindful that you're not a doctor and should not provide medical advice.
-    
-    Always be helpful, concise, and encourage users to consult healthcare professionals for medical decisions.
+# The static part of every system prompt comes first and is byte-identical across
+# requests so the upstream can reuse its prompt-prefix cache; per-user data follows.
+BASE_PROMPT = (
+    'You are a helpful AI assistant for a medication reminder app called "Simple Pill Reminder".\n'
+    "You provide friendly, informative support while being mindful that you're not a doctor and should not provide medical advice.\n"
+    "Always be helpful, concise, and encourage users to consult healthcare professionals for medical decisions.\n"
+    "IMPORTANT: You have access to user's personal medication data and can provide personalized insights."
+)
+
+ROLE_PROMPTS = {
+    "support": (
+        "Your role is to help users with:\n"
+        "- How to use the app features\n"
+        "- Troubleshooting app issues\n"
+        "- General questions about medication reminders\n"
+        "- Technical support\n"
+        "- Personal medication management based on their data\n"
+        "Keep responses friendly and helpful. If you see concerning patterns in their data, gently suggest consulting their healthcare provider.\n"
+        "Be encouraging about their progress and provide practical tips."
+    ),
+    "recommendation": (
+        "Your role is to provide personalized wellness and medication management tips based on the user's medication schedule and adherence data.\n"
+        "Focus on:\n"
+        "- Personalized schedule optimization\n"
+        "- Adherence improvement strategies based on their actual performance\n"
+        "- Celebrating their successes and gently addressing concerns\n"
+        "- Practical tips that fit their lifestyle patterns\n"
+        "Be specific and actionable. Use their personal data to make relevant suggestions."
+    ),
+    "general": (
+        "Your role is to provide general health and medication information while considering their personal medication journey.\n"
+        "Focus on:\n"
+        "- General health education appropriate to their situation\n"
+        "- Motivation and psychological support based on their progress\n"
+        "- When to consult healthcare providers\n"
+        "- Wellness tips that complement their medication routine\n"
+        "Be encouraging and acknowledge their efforts in managing their health."
+    )
+}
+
+SYSTEM_PROMPT_PREFIXES = {
+    message_type: BASE_PROMPT + "\n\n" + role_prompt
+    for message_type, role_prompt in ROLE_PROMPTS.items()
+}
+
+# Budget for the per-user part of the system prompt; medications beyond it are summarized
+PROMPT_CONTEXT_TOKEN_BUDGET = int(os.environ.get('PROMPT_CONTEXT_TOKEN_BUDGET', 400))
+PROMPT_LIST_ITEMS = 3
+# Client-supplied strings (achievements, concerns, ...) are cut to this length each
+PROMPT_ITEM_CHARS = 120
+
+def compact_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+
+def clip_text(value: Any, max_chars: int = PROMPT_ITEM_CHARS) -> Any:
+    if not isinstance(value, str):
+        return value
+    text = " ".join(value.split())
+    return text if len(text) <= max_chars else text[:max_chars - 1].rstrip() + "…"
+
+def format_user_context(user_context: Dict[str, Any], token_budget: int = PROMPT_CONTEXT_TOKEN_BUDGET) -> str:
+    """Render the user's context within ``token_budget``, dropping list items from the end until it fits"""
+    context = {
+        "adherence_rate": clip_text(user_context.get('adherence_rate', 0)),
+        "consecutive_days": clip_text(user_context.get('consecutive_days', 0)),
+        "total_medications": clip_text(user_context.get('total_medications', 0)),
+        "missed_doses": clip_text(user_context.get('missed_doses', 0)),
+        "needs_motivation": clip_text(user_context.get('needs_motivation', False)),
+        "recent_achievements": [clip_text(str(item)) for item in list(user_context.get('recent_achievements') or [])[:PROMPT_LIST_ITEMS]],
+        "current_concerns": [clip_text(str(item)) for item in list(user_context.get('current_concerns') or [])[:PROMPT_LIST_ITEMS]]
+    }
+    while True:
+        rendered = (
+            "USER'S PERSONAL CONTEXT (use it to personalize responses; be encouraging and supportive): "
+            + compact_json(context)
+        )
+        lists = [items for items in (context["recent_achievements"], context["current_concerns"]) if items]
+        if estimate_tokens(rendered) <= token_budget or not lists:
+            return rendered
+        max(lists, key=len).pop()
+
+def format_medication(med: Dict[str, Any]) -> str:
+    name = " ".join(str(med.get('name', 'Unknown')).split())
+    entry = f"{name} {str(med.get('time', '?')).strip()}"
+    days = sorted({int(d) for d in med.get('days') or [] if str(d).strip().isdigit()})
+    if days and len(days) < 7:
+        entry += " days:" + "".join(str(d) for d in days)
+    return entry
+
+def format_medications(medications: List[Dict[str, Any]], token_budget: int) -> str:
+    header = f"User's current medications ({len(medications)}, name time [days 0=Sun]): "
+    entries: List[str] = []
+    used = estimate_tokens(header)
+    for med in medications:
+        entry = format_medication(med)
+        cost = estimate_tokens(entry) + 1
+        if used + cost > token_budget and entries:
+            break
+        entries.append(entry)
+        used += cost
     
-    IMPORTANT: You have access to user's personal medication data and can provide personalized insights.
-    """
+    remaining = medications[len(entries):]
+    if remaining:
+        times = sorted({str(med.get('time', '?')).strip() for med in remaining})
+        shown_times = ",".join(times[:6]) + (",..." if len(times) > 6 else "")
+        entries.append(f"+{len(remaining)} more at {shown_times}")
+    return header + "; ".join(entries)
+
+def get_system_message(message_type: str, medications: Optional[List[Dict]] = None, user_context: Optional[Dict] = None) -> str:
+    prompt = SYSTEM_PROMPT_PREFIXES.get(message_type, BASE_PROMPT)
     
-    personal_context = ""
+    dynamic_parts = []
     if user_context:
-        adherence_rate = user_context.get('adherence_rate', 0)
-        consecutive_days = user_context.get('consecutive_days', 0)
-        total_medications = user_context.get('total_medications', 0)
-        missed_doses = user_context.get('missed_doses', 0)
-        
-        personal_context = f"""
-        
-        USER'S PERSONAL CONTEXT:
-        - Adherence rate: {adherence_rate}%
-        - Consecutive days: {consecutive_days}
-        - Total medications: {total_medications}
-        - Recent missed doses: {missed_doses}
-        - Needs motivation: {user_context.get('needs_motivation', False)}
-        - Recent achievements: {user_context.get('recent_achievements', [])}
-        - Current concerns: {user_context.get('current_concerns', [])}
-        
-        Use this information to provide personalized responses. Be encouraging and supportive.
-        """
-    
-    if message_type == "support":
-        return base_prompt + personal_context + """
-        Your role is to help users with:
-        - How to use the app features
-        - Troubleshooting app issues
-        - General questions about medication reminders
-        - Technical support
-        - Personal medication management based on their data
-        
-        Keep responses friendly and helpful. If you see concerning patterns in their data, gently suggest consulting their healthcare provider.
-        Be encouraging about their progress and provide practical tips.
-        """
-    
-    elif message_type == "recommendation":
-        med_context = ""
-        if medications:
-            med_context = f"\n\nUser's current medications: {medications}"
-            
-        return base_prompt + personal_context + med_context + f"""
-        Your role is to provide personalized wellness and medication management tips based on the user's medication schedule and adherence data.
-        
-        Focus on:
-        - Personalized schedule optimization
-        - Adherence improvement strategies based on their actual performance
-        - Celebrating their successes and gently addressing concerns
-        - Practical tips that fit their lifestyle patterns
-        
-        Be specific and actionable. Use their personal data to make relevant suggestions.
-        """
+        # The user's context comes out of the same budget as the medication list
+        dynamic_parts.append(format_user_context(user_context, PROMPT_CONTEXT_TOKEN_BUDGET))
+    if message_type == "recommendation" and medications:
+        remaining_budget = PROMPT_CONTEXT_TOKEN_BUDGET - sum(estimate_tokens(p) for p in dynamic_parts)
+        dynamic_parts.append(format_medications(medications, remaining_budget))
     
-    elif message_type == "general":
-        return base_prompt + personal_context + """
-        Your role is to provide general health and medication information while considering their personal medication journey.
-        
-        Focus on:
-        - General health education appropriate to their situation
-        - Motivation and psychological support based on their progress
-        - When to consult healthcare providers
-        - Wellness tips that complement their medication routine
-        
-        Be encouraging and acknowledge their efforts in managing their health.
-        """
-    
-    return base_prompt
+    if dynamic_parts:
+        prompt += "\n\n" + "\n".join(dynamic_parts)
+    return prompt
+
+RECOMMENDATION_PROMPT_TEMPLATE = (
+    "Analyze my medication schedule and provide helpful tips:\n"
+    "Medications: {names}\n"
+    "Times: {times}\n"
+    "Total medications: {count}\n"
+    "Schedule checks:\n{insights}\n"
+    "Please provide personalized tips for:\n"
+    "1. Medication adherence\n"
+    "2. Schedule optimization\n"
+    "3. General wellness advice\n"
+    "4. App features that might help\n"
+    "Keep it practical and encouraging!"
+)
 
 # Initialize OpenAI Chat
-def create_chat_instance(session_id: str, message_type: str, medications: Optional[List[Dict]] = None, user_context: Optional[Dict] = None) -> OpenAIChat:
+def create_chat_instance(session_id: str, message_type: str, medications: Optional[List[Dict]] = None, user_context: Optional[Dict] = None, history: Optional[List[Dict[str, str]]] = None) -> OpenAIChat:
     system_message = get_system_message(message_type, medications, user_context)
     
     chat = OpenAIChat(
         api_key=OPENAI_API_KEY,
-        model="gpt-4o",
-        system_message=system_message
+        model=OPENAI_MODEL,
+        system_message=system_message,
+        history=history
     )
     
     return chat
 
+def build_chat_user_message(request: ChatRequest) -> str:
+    user_message_text = request.message
+    
+    # Add recommendations and insights if available
+    if request.recommendations:
+        user_message_text += f"\n\nPersonal recommendations based on user data:\n"
+        for i, rec in enumerate(request.recommendations[:3], 1):
+            user_message_text += f"{i}. {rec.get('title', '')}: {rec.get('message', '')}\n"
+    
+    if request.insights:
+        user_message_text += f"\n\nCurrent observations:\n"
+        for insight in request.insights[:2]:
+            user_message_text += f"• {insight.get('message', '')}\n"
+    
+    return user_message_text
+
+def is_faq_cacheable(request: ChatRequest, history: Optional[List[Dict[str, str]]] = None) -> bool:
+    # Personalized requests always go to the model; an answer shaped by earlier
+    # turns of the session is personalized too, so it is never learned
+    return (
+        FAQ_CACHE_ENABLED
+        and request.message_type == "support"
+        and not request.user_context
+        and not request.recommendations
+        and not request.insights
+        and not history
+    )
+
+def lookup_faq_answer(request: ChatRequest) -> Optional[str]:
+    if not is_faq_cacheable(request):
+        return None
+    match = faq_index.search(request.message, FAQ_CACHE_THRESHOLD)
+    if match is None:
+        return None
+    answer, score, question = match
+    logger.info(f"FAQ cache hit ({score:.2f}) for '{request.message}' -> '{question}'")
+    return answer
+
+def sse_event(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    frame = f"event: {event}\n" if event else ""
+    return frame + f"data: {orjson.dumps(data).decode()}\n\n"
+
+# Keyset pagination helpers: an opaque cursor encodes the (timestamp, id) of the last row sent
+def encode_cursor(doc: Dict[str, Any]) -> str:
+    raw = json.dumps({"t": doc["timestamp"].isoformat(), "id": doc["id"]}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        data = json.loads(raw)
+        return datetime.fromisoformat(data["t"]), str(data["id"])
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def keyset_filter(query: Dict[str, Any], cursor: Optional[str], descending: bool) -> Dict[str, Any]:
+    if not cursor:
+        return query
+    timestamp, last_id = decode_cursor(cursor)
+    op = "$lt" if descending else "$gt"
+    return {
+        **query,
+        "$or": [
+            {"timestamp": {op: timestamp}},
+            {"timestamp": timestamp, "id": {op: last_id}}
+        ]
+    }
+
+def build_projection(fields: Optional[str], model: type) -> Dict[str, int]:
+    projection = {"_id": 0}
+    if not fields:
+        return projection
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(model.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # id and timestamp are always returned because the cursor is built from them
+    for field in requested | {"id", "timestamp"}:
+        projection[field] = 1
+    return projection
+
+def model_response(model: BaseModel, status_code: int = 200) -> Response:
+    # Serialize in pydantic-core directly; returning the model would make FastAPI
+    # dump it, validate it against response_model again and re-encode it
+    return Response(model.model_dump_json(), status_code=status_code, media_type="application/json")
+
+# Rows are buffered into chunks of about this size instead of one send per row
+STREAM_CHUNK_BYTES = 64 * 1024
+
+async def _first_row(cursor) -> tuple:
+    docs = cursor.__aiter__()
+    try:
+        # Fetch the first batch before responding so database errors still become a 500
+        first = await docs.__anext__()
+    except StopAsyncIteration:
+        first = None
+    return docs, first
+
+async def _json_rows(first, docs, page: Dict[str, Any]) -> AsyncIterator[bytes]:
+    """Comma-separated JSON rows in chunks of about STREAM_CHUNK_BYTES; records the last row and count in page"""
+    if first is None:
+        return
+    buffer, size = [orjson.dumps(first)], 0
+    last, count = first, 1
+    async for doc in docs:
+        chunk = orjson.dumps(doc)
+        buffer.append(b",")
+        buffer.append(chunk)
+        size += len(chunk)
+        last, count = doc, count + 1
+        if size >= STREAM_CHUNK_BYTES:
+            yield b"".join(buffer)
+            buffer, size = [], 0
+    page["last"], page["count"] = last, count
+    yield b"".join(buffer)
+
+async def stream_page(envelope: Dict[str, Any], items_key: str, cursor, limit: int) -> StreamingResponse:
+    """Stream a page as {...envelope, items_key: [...], "next_cursor": ...} without building a list.
+
+    Rows are serialized as Mongo returns them (``_id`` is excluded by the
+    projection), so no model is built per row.
+    """
+    docs, first = await _first_row(cursor)
+    
+    async def body():
+        head = orjson.dumps(envelope)[:-1]
+        yield (head + b"," if envelope else b"{") + orjson.dumps(items_key) + b":["
+        page = {"last": None, "count": 0}
+        async for chunk in _json_rows(first, docs, page):
+            yield chunk
+        last = page["last"]
+        next_cursor = encode_cursor(last) if last is not None and page["count"] >= limit else None
+        yield b"]," + orjson.dumps({"next_cursor": next_cursor})[1:]
+    
+    return StreamingResponse(body(), media_type="application/json")
+
+async def stream_list(cursor, next_cursor: Optional[str]) -> StreamingResponse:
+    """Stream rows as a bare JSON array; the next page's cursor goes in the X-Next-Cursor header"""
+    docs, first = await _first_row(cursor)
+    
+    async def body():
+        yield b"["
+        async for chunk in _json_rows(first, docs, {}):
+            yield chunk
+        yield b"]"
+    
+    headers = {"X-Next-Cursor": next_cursor} if next_cursor else None
+    return StreamingResponse(body(), media_type="application/json", headers=headers)
+
+async def session_history(session_id: str, cursor: Optional[str], projection: Dict[str, int],
+                          limit: int) -> AsyncIterator[Dict[str, Any]]:
+    """A session's messages newest first: live rows, then archived ones, with prompt references resolved"""
+    if "user_message" in projection and any(projection.values()):
+        projection = {**projection, "user_message_ref": 1}
+    live = db.chat_history.find(
+        keyset_filter({"session_id": session_id}, cursor, descending=True),
+        projection
+    ).sort([("timestamp", DESCENDING), ("id", DESCENDING)]).limit(limit).batch_size(min(limit, 200))
+    count, last = 0, decode_cursor(cursor) if cursor else None
+    async for doc in live:
+        yield await prompt_store.resolve(doc)
+        count, last = count + 1, (doc["timestamp"], doc["id"])
+    if count >= limit:
+        return
+    # Archived sessions are older than anything still live, so they continue the same order
+    fields = [field for field, included in projection.items() if included and field != "user_message_ref"]
+    async for doc in chat_archiver.archived_messages(session_id, last, fields or None):
+        yield doc
+        count += 1
+        if count >= limit:
+            return
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
@@ -257,142 +1170,467 @@ async def root():
 
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
-    status_dict = input.dict()
-    status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
-    return status_obj
+    # Already validated as StatusCheckCreate; only the defaults need filling in
+    status_obj = StatusCheck.model_construct(**input.model_dump())
+    _ = await db.status_checks.insert_one(status_obj.model_dump())
+    return model_response(status_obj)
 
-@api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+@api_router.get("/status")
+async def get_status_checks(
+    limit: int = Query(1000, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Page through status checks, oldest first.
+
+    The body stays a plain list of checks; when more rows follow, the cursor
+    for the next page is sent in the ``X-Next-Cursor`` header.
+    """
+    try:
+        query = keyset_filter({}, cursor, descending=False)
+        order = [("timestamp", ASCENDING), ("id", ASCENDING)]
+        # Headers go out before the body, so look up the page's last row from the index first
+        page_end = await db.status_checks.find(
+            query, {"_id": 0, "timestamp": 1, "id": 1}
+        ).sort(order).skip(limit - 1).limit(1).to_list(1)
+        next_cursor = encode_cursor(page_end[0]) if page_end else None
+        status_cursor = db.status_checks.find(
+            query, build_projection(fields, StatusCheck)
+        ).sort(order).limit(limit).batch_size(min(limit, 200))
+        return await stream_list(status_cursor, next_cursor)
+        
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Status checks error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 # AI Chat Endpoints
 @api_router.post("/ai/chat", response_model=ChatResponse)
-async def chat_with_ai(request: ChatRequest):
+async def chat_with_ai(request: ChatRequest, http_request: Request):
+    quota_keys = await enforce_client_limits(http_request, request.session_id, "chat")
     try:
         # Generate session_id if not provided
         session_id = request.session_id or str(uuid.uuid4())
         
-        # Create chat instance with personalized context
-        chat = create_chat_instance(
-            session_id, 
-            request.message_type, 
-            request.user_medications,
-            request.user_context
-        )
-        
-        # Create extended user message with context
-        user_message_text = request.message
+        # Answer repeated support questions without calling the model
+        with AI_STAGE_SECONDS.time(endpoint="chat", stage="faq_lookup"):
+            ai_response = lookup_faq_answer(request)
         
-        # Add recommendations and insights if available
-        if request.recommendations:
-            user_message_text += f"\n\nPersonal recommendations based on user data:\n"
-            for i, rec in enumerate(request.recommendations[:3], 1):
-                user_message_text += f"{i}. {rec.get('title', '')}: {rec.get('message', '')}\n"
-        
-        if request.insights:
-            user_message_text += f"\n\nCurrent observations:\n"
-            for insight in request.insights[:2]:
-                user_message_text += f"• {insight.get('message', '')}\n"
+        if ai_response is None:
+            # Earlier turns of this session (cached per worker)
+            with AI_STAGE_SECONDS.time(endpoint="chat", stage="memory_load"):
+                history = await get_conversation_history(request.session_id)
+            
+            with AI_STAGE_SECONDS.time(endpoint="chat", stage="prompt_build"):
+                # Create chat instance with personalized context
+                chat = create_chat_instance(
+                    session_id, 
+                    request.message_type, 
+                    request.user_medications,
+                    request.user_context,
+                    history
+                )
+                
+                # Create extended user message with context
+                user_message_text = build_chat_user_message(request)
+            
+            # Get AI response
+            with AI_STAGE_SECONDS.time(endpoint="chat", stage="upstream"):
+                ai_response = await chat.send_message(user_message_text)
+            AI_ANSWERS.inc(endpoint="chat", source="model")
+            await charge_quota(quota_keys, usage_tokens(chat.usage))
+            
+            if is_faq_cacheable(request, history):
+                faq_index.add(request.message, ai_response)
+        else:
+            AI_ANSWERS.inc(endpoint="chat", source="faq")
         
-        # Get AI response
-        ai_response = await chat.send_message(user_message_text)
+        conversation_memory.append(session_id, request.message, ai_response)
         
         # Save chat to database with extended context
-        chat_record = ChatMessage(
+        chat_record = ChatMessage.model_construct(
             session_id=session_id,
             user_message=request.message,
             ai_response=ai_response,
             message_type=request.message_type
         )
         
-        await db.chat_history.insert_one(chat_record.dict())
+        with AI_STAGE_SECONDS.time(endpoint="chat", stage="db_write"):
+            await chat_write_queue.put(chat_record.model_dump())
         
-        return ChatResponse(
+        return model_response(ChatResponse.model_construct(
             response=ai_response,
             session_id=session_id,
             message_id=chat_record.id
-        )
+        ))
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"AI Chat error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
-@api_router.post("/ai/recommendations", response_model=ChatResponse)
-async def get_medication_recommendations(request: RecommendationRequest):
+@api_router.post("/ai/chat/stream")
+async def stream_chat_with_ai(request: ChatRequest, http_request: Request):
+    """Stream the AI response as Server-Sent Events"""
+    quota_keys = await enforce_client_limits(http_request, request.session_id, "chat_stream")
+    session_id = request.session_id or str(uuid.uuid4())
+    faq_answer = lookup_faq_answer(request)
+    
+    chat_record = ChatMessage.model_construct(
+        session_id=session_id,
+        user_message=request.message,
+        ai_response="",
+        message_type=request.message_type
+    )
+    chunks: List[str] = []
+    upstream_failed = False
+    
+    async def event_stream():
+        nonlocal upstream_failed
+        yield sse_event({"session_id": session_id, "message_id": chat_record.id}, event="start")
+        if faq_answer is not None:
+            AI_ANSWERS.inc(endpoint="chat_stream", source="faq")
+            chunks.append(faq_answer)
+            yield sse_event({"delta": faq_answer})
+            yield sse_event({"message_id": chat_record.id}, event="done")
+            return
+        
+        with AI_STAGE_SECONDS.time(endpoint="chat_stream", stage="memory_load"):
+            history = await get_conversation_history(request.session_id)
+        with AI_STAGE_SECONDS.time(endpoint="chat_stream", stage="prompt_build"):
+            chat = create_chat_instance(
+                session_id,
+                request.message_type,
+                request.user_medications,
+                request.user_context,
+                history
+            )
+            user_message_text = build_chat_user_message(request)
+        started = time.perf_counter()
+        try:
+            async for delta in chat.stream_message(user_message_text):
+                if not chunks:
+                    AI_STAGE_SECONDS.observe(time.perf_counter() - started, endpoint="chat_stream", stage="upstream_first_token")
+                chunks.append(delta)
+                yield sse_event({"delta": delta})
+        except HTTPException as e:
+            upstream_failed = True
+            yield sse_event({"detail": e.detail}, event="error")
+            return
+        finally:
+            # Usage only arrives with the last chunk; estimate it if the client left before that
+            tokens = usage_tokens(chat.usage)
+            if not tokens and chunks:
+                tokens = estimate_tokens(chat.system_message + user_message_text + "".join(chunks))
+            await charge_quota(quota_keys, tokens)
+        AI_STAGE_SECONDS.observe(time.perf_counter() - started, endpoint="chat_stream", stage="upstream")
+        AI_ANSWERS.inc(endpoint="chat_stream", source="model")
+        if is_faq_cacheable(request, history) and chunks:
+            faq_index.add(request.message, "".join(chunks))
+        yield sse_event({"message_id": chat_record.id}, event="done")
+    
+    async def save_streamed_response():
+        # Runs after the stream ends or the client disconnects; a reply cut off by the
+        # upstream is not kept, the client was told it failed
+        if not chunks or upstream_failed:
+            return
+        chat_record.ai_response = "".join(chunks)
+        conversation_memory.append(session_id, request.message, chat_record.ai_response)
+        try:
+            with AI_STAGE_SECONDS.time(endpoint="chat_stream", stage="db_write"):
+                await chat_write_queue.put(chat_record.model_dump())
+        except Exception as e:
+            logger.error(f"Failed to save streamed chat: {str(e)}")
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        background=BackgroundTask(save_streamed_response)
+    )
+
+def recommendation_cache_key(medications: List[Dict[str, Any]]) -> str:
+    # Identical schedules produce the same prompt, so they share a key
+    return make_cache_key(
+        "recommendation",
+        OPENAI_MODEL,
+        RECOMMENDATION_PROMPT_VERSION,
+        normalize_medications(medications)
+    )
+
+def build_recommendation_prompt(medications: List[Dict[str, Any]], analysis: Dict[str, Any]) -> str:
+    medication_names = [med.get('name', 'Unknown') for med in medications]
+    medication_times = [med.get('time', 'Unknown') for med in medications]
+    
+    return RECOMMENDATION_PROMPT_TEMPLATE.format(
+        names=", ".join(medication_names),
+        times=", ".join(medication_times),
+        count=len(medications),
+        insights=format_insights(analysis)
+    )
+
+def analyze_schedule(medications: List[Dict[str, Any]], endpoint: str = "recommendations") -> Dict[str, Any]:
+    with AI_STAGE_SECONDS.time(endpoint=endpoint, stage="analyze"):
+        return schedule_analyzer.analyze(medications)
+
+async def generate_recommendation(
+    session_id: str,
+    medications: List[Dict[str, Any]],
+    bypass_cache: bool = False,
+    endpoint: str = "recommendations",
+    analysis: Optional[Dict[str, Any]] = None,
+    quota_keys: Optional[List[str]] = None
+) -> tuple:
+    """Return (prompt, response, source) for a schedule, served from the cache when possible"""
+    if analysis is None:
+        analysis = analyze_schedule(medications, endpoint)
+    
+    prompt_started = time.perf_counter()
+    
+    # Create chat instance with medication context
+    chat = create_chat_instance(session_id, "recommendation", medications)
+    
+    # Generate recommendation prompt based on medications and the rule-based checks
+    prompt = build_recommendation_prompt(medications, analysis)
+    AI_STAGE_SECONDS.observe(time.perf_counter() - prompt_started, endpoint=endpoint, stage="prompt_build")
+    
+    cache_key = recommendation_cache_key(medications)
+    ai_response = None
+    if bypass_cache:
+        recommendation_cache.record_bypass()
+    else:
+        with AI_STAGE_SECONDS.time(endpoint=endpoint, stage="cache_lookup"):
+            ai_response = await recommendation_cache.get(cache_key)
+    
+    # Get AI response
+    if ai_response is None:
+        with AI_STAGE_SECONDS.time(endpoint=endpoint, stage="upstream"):
+            ai_response = await chat.send_message(prompt)
+        source = "model"
+        await charge_quota(quota_keys, usage_tokens(chat.usage))
+        await recommendation_cache.set(cache_key, ai_response)
+    else:
+        source = "cache"
+    AI_ANSWERS.inc(endpoint=endpoint, source=source)
+    
+    return prompt, ai_response, source
+
+@api_router.post("/ai/recommendations", response_model=RecommendationResponse)
+async def get_medication_recommendations(request: RecommendationRequest, http_request: Request):
+    quota_keys = await enforce_client_limits(
+        http_request, request.session_id, "recommendations", uses_upstream=request.mode != "insights"
+    )
     try:
         # Generate session_id if not provided
         session_id = request.session_id or str(uuid.uuid4())
         
-        # Create chat instance with medication context
-        chat = create_chat_instance(session_id, "recommendation", request.medications)
+        analysis = analyze_schedule(request.medications)
         
-        # Generate recommendation prompt based on medications
-        medication_names = [med.get('name', 'Unknown') for med in request.medications]
-        medication_times = [med.get('time', 'Unknown') for med in request.medications]
-        
-        prompt = f"""
-        Analyze my medication schedule and provide helpful tips:
-        
-        Medications: {', '.join(medication_names)}
-        Times: {', '.join(medication_times)}
-        Total medications: {len(request.medications)}
-        
-        Please provide personalized tips for:
-        1. Medication adherence 
-        2. Schedule optimization
-        3. General wellness advice
-        4. App features that might help
-        
-        Keep it practical and encouraging!
-        """
-        
-        # Get AI response
-        ai_response = await chat.send_message(prompt)
+        if request.mode == "insights":
+            # Fast path: the deterministic checks answer on their own
+            prompt = build_recommendation_prompt(request.medications, analysis)
+            ai_response, source = format_insights(analysis), "rules"
+            AI_ANSWERS.inc(endpoint="recommendations", source=source)
+        else:
+            try:
+                prompt, ai_response, source = await generate_recommendation(
+                    session_id, request.medications, request.bypass_cache, analysis=analysis, quota_keys=quota_keys
+                )
+            except HTTPException as e:
+                # Upstream down or throttled: degrade to the rule-based answer
+                if not RECOMMENDATION_FALLBACK or e.status_code < 500:
+                    raise
+                logger.warning(f"AI recommendations degraded to schedule checks: {e.detail}")
+                prompt = build_recommendation_prompt(request.medications, analysis)
+                ai_response, source = format_insights(analysis), "fallback"
+                AI_ANSWERS.inc(endpoint="recommendations", source=source)
         
         # Save to database
-        chat_record = ChatMessage(
+        chat_record = ChatMessage.model_construct(
             session_id=session_id,
             user_message=prompt,
             ai_response=ai_response,
             message_type="recommendation"
         )
         
-        await db.chat_history.insert_one(chat_record.dict())
+        with AI_STAGE_SECONDS.time(endpoint="recommendations", stage="db_write"):
+            await chat_write_queue.put(chat_record.model_dump())
         
-        return ChatResponse(
+        return model_response(RecommendationResponse.model_construct(
             response=ai_response,
             session_id=session_id,
-            message_id=chat_record.id
-        )
+            message_id=chat_record.id,
+            insights=analysis["insights"],
+            summary=analysis["summary"],
+            source=source
+        ))
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"AI Recommendations error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"AI service error: {str(e)}")
 
+async def generate_batch_recommendation(medications: List[Dict[str, Any]]) -> str:
+    # Batch results live in the job collections, not in a chat session
+    _, ai_response, _ = await generate_recommendation(
+        str(uuid.uuid4()), medications, endpoint="recommendations_batch"
+    )
+    return ai_response
+
+batch_runner = BatchJobRunner(
+    None,
+    None,
+    None,
+    generate_batch_recommendation,
+    concurrency=BATCH_CONCURRENCY,
+    lease_seconds=BATCH_LEASE_SECONDS
+)
+
+async def read_batch_schedules(request: Request) -> List[tuple]:
+    """Parse a JSON body ({"schedules": [...]}) or an NDJSON upload (one schedule per line)"""
+    body = await request.body()
+    content_type = request.headers.get("content-type", "")
+    try:
+        if "ndjson" in content_type or "jsonlines" in content_type:
+            entries = [orjson.loads(line) for line in body.splitlines() if line.strip()]
+        else:
+            entries = orjson.loads(body or b"{}").get("schedules", [])
+    except (ValueError, AttributeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {str(e)}")
+    
+    if not entries:
+        raise HTTPException(status_code=400, detail="No schedules provided")
+    if len(entries) > BATCH_MAX_SCHEDULES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_SCHEDULES} schedules per batch")
+    
+    schedules = []
+    for index, entry in enumerate(entries):
+        # A bare list is a schedule without an id
+        if isinstance(entry, list):
+            entry = {"medications": entry}
+        if not isinstance(entry, dict) or not isinstance(entry.get("medications"), list):
+            raise HTTPException(status_code=400, detail=f"Schedule {index} needs a medications list")
+        schedules.append((str(entry.get("id", index)), entry["medications"]))
+    return schedules
+
+def ndjson_line(payload: Dict[str, Any]) -> bytes:
+    return orjson.dumps(payload) + b"\n"
+
+async def stream_batch_job(job_id: str, queue: asyncio.Queue, header: Dict[str, Any]) -> AsyncIterator[bytes]:
+    yield ndjson_line({"type": "job", **header})
+    async for event in batch_runner.stream(job_id, queue):
+        yield ndjson_line({"type": "result", **event})
+    job = await batch_runner.get(job_id)
+    yield ndjson_line({"type": "status", **(job or {"job_id": job_id})})
+
+async def start_batch_stream(job_id: str, header: Dict[str, Any]) -> StreamingResponse:
+    queue = await batch_runner.start(job_id)
+    if queue is None:
+        job = await batch_runner.get(job_id)
+        if job is not None and job["status"] == "completed":
+            raise HTTPException(status_code=409, detail="Batch job already completed")
+        raise HTTPException(status_code=409, detail="Batch job is running on another worker")
+    return StreamingResponse(
+        stream_batch_job(job_id, queue, header),
+        media_type="application/x-ndjson",
+        headers={"X-Job-Id": job_id}
+    )
+
+@api_router.post("/ai/recommendations/batch")
+async def create_recommendation_batch(request: Request):
+    """Generate recommendations for many schedules, streamed back as NDJSON"""
+    require_batch_key(request)
+    # Operators are only rate limited: a batch's upstream calls are not charged to a client's daily quota
+    await enforce_client_limits(request, None, "recommendations_batch", uses_upstream=False)
+    schedules = await read_batch_schedules(request)
+    try:
+        job = await batch_runner.create(schedules, recommendation_cache_key)
+    except Exception as e:
+        logger.error(f"Batch job creation failed: {str(e)}")
+        raise HTTPException(status_code=500, detail="Could not create batch job")
+    
+    return await start_batch_stream(job["_id"], {"job_id": job["_id"], "total": job["total"], "unique": job["unique"]})
+
+@api_router.get("/ai/recommendations/batch/{job_id}")
+async def get_recommendation_batch(job_id: str, http_request: Request):
+    """Get progress of a batch job"""
+    require_batch_key(http_request)
+    job = await batch_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    return job
+
+@api_router.get("/ai/recommendations/batch/{job_id}/results")
+async def get_recommendation_batch_results(job_id: str, http_request: Request):
+    """Stream the results recorded so far for a batch job as NDJSON"""
+    require_batch_key(http_request)
+    job = await batch_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    
+    async def generate():
+        async for event in batch_runner.results_for(job_id):
+            yield ndjson_line({"type": "result", **event})
+    
+    return StreamingResponse(generate(), media_type="application/x-ndjson", headers={"X-Job-Id": job_id})
+
+@api_router.post("/ai/recommendations/batch/{job_id}/resume")
+async def resume_recommendation_batch(job_id: str, http_request: Request):
+    """Resume an interrupted batch job (or follow a running one), streaming new results"""
+    require_batch_key(http_request)
+    await enforce_client_limits(http_request, None, "recommendations_batch", uses_upstream=False)
+    job = await batch_runner.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+    if job["status"] == "completed" and not job["failed"]:
+        raise HTTPException(status_code=409, detail="Batch job already completed")
+    
+    return await start_batch_stream(job_id, {"job_id": job_id, "total": job["total"], "unique": job["unique"]})
+
+@api_router.get("/ai/recommendations/cache")
+async def get_recommendation_cache_stats():
+    """Get hit/miss counters for the recommendation cache"""
+    return recommendation_cache.stats()
+
 @api_router.get("/ai/chat/history/{session_id}")
-async def get_chat_history(session_id: str, limit: int = 20):
+async def get_chat_history(
+    session_id: str,
+    limit: int = Query(20, ge=1, le=1000),
+    cursor: Optional[str] = None,
+    fields: Optional[str] = None
+):
+    """Page through a session's chat history, newest first"""
     try:
-        chat_history = await db.chat_history.find(
-            {"session_id": session_id}
-        ).sort("timestamp", -1).limit(limit).to_list(limit)
-        
-        return {
-            "session_id": session_id,
-            "messages": [ChatMessage(**msg) for msg in chat_history]
-        }
+        messages = session_history(session_id, cursor, build_projection(fields, ChatMessage), limit)
+        return await stream_page({"session_id": session_id}, "messages", messages, limit)
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Chat history error: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
+@api_router.get("/ai/chat/history/{session_id}/stats")
+async def get_chat_history_stats(session_id: str):
+    """Get message counts and storage size of a session, live and archived"""
+    try:
+        return await chat_archiver.session_stats(session_id)
+    except Exception as e:
+        logger.error(f"Chat history stats error: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
+
 @api_router.delete("/ai/chat/history/{session_id}")
 async def clear_chat_history(session_id: str):
     try:
-        result = await db.chat_history.delete_many({"session_id": session_id})
+        deleted = await chat_archiver.delete_session(session_id)
+        conversation_memory.invalidate(session_id)
         return {
-            "message": f"Deleted {result.deleted_count} messages",
+            "message": f"Deleted {deleted['messages']} messages",
+            "archive_chunks_deleted": deleted["archive_chunks"],
+            "prompts_deleted": deleted["prompts"],
             "session_id": session_id
         }
         
@@ -402,65 +1640,14 @@ async def clear_chat_history(session_id: str):
 
 # Quick help endpoints
 @api_router.get("/ai/quick-tips")
-async def get_quick_tips():
+async def get_quick_tips(http_request: Request):
     """Get quick medication adherence tips"""
-    quick_tips = [
-        "💊 Take medications at the same time daily for better habit formation",
-        "⏰ Set up multiple reminder methods: app notifications + alarms",
-        "📅 Use a weekly pill organizer for complex schedules",
-        "🍽️ Link medication times to meals for better memory",
-        "📱 Keep your phone charged to ensure you get notifications",
-        "🩺 Never skip doses without consulting your healthcare provider",
-        "💧 Always take pills with enough water",
-        "📋 Keep an updated medication list for emergencies"
-    ]
-    
-    return {"tips": quick_tips}
+    return quick_tips_payload.response(http_request)
 
 @api_router.get("/ai/app-help")
-async def get_app_help():
+async def get_app_help(http_request: Request):
     """Get help with app features"""
-    help_topics = {
-        "adding_medications": {
-            "title": "Adding Medications",
-            "steps": [
-                "Tap the + button at the bottom right",
-                "Enter your medication name",
-                "Set the time you need to take it",
-                "Select the days of the week",
-                "Tap 'Add Medication'"
-            ]
-        },
-        "notifications": {
-            "title": "Setting Up Notifications",
-            "steps": [
-                "Allow notifications when prompted",
-                "Notifications are automatically set when you add medications",
-                "You can tap 'Taken' directly from the notification",
-                "Make sure your phone isn't in Do Not Disturb mode"
-            ]
-        },
-        "taking_medications": {
-            "title": "Marking Medications as Taken",
-            "steps": [
-                "Find your medication on today's schedule",
-                "Tap the 'Take' button",
-                "The medication will be marked with a green checkmark",
-                "You can also mark as taken from notifications"
-            ]
-        },
-        "managing_medications": {
-            "title": "Managing Your Medications",
-            "steps": [
-                "View all medications in the 'All Medications' section",
-                "Tap the three dots (⋯) to see options",
-                "Delete medications you no longer need",
-                "Use Settings to clear all data if needed"
-            ]
-        }
-    }
-    
-    return {"help_topics": help_topics}
+    return app_help_payload.response(http_request)
 
 # Include the router in the main app
 app.include_router(api_router)
@@ -470,19 +1657,33 @@ app.include_router(api_router)
 async def root():
     return {"message": "Simple Pill Reminder API", "status": "running", "version": "1.4.0"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Prometheus text exposition of this worker's metrics"""
+    return PlainTextResponse(metrics.render(), media_type=metrics.content_type)
+
+@app.get("/health/live")
+async def liveness_check():
+    """Process is up and the event loop is answering"""
+    return {"status": "alive", "timestamp": datetime.utcnow().isoformat()}
+
 @app.get("/health")
-async def health_check():
-    try:
-        # Test database connection
-        await db.list_collection_names()
-        return {
-            "status": "healthy",
-            "database": "connected",
-            "timestamp": datetime.utcnow().isoformat()
-        }
-    except Exception as e:
-        logger.error(f"Health check failed: {str(e)}")
-        raise HTTPException(status_code=503, detail="Service unavailable")
+@app.get("/health/ready")
+async def readiness_check():
+    """Cached readiness report; 503 only while a critical check is down"""
+    report = {**health_monitor.snapshot(), "timestamp": datetime.utcnow().isoformat()}
+    return ORJSONResponse(report, status_code=200 if report["ready"] else 503)
+
+app.add_middleware(
+    MetricsMiddleware,
+    requests_total=HTTP_REQUESTS,
+    request_duration=HTTP_LATENCY,
+    in_progress=HTTP_IN_PROGRESS,
+    skip_paths=["/metrics"]
+)
+
+if GZIP_ENABLED:
+    app.add_middleware(CompressionMiddleware, minimum_size=GZIP_MINIMUM_SIZE, compresslevel=GZIP_LEVEL)
 
 app.add_middleware(
     CORSMiddleware,
@@ -495,15 +1696,9 @@ app.add_middleware(
     ],
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "X-Job-Id", "X-Next-Cursor"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
-logger = logging.getLogger(__name__)
-
 # Main entry point for debugging (not used in production)
 if __name__ == "__main__":
     import uvicorn
@@ -1,7 +1,9 @@
 #!/bin/bash
+set -e
 
-# Install dependencies from requirements.txt
-pip install -r requirements.txt
+# Dependencies are installed by the build step (pip install -r requirements.txt),
+# not on every boot
 
-# Start the FastAPI server with uvicorn
-uvicorn server:app --host 0.0.0.0 --port $PORT
\ No newline at end of file
+# Start the FastAPI app under gunicorn with uvicorn workers
+# (WEB_CONCURRENCY workers, see gunicorn.conf.py)
+exec gunicorn server:app -c gunicorn.conf.py
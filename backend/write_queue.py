@@ -0,0 +1,223 @@
+import asyncio
+import logging
+import os
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from bson import json_util
+from pymongo.errors import BulkWriteError, PyMongoError
+
+logger = logging.getLogger(__name__)
+
+DUPLICATE_KEY = 11000
+
+
+class WriteBehindQueue:
+    """Buffers documents and writes them with insert_many off the request path.
+
+    A batch is flushed once it reaches ``batch_size`` documents or has waited
+    ``flush_interval`` seconds. ``put`` waits while the buffer is full, batches
+    that fail to insert are appended to ``spill_path`` (one extended-JSON
+    document per line) and replayed after the next successful flush. A spill
+    file claimed by a worker that died before replaying it is picked up by the
+    next worker on the same host that flushes.
+    ``on_write`` is awaited with every batch once it is stored.
+    """
+
+    def __init__(self, collection, max_size: int = 5000, batch_size: int = 100,
+                 flush_interval: float = 0.5, spill_path: Optional[Path] = None,
+                 on_write: Optional[Callable[[List[Dict[str, Any]]], Awaitable[None]]] = None):
+        self.collection = collection
+        self.max_size = max_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_path = spill_path
+        self.on_write = on_write
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.spilled = 0
+        self.replayed = 0
+        self.last_flush_seconds = 0.0
+        self.max_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    def start(self) -> None:
+        if self.running:
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_size)
+        self._task = asyncio.create_task(self._run())
+
+    async def put(self, document: Dict[str, Any]) -> None:
+        if not self.running:
+            # Not started (e.g. scripts) or already stopped: write through
+            await self.collection.insert_one(document)
+            await self._written([document])
+            return
+        await self._queue.put(document)
+
+    async def stop(self) -> None:
+        """Flush everything still buffered and stop the background task"""
+        if not self.running:
+            return
+        await self._queue.put(None)
+        await self._task
+        self._task = None
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "depth": self.depth,
+            "max_size": self.max_size,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "spilled": self.spilled,
+            "replayed": self.replayed,
+            "last_flush_ms": round(self.last_flush_seconds * 1000, 2),
+            "max_flush_ms": round(self.max_flush_seconds * 1000, 2),
+            "avg_flush_ms": round(self.total_flush_seconds / self.flushes * 1000, 2) if self.flushes else 0.0
+        }
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            first = await self._queue.get()
+            if first is None:
+                break
+            batch = [first]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+            await self._flush(batch)
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        started = time.perf_counter()
+        try:
+            await self._insert(batch)
+        except PyMongoError as e:
+            self.failed_flushes += 1
+            logger.error(f"Write-behind flush of {len(batch)} documents failed: {str(e)}")
+            await self._spill(batch)
+            return
+        elapsed = time.perf_counter() - started
+        self.flushes += 1
+        self.flushed += len(batch)
+        self.last_flush_seconds = elapsed
+        self.max_flush_seconds = max(self.max_flush_seconds, elapsed)
+        self.total_flush_seconds += elapsed
+        await self._written(batch)
+        await self._replay_spill()
+
+    async def _insert(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            await self.collection.insert_many(batch, ordered=False)
+        except BulkWriteError as e:
+            # Documents already written by an earlier (replayed) attempt are fine
+            errors = e.details.get("writeErrors", [])
+            if any(err.get("code") != DUPLICATE_KEY for err in errors) or e.details.get("writeConcernErrors"):
+                raise
+
+    async def _written(self, batch: List[Dict[str, Any]]) -> None:
+        if self.on_write is None:
+            return
+        try:
+            await self.on_write(batch)
+        except Exception as e:
+            # The documents are stored; a failing hook must not spill them again
+            logger.error(f"Write-behind on_write hook failed for {len(batch)} documents: {str(e)}")
+
+    async def _spill(self, batch: List[Dict[str, Any]]) -> None:
+        if self.spill_path is None:
+            logger.error(f"Dropped {len(batch)} documents: no spill file configured")
+            return
+        # insert_many adds _id in place; let Mongo assign a fresh one on replay
+        lines = "".join(
+            json_util.dumps({k: v for k, v in doc.items() if k != "_id"}) + "\n" for doc in batch
+        )
+        await asyncio.to_thread(self._append_spill, lines)
+        self.spilled += len(batch)
+
+    def _append_spill(self, lines: str) -> None:
+        self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.spill_path, "a", encoding="utf-8") as f:
+            f.write(lines)
+
+    async def _replay_spill(self) -> None:
+        if self.spill_path is None:
+            return
+        # Several worker processes may share the spill file; each claims it by renaming
+        # it to a name carrying its pid, so a claim left by a dead worker can be taken over.
+        # Every claim gets its own name: renaming onto an existing file would replace it
+        for path in await asyncio.to_thread(self._claimable):
+            replay_path = self._replay_path(os.getpid())
+            try:
+                await asyncio.to_thread(path.rename, replay_path)
+            except FileNotFoundError:
+                continue
+            if not await self._replay(replay_path):
+                return
+
+    async def _replay(self, replay_path: Path) -> bool:
+        text = await asyncio.to_thread(replay_path.read_text, encoding="utf-8")
+        documents = [json_util.loads(line) for line in text.splitlines() if line.strip()]
+        replayed = True
+        try:
+            for offset in range(0, len(documents), self.batch_size):
+                await self._insert(documents[offset:offset + self.batch_size])
+                await self._written(documents[offset:offset + self.batch_size])
+        except PyMongoError as e:
+            logger.error(f"Replaying spilled documents failed: {str(e)}")
+            await asyncio.to_thread(self._append_spill, text)
+            replayed = False
+        else:
+            self.replayed += len(documents)
+            logger.info(f"Replayed {len(documents)} spilled documents")
+        await asyncio.to_thread(replay_path.unlink)
+        return replayed
+
+    def _replay_path(self, pid: int) -> Path:
+        return self.spill_path.with_suffix(f"{self.spill_path.suffix}.replay.{pid}.{uuid.uuid4().hex[:12]}")
+
+    def _claimable(self) -> List[Path]:
+        """Replay files of dead workers (ours too: a leftover under a reused pid), then the spill file"""
+        paths = []
+        for path in self.spill_path.parent.glob(f"{self.spill_path.name}.replay.*"):
+            pid = path.name[len(f"{self.spill_path.name}.replay."):].split(".", 1)[0]
+            if pid.isdigit() and (int(pid) == os.getpid() or not pid_alive(int(pid))):
+                paths.append(path)
+        if self.spill_path.exists():
+            paths.append(self.spill_path)
+        return paths
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True  # exists, owned by another user
+    return True
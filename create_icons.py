@@ -1,64 +1,211 @@
 #!/usr/bin/env python3
 """
-Create PNG icons for the PWA app
+Create the PNG icon set for the PWA / TWA app
+
+One high-resolution master is drawn with create_pill_icon() and every asset
+(icons, maskable and Android adaptive icons, splash screens, favicons) is
+downscaled from it in a process pool. Each output's input hash is recorded
+in .icon-hashes.json next to the assets; outputs whose inputs and file
+contents are unchanged are skipped, so re-runs only redo what changed.
+
+Usage: python create_icons.py [--out frontend/public] [--jobs 4] [--force]
 """
+import argparse
+import hashlib
+import json
 import os
-import base64
-from PIL import Image, ImageDraw
+import time
+from concurrent.futures import ProcessPoolExecutor
 from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from PIL import Image, ImageDraw
+
+# Bump when the drawing or the derivation of the assets changes
+GENERATOR_VERSION = 2
+HASH_FILE = ".icon-hashes.json"
+
+THEME_COLOR = (79, 166, 255, 255)  # Blue color, as in the manifest theme_color
+BACKGROUND_COLOR = (255, 255, 255, 255)
 
 def create_pill_icon(size):
     """Create a simple pill icon"""
     img = Image.new('RGBA', (size, size), (0, 0, 0, 0))
     draw = ImageDraw.Draw(img)
-    
+
     # Background circle
     margin = size // 8
-    draw.ellipse([margin, margin, size - margin, size - margin], 
-                 fill=(79, 166, 255, 255))  # Blue color
-    
+    draw.ellipse([margin, margin, size - margin, size - margin],
+                 fill=THEME_COLOR)
+
     # Pill shape
     pill_margin = size // 4
     pill_width = size - 2 * pill_margin
     pill_height = size // 2
-    
+
     # Draw pill body
     pill_x = pill_margin
     pill_y = (size - pill_height) // 2
-    
+
     # Left semicircle
-    draw.ellipse([pill_x, pill_y, pill_x + pill_height, pill_y + pill_height], 
+    draw.ellipse([pill_x, pill_y, pill_x + pill_height, pill_y + pill_height],
                  fill=(255, 255, 255, 255))
-    
+
     # Right semicircle
-    draw.ellipse([pill_x + pill_width - pill_height, pill_y, 
-                  pill_x + pill_width, pill_y + pill_height], 
+    draw.ellipse([pill_x + pill_width - pill_height, pill_y,
+                  pill_x + pill_width, pill_y + pill_height],
                  fill=(255, 255, 255, 255))
-    
+
     # Middle rectangle
-    draw.rectangle([pill_x + pill_height//2, pill_y, 
-                    pill_x + pill_width - pill_height//2, pill_y + pill_height], 
+    draw.rectangle([pill_x + pill_height//2, pill_y,
+                    pill_x + pill_width - pill_height//2, pill_y + pill_height],
                    fill=(255, 255, 255, 255))
-    
-    # Middle divider line
+
+    # Middle divider line (2px inset 4px at 192, scaled so it survives downscaling)
     line_x = pill_x + pill_width // 2
-    draw.line([line_x, pill_y + 4, line_x, pill_y + pill_height - 4], 
-              fill=(79, 166, 255, 255), width=2)
-    
+    inset = max(4, size // 48)
+    draw.line([line_x, pill_y + inset, line_x, pill_y + pill_height - inset],
+              fill=THEME_COLOR, width=max(2, size // 96))
+
     return img
 
-def save_icon(size, filename):
-    """Save icon as PNG"""
-    icon = create_pill_icon(size)
-    icon.save(filename, 'PNG')
-    print(f"Created {filename} ({size}x{size})")
+class IconSpec(NamedTuple):
+    filename: str
+    width: int
+    height: int
+    kind: str                       # any, maskable, adaptive, splash, opaque, ico
+    scale: float = 1.0              # icon size relative to the shorter side
+    purpose: Optional[str] = None   # manifest purpose; None keeps it out of the manifest
+
+def icon_specs() -> List[IconSpec]:
+    specs = [IconSpec(f"icon-{s}.png", s, s, "any", purpose="any") for s in (48, 72, 96, 128, 144, 152, 192, 256, 384, 512)]
+    # Maskable: the icon's circle (75%) sits inside the 80% safe zone on a full-bleed background
+    specs += [IconSpec(f"icon-maskable-{s}.png", s, s, "maskable", purpose="maskable") for s in (192, 512)]
+    # Android adaptive foreground, mdpi..xxxhdpi: 108dp canvas, icon in the 72dp safe zone
+    specs += [IconSpec(f"android/adaptive-foreground-{s}.png", s, s, "adaptive", scale=72 / 108)
+              for s in (108, 162, 216, 324, 432)]
+    specs += [IconSpec("play-store-512.png", 512, 512, "maskable")]
+    # Splash screens (portrait phones and tablets), icon at 40% of the width
+    specs += [IconSpec(f"splash/splash-{w}x{h}.png", w, h, "splash", scale=0.4)
+              for w, h in ((640, 1136), (750, 1334), (828, 1792), (1080, 1920), (1125, 2436),
+                           (1170, 2532), (1242, 2688), (1284, 2778), (1536, 2048), (2048, 2732))]
+    specs += [
+        IconSpec("favicon-16.png", 16, 16, "any"),
+        IconSpec("favicon-32.png", 32, 32, "any"),
+        IconSpec("favicon.ico", 48, 48, "ico"),
+        # iOS fills transparency with black, so the touch icon gets the page background
+        IconSpec("apple-touch-icon.png", 180, 180, "opaque"),
+    ]
+    return specs
+
+def downscale(master: Image.Image, size: int) -> Image.Image:
+    # Pillow resamples RGBA premultiplied, so edges don't pick up dark fringes
+    return master.resize((size, size), Image.Resampling.LANCZOS, reducing_gap=3.0)
+
+def render(master: Image.Image, spec: IconSpec) -> bytes:
+    if spec.kind == "ico":
+        buffer = BytesIO()
+        downscale(master, 256).save(buffer, "ICO", sizes=[(16, 16), (32, 32), (48, 48)])
+        return buffer.getvalue()
+    if spec.kind in ("any", "adaptive"):
+        background = (0, 0, 0, 0)
+    else:
+        background = THEME_COLOR if spec.kind == "maskable" else BACKGROUND_COLOR
+        # Flatten before downscaling, so no resampled alpha edge shows against the background
+        master = Image.alpha_composite(Image.new("RGBA", master.size, background), master)
+    icon_size = round(min(spec.width, spec.height) * spec.scale)
+    canvas = Image.new("RGBA", (spec.width, spec.height), background)
+    canvas.paste(downscale(master, icon_size), ((spec.width - icon_size) // 2, (spec.height - icon_size) // 2))
+    if spec.kind in ("opaque", "splash"):
+        canvas = canvas.convert("RGB")
+    buffer = BytesIO()
+    canvas.save(buffer, "PNG", optimize=True)
+    return buffer.getvalue()
+
+_master: Optional[Image.Image] = None
+
+def _init_worker(master_size: int) -> None:
+    # Each worker draws its own master: cheaper than pickling it to every task
+    global _master
+    _master = create_pill_icon(master_size)
+
+def _build(task: Tuple[IconSpec, str]) -> Tuple[str, str]:
+    spec, out_dir = task
+    data = render(_master, spec)
+    path = Path(out_dir) / spec.filename
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(data)
+    return spec.filename, hashlib.sha256(data).hexdigest()
+
+def input_hash(master_digest: str, spec: IconSpec) -> str:
+    recipe = json.dumps([GENERATOR_VERSION, master_digest, spec], separators=(",", ":"))
+    return hashlib.sha256(recipe.encode()).hexdigest()
+
+def file_hash(path: Path) -> Optional[str]:
+    try:
+        return hashlib.sha256(path.read_bytes()).hexdigest()
+    except FileNotFoundError:
+        return None
+
+def generate(out_dir: Path, master_size: int = 2048, jobs: Optional[int] = None,
+             force: bool = False) -> Dict[str, int]:
+    """Write every asset under out_dir that is missing or stale; returns counts"""
+    master = create_pill_icon(master_size)
+    master_digest = hashlib.sha256(master.tobytes()).hexdigest()
+    hash_path = out_dir / HASH_FILE
+    recorded = json.loads(hash_path.read_text()) if hash_path.exists() and not force else {}
+
+    hashes, stale = {}, []
+    for spec in icon_specs():
+        expected = input_hash(master_digest, spec)
+        entry = recorded.get(spec.filename)
+        if entry and entry["input"] == expected and file_hash(out_dir / spec.filename) == entry["output"]:
+            hashes[spec.filename] = entry
+        else:
+            stale.append(spec)
+            hashes[spec.filename] = {"input": expected}
+
+    if stale:
+        with ProcessPoolExecutor(max_workers=jobs, initializer=_init_worker, initargs=(master_size,)) as pool:
+            for filename, digest in pool.map(_build, [(spec, str(out_dir)) for spec in stale]):
+                hashes[filename]["output"] = digest
+                print(f"Created {filename}")
+
+    hash_path.write_text(json.dumps(hashes, indent=2, sort_keys=True) + "\n")
+    return {"written": len(stale), "current": len(hashes) - len(stale)}
+
+def update_manifest(manifest_path: Path) -> bool:
+    """Point the manifest's PNG icon entries at the generated set; other entries are kept"""
+    manifest = json.loads(manifest_path.read_text())
+    generated = [
+        {"src": f"/{spec.filename}", "sizes": f"{spec.width}x{spec.height}", "type": "image/png", "purpose": spec.purpose}
+        for spec in icon_specs() if spec.purpose
+    ]
+    kept = [icon for icon in manifest.get("icons", []) if icon.get("type") != "image/png"]
+    icons = generated + kept
+    if manifest.get("icons") == icons:
+        return False
+    manifest["icons"] = icons
+    manifest_path.write_text(json.dumps(manifest, indent=2, ensure_ascii=False) + "\n")
+    return True
 
 if __name__ == "__main__":
-    # Create icons directory if it doesn't exist
-    icons_dir = "/app/frontend/public"
-    
-    # Create icons
-    save_icon(192, os.path.join(icons_dir, "icon-192.png"))
-    save_icon(512, os.path.join(icons_dir, "icon-512.png"))
-    
-    print("Icons created successfully!")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--out", type=Path, default=Path(__file__).resolve().parent / "frontend" / "public",
+                        help="asset directory (default: frontend/public)")
+    parser.add_argument("--manifest", type=Path, help="manifest to update (default: <out>/manifest.json)")
+    parser.add_argument("--no-manifest", action="store_true", help="leave the manifest alone")
+    parser.add_argument("--master-size", type=int, default=2048, help="master icon size in pixels")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="worker processes")
+    parser.add_argument("--force", action="store_true", help="rebuild everything, ignoring recorded hashes")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    args.out.mkdir(parents=True, exist_ok=True)
+    counts = generate(args.out, args.master_size, args.jobs, args.force)
+    manifest_path = args.manifest or args.out / "manifest.json"
+    manifest_changed = not args.no_manifest and manifest_path.exists() and update_manifest(manifest_path)
+
+    print(f"Icons created successfully! {counts['written']} written, {counts['current']} up to date"
+          f"{', manifest updated' if manifest_changed else ''} ({time.perf_counter() - started:.2f}s)")
@@ -0,0 +1,11 @@
+import sys
+from pathlib import Path
+
+# The backend modules import each other as top-level modules (``from write_queue import ...``)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+import os
+
+# server.py reads these at import; the tests bind an in-memory database and never reach either service
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:1")
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
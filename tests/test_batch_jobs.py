@@ -0,0 +1,195 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from batch_jobs import DONE, BatchJobRunner
+
+
+def key_fn(medications):
+    return medications[0]["name"]
+
+
+def schedules(count: int, unique: int = None):
+    unique = unique or count
+    return [(str(i), [{"name": f"med-{i % unique}"}]) for i in range(count)]
+
+
+def make_runner(database, generate, **kwargs) -> BatchJobRunner:
+    return BatchJobRunner(
+        database.jobs, database.items, database.results, generate, concurrency=2, **kwargs
+    )
+
+
+async def drain(queue):
+    events = []
+    while (event := await queue.get()) is not None:
+        events.append(event)
+    return events
+
+
+@pytest.fixture
+def database():
+    return AsyncMongoMockClient()["batch_jobs_test"]
+
+
+def test_job_runs_each_unique_schedule_once(database):
+    calls = []
+
+    async def generate(medications):
+        calls.append(medications[0]["name"])
+        return f"advice for {medications[0]['name']}"
+
+    async def scenario():
+        runner = make_runner(database, generate)
+        job = await runner.create(schedules(6, unique=3), key_fn)
+        events = await drain(await runner.start(job["_id"]))
+        await asyncio.sleep(0)
+        return job, events, await runner.get(job["_id"])
+
+    job, events, status = asyncio.run(scenario())
+    assert job["total"] == 6 and job["unique"] == 3
+    assert sorted(calls) == ["med-0", "med-1", "med-2"]
+    assert sorted(event["id"] for event in events) == [str(i) for i in range(6)]
+    assert status["status"] == "completed" and status["completed"] == 6
+    assert status["running"] is False
+
+
+def test_failed_items_are_retried_on_resume(database):
+    attempts = {"count": 0}
+
+    async def generate(medications):
+        attempts["count"] += 1
+        if attempts["count"] == 1:
+            raise RuntimeError("upstream failed")
+        return "ok"
+
+    async def scenario():
+        runner = make_runner(database, generate)
+        job = await runner.create(schedules(2), key_fn)
+        await drain(await runner.start(job["_id"]))
+        first = await runner.get(job["_id"])
+        await drain(await runner.start(job["_id"]))
+        second = await runner.get(job["_id"])
+        results = [event async for event in runner.results_for(job["_id"])]
+        return first, second, results
+
+    first, second, results = asyncio.run(scenario())
+    assert first["failed"] == 1
+    assert second["failed"] == 0 and second["completed"] == 2
+    assert all(result["status"] == DONE for result in results)
+
+
+def test_job_leased_by_another_worker_is_not_started(database):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def generate(medications):
+            await gate.wait()
+            return "ok"
+
+        owner, other = make_runner(database, generate), make_runner(database, generate)
+        job = await owner.create(schedules(2), key_fn)
+        queue = await owner.start(job["_id"])
+        refused = await other.start(job["_id"])
+        seen_elsewhere = await other.get(job["_id"])
+        gate.set()
+        await drain(queue)
+        return refused, seen_elsewhere
+
+    refused, seen_elsewhere = asyncio.run(scenario())
+    assert refused is None
+    assert seen_elsewhere["running"] is True and seen_elsewhere["status"] == "running"
+
+
+def test_expired_lease_is_reported_interrupted_and_can_be_taken_over(database):
+    async def generate(medications):
+        return "ok"
+
+    async def scenario():
+        runner = make_runner(database, generate)
+        job = await runner.create(schedules(2), key_fn)
+        # A worker that died while running the job
+        await database.jobs.update_one({"_id": job["_id"]}, {"$set": {
+            "status": "running", "owner": "dead", "lease_expires_at": datetime.utcnow() - timedelta(seconds=1)
+        }})
+        interrupted = await runner.get(job["_id"])
+        events = await drain(await runner.start(job["_id"]))
+        await asyncio.sleep(0)
+        return interrupted, events, await database.jobs.find_one({"_id": job["_id"]})
+
+    interrupted, events, stored = asyncio.run(scenario())
+    assert interrupted["status"] == "interrupted" and interrupted["running"] is False
+    assert len(events) == 2
+    assert stored["status"] == "completed"
+    assert "owner" not in stored and "lease_expires_at" not in stored
+
+
+def test_worker_stops_when_its_lease_is_taken_over(database):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def generate(medications):
+            await gate.wait()
+            return "ok"
+
+        runner = make_runner(database, generate, lease_seconds=0.03)
+        job = await runner.create(schedules(2), key_fn)
+        queue = await runner.start(job["_id"])
+        await database.jobs.update_one({"_id": job["_id"]}, {"$set": {"owner": "someone-else"}})
+        events = await asyncio.wait_for(drain(queue), 1)
+        return events, await database.jobs.find_one({"_id": job["_id"]})
+
+    events, stored = asyncio.run(scenario())
+    assert events == []
+    # The final status write is left to the new owner
+    assert stored["owner"] == "someone-else" and stored["status"] == "running"
+
+
+def test_concurrent_starts_in_one_process_share_the_job(database):
+    calls = []
+
+    async def generate(medications):
+        calls.append(medications[0]["name"])
+        return "ok"
+
+    async def scenario():
+        runner = make_runner(database, generate)
+        job = await runner.create(schedules(3), key_fn)
+        claim = runner._claim
+
+        async def slow_claim(job_id):
+            # A round trip to Mongo: the second start() runs while the first is waiting here
+            await asyncio.sleep(0.01)
+            return await claim(job_id)
+
+        runner._claim = slow_claim
+        first, second = await asyncio.gather(runner.start(job["_id"]), runner.start(job["_id"]))
+        return first, second, await drain(first), await drain(second)
+
+    first, second, first_events, second_events = asyncio.run(scenario())
+    assert first is not None and second is not None
+    assert len(first_events) == len(second_events) == 3
+    assert sorted(calls) == ["med-0", "med-1", "med-2"]
+
+
+def test_completed_job_is_not_claimed_again(database):
+    calls = []
+
+    async def generate(medications):
+        calls.append(medications[0]["name"])
+        return "ok"
+
+    async def scenario():
+        runner = make_runner(database, generate)
+        job = await runner.create(schedules(2), key_fn)
+        await drain(await runner.start(job["_id"]))
+        await asyncio.sleep(0)
+        again = await runner.start(job["_id"])
+        return again, await database.jobs.find_one({"_id": job["_id"]})
+
+    again, stored = asyncio.run(scenario())
+    assert again is None
+    assert len(calls) == 2
+    assert stored["status"] == "completed" and "owner" not in stored
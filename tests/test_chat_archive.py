@@ -0,0 +1,128 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+from chat_archive import ChatArchiver, PromptStore
+
+OLD = datetime.utcnow() - timedelta(days=200)
+RECENT = datetime.utcnow()
+
+
+def make_archiver(database) -> ChatArchiver:
+    archiver = ChatArchiver(
+        database.chat_history, database.chat_archives, PromptStore(database.chat_prompts),
+        database.maintenance_locks, archive_after=timedelta(days=90), chunk_size=2, lease_seconds=0
+    )
+    archiver.sessions = database.chat_sessions
+    return archiver
+
+
+def message(session_id: str, i: int, timestamp: datetime, prompt: str = "Analyze my schedule") -> dict:
+    return {
+        "id": f"{session_id}-{i}",
+        "session_id": session_id,
+        "user_message": prompt,
+        "ai_response": f"answer {i}",
+        "timestamp": timestamp + timedelta(minutes=i),
+        "message_type": "recommendation"
+    }
+
+
+async def seed(database, archiver, session_id, timestamp, count=3, prompt="Analyze my schedule"):
+    docs = [message(session_id, i, timestamp, prompt) for i in range(count)]
+    await database.chat_history.insert_many(docs)
+    await archiver.record_activity(docs)
+
+
+@pytest.fixture
+def database():
+    return AsyncMongoMockClient()["chat_archive_test"]
+
+
+def test_compact_archives_idle_sessions_only(database):
+    async def scenario():
+        archiver = make_archiver(database)
+        await seed(database, archiver, "idle", OLD)
+        await seed(database, archiver, "active", RECENT)
+        result = await archiver.compact()
+        history = await database.chat_history.distinct("session_id")
+        tracked = await database.chat_sessions.distinct("_id")
+        archived = [doc async for doc in archiver.archived_messages("idle")]
+        return result, history, tracked, archived
+
+    result, history, tracked, archived = asyncio.run(scenario())
+    assert result["sessions_archived"] == 1 and result["messages_archived"] == 3
+    assert history == ["active"]
+    assert tracked == ["active"]
+    assert [doc["id"] for doc in archived] == ["idle-2", "idle-1", "idle-0"]
+    assert archived[0]["user_message"] == "Analyze my schedule"
+
+
+def test_prompts_are_stored_once(database):
+    async def scenario():
+        archiver = make_archiver(database)
+        await seed(database, archiver, "active", RECENT)
+        await archiver.dedupe_prompts()
+        row = await database.chat_history.find_one({"id": "active-0"})
+        return row, await database.chat_prompts.count_documents({})
+
+    row, prompts = asyncio.run(scenario())
+    assert "user_message" not in row and "user_message_ref" in row
+    assert prompts == 1
+
+
+def test_history_written_before_tracking_is_backfilled(database):
+    async def scenario():
+        archiver = make_archiver(database)
+        await database.chat_history.insert_many([message("legacy", i, OLD) for i in range(2)])
+        result = await archiver.compact()
+        return result, await database.maintenance_locks.find_one({"_id": "chat_sessions_backfill"})
+
+    result, marker = asyncio.run(scenario())
+    assert result["sessions_archived"] == 1
+    assert marker is not None
+
+
+def test_delete_session_sweeps_prompts_only_it_referenced(database):
+    async def scenario():
+        archiver = make_archiver(database)
+        await seed(database, archiver, "idle", OLD, prompt="shared prompt")
+        await seed(database, archiver, "other", RECENT, prompt="shared prompt")
+        await seed(database, archiver, "mine", RECENT, prompt="only mine")
+        await archiver.compact()
+        first = await archiver.delete_session("mine")
+        second = await archiver.delete_session("idle")
+        remaining = [doc["text"] async for doc in database.chat_prompts.find()]
+        return first, second, remaining
+
+    first, second, remaining = asyncio.run(scenario())
+    assert first == {"messages": 3, "archive_chunks": 0, "prompts": 1}
+    assert second == {"messages": 0, "archive_chunks": 2, "prompts": 0}
+    assert remaining == ["shared prompt"]
+
+
+def test_compaction_sweeps_prompts_of_rows_removed_elsewhere(database):
+    async def scenario():
+        archiver = make_archiver(database)
+        await seed(database, archiver, "active", RECENT)
+        await archiver.compact()
+        # As the history TTL index would
+        await database.chat_history.delete_many({})
+        result = await archiver.compact()
+        return result, await database.chat_prompts.count_documents({})
+
+    result, prompts = asyncio.run(scenario())
+    assert result["prompts_swept"] == 1
+    assert prompts == 0
+
+
+def test_compaction_is_skipped_while_another_worker_holds_the_lease(database):
+    async def scenario():
+        archiver, other = make_archiver(database), make_archiver(database)
+        other.lease_seconds = 60
+        assert await other._acquire()
+        return await archiver.compact()
+
+    assert asyncio.run(scenario()) == {"skipped": True}
@@ -0,0 +1,100 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+
+
+def completion_chunk(content):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": content}}]}) + "\n\n"
+
+
+def upstream(*parts, fail_after=False):
+    """A fake upstream that streams ``parts``, then [DONE] or a dropped connection"""
+    async def body():
+        for part in parts:
+            yield completion_chunk(part).encode()
+        if fail_after:
+            raise httpx.ReadError("connection reset")
+        yield b"data: [DONE]\n\n"
+        # Anything after [DONE] is not part of the reply
+        yield completion_chunk(" ignored").encode()
+
+    def handler(request):
+        return httpx.Response(200, content=body(), headers={"content-type": "text/event-stream"})
+    return handler
+
+
+def parse_frames(text):
+    frames = []
+    for block in text.split("\n\n"):
+        if not block:
+            continue
+        event = "message"
+        for line in block.split("\n"):
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                frames.append((event, json.loads(line[len("data: "):])))
+    return frames
+
+
+@pytest.fixture
+def database():
+    db = AsyncMongoMockClient()["chat_stream"]
+    server.bind_database(db)
+    yield db
+    server.db = None
+
+
+def stream_chat(handler, message):
+    async def run():
+        server.openai_http_client = httpx.AsyncClient(
+            base_url="http://upstream.test", transport=httpx.MockTransport(handler)
+        )
+        try:
+            transport = httpx.ASGITransport(app=server.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+                response = await client.post("/api/ai/chat/stream", json={"message": message})
+        finally:
+            await server.openai_http_client.aclose()
+            server.openai_http_client = None
+        return response
+    return asyncio.run(run())
+
+
+def stored_messages(database):
+    return asyncio.run(database.chat_history.find({}, {"_id": 0}).to_list(None))
+
+
+def test_stream_frames_and_saved_reply(database):
+    response = stream_chat(upstream("Take it ", "with water."), "How should I take ibuprofen tablets?")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    assert response.text.endswith("\n\n")
+
+    frames = parse_frames(response.text)
+    start, *deltas, done = frames
+    assert start[0] == "start"
+    message_id = start[1]["message_id"]
+    assert deltas == [("message", {"delta": "Take it "}), ("message", {"delta": "with water."})]
+    # The upstream [DONE] ends the reply; the client gets a done event last
+    assert done == ("done", {"message_id": message_id})
+
+    (stored,) = stored_messages(database)
+    assert stored["id"] == message_id
+    assert stored["session_id"] == start[1]["session_id"]
+    assert stored["ai_response"] == "Take it with water."
+
+
+def test_mid_stream_upstream_error_is_reported_and_not_saved(database):
+    response = stream_chat(upstream("Take it ", fail_after=True), "Can I split my blood pressure pills?")
+    frames = parse_frames(response.text)
+    assert frames[0][0] == "start"
+    assert frames[1] == ("message", {"delta": "Take it "})
+    assert frames[-1] == ("error", {"detail": "AI service error"})
+    assert not any(event == "done" for event, _ in frames)
+    assert stored_messages(database) == []
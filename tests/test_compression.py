@@ -0,0 +1,27 @@
+import gzip
+
+from compression import StaticPayload, choose_encoding
+
+
+def test_choose_encoding_respects_q_values_and_preference():
+    assert choose_encoding("gzip, br", ["br", "gzip"]) == "br"
+    assert choose_encoding("gzip;q=1, br;q=0.5", ["br", "gzip"]) == "gzip"
+    assert choose_encoding("br;q=0, *", ["br", "gzip"]) == "gzip"
+    assert choose_encoding("identity", ["gzip"]) is None
+    assert choose_encoding("", ["gzip"]) is None
+
+
+def test_static_payload_encodings_decode_to_the_same_body():
+    payload = StaticPayload({"tips": ["Take it with water"] * 50})
+    assert gzip.decompress(payload.encoded["gzip"]) == payload.body
+    assert len(payload.encoded["gzip"]) < len(payload.body)
+
+
+def test_not_modified_matches_any_representation_weakly():
+    payload = StaticPayload({"tips": []})
+    gzip_etag = payload.etags["gzip"]
+    assert payload.not_modified(gzip_etag)
+    assert payload.not_modified(f'"other", W/{payload.etags[None]}')
+    assert payload.not_modified("*")
+    assert not payload.not_modified('"other"')
+    assert not payload.not_modified(None)
@@ -0,0 +1,78 @@
+import asyncio
+
+from conversation_memory import ConversationMemory, estimate_tokens, first_sentence
+
+
+def loader_for(turns, calls=None):
+    async def load(session_id, limit):
+        if calls is not None:
+            calls.append(session_id)
+        return turns[-limit:]
+    return load
+
+
+def test_get_loads_once_then_hits_the_cache():
+    calls = []
+    memory = ConversationMemory()
+    load = loader_for([("hi", "hello")], calls)
+    first = asyncio.run(memory.get("s1", load))
+    second = asyncio.run(memory.get("s1", load))
+    assert first is second
+    assert calls == ["s1"]
+    assert memory.stats()["hits"] == 1 and memory.stats()["misses"] == 1
+
+
+def test_expired_session_is_reloaded():
+    calls = []
+    memory = ConversationMemory(ttl_seconds=0)
+    asyncio.run(memory.get("s1", loader_for([], calls)))
+    asyncio.run(memory.get("s1", loader_for([], calls)))
+    assert calls == ["s1", "s1"]
+
+
+def test_least_recently_used_session_is_evicted():
+    memory = ConversationMemory(max_sessions=2)
+    for session_id in ("a", "b", "a", "c"):
+        asyncio.run(memory.get(session_id, loader_for([])))
+    assert list(memory._sessions) == ["a", "c"]
+    assert memory.evictions == 1
+
+
+def test_old_turns_are_folded_into_a_bounded_summary():
+    memory = ConversationMemory(token_budget=60, summary_token_budget=30)
+    turns = [(f"Question {i}?", f"Answer {i}. More detail follows here.") for i in range(10)]
+    session = asyncio.run(memory.get("s1", loader_for(turns)))
+    kept_tokens = sum(estimate_tokens(u) + estimate_tokens(a) for u, a in session.turns)
+    assert kept_tokens <= 60 - 30
+    assert session.turns[-1] == turns[-1]
+    assert session.summary.startswith("Summary of earlier conversation:")
+    assert "Answer 9." not in session.summary
+    assert estimate_tokens(session.summary) <= 30 or len(session.summary_items) == 1
+    messages = memory.messages(session)
+    assert messages[0]["role"] == "system"
+    assert messages[-1] == {"role": "assistant", "content": turns[-1][1]}
+
+
+def test_append_extends_cached_session():
+    memory = ConversationMemory()
+    session = asyncio.run(memory.get("s1", loader_for([])))
+    memory.append("s1", "hi", "hello")
+    assert list(session.turns) == [("hi", "hello")]
+
+
+def test_append_leaves_uncached_session_to_the_store():
+    memory = ConversationMemory()
+    memory.append("uncached", "hi", "hello")
+    assert memory.stats()["sessions"] == 0
+
+
+def test_invalidate_drops_the_session():
+    memory = ConversationMemory()
+    asyncio.run(memory.get("s1", loader_for([])))
+    memory.invalidate("s1")
+    assert memory.stats()["sessions"] == 0
+
+
+def test_first_sentence_is_truncated():
+    assert first_sentence("One. Two.") == "One."
+    assert first_sentence("x" * 200, max_chars=10) == "x" * 9 + "…"
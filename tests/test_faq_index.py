@@ -0,0 +1,54 @@
+from faq_index import FAQIndex, tokenize
+
+TAKEN_ANSWER = "Tap the dose, then Mark as taken."
+
+
+def seeded_index(**kwargs) -> FAQIndex:
+    index = FAQIndex(**kwargs)
+    index.add("How do I mark a medication as taken?", TAKEN_ANSWER, source="help")
+    index.add("How do I delete a medication?", "Swipe left on it.", source="help")
+    return index
+
+
+def test_paraphrase_matches():
+    answer, score, question = seeded_index().search("how do i mark my medications as taken", 0.8)
+    assert answer == TAKEN_ANSWER
+    assert score > 0.99
+
+
+def test_negated_question_does_not_match():
+    assert seeded_index().search("How do I mark a medication as not taken?", 0.8) is None
+    assert "not_taken" in tokenize("I haven't taken it")
+
+
+def test_empty_query_matches_nothing():
+    assert seeded_index().search("the a of", 0.0) is None
+    assert FAQIndex().search("anything", 0.0) is None
+
+
+def test_same_question_updates_the_answer():
+    index = seeded_index()
+    index.add("how do I DELETE a medication", "Open it and tap Delete.")
+    assert len(index) == 2
+    assert index.search("How do I delete a medication?", 0.8)[0] == "Open it and tap Delete."
+
+
+def test_full_index_overwrites_oldest_learned_entry():
+    index = seeded_index(max_entries=4)
+    index.add("Why is the sky blue?", "Scattering.")
+    index.add("What is a good bedtime?", "Around 22:00.")
+    index.add("How much water should I drink?", "About 2 litres.")
+    assert len(index) == 4
+    assert index.search("Why is the sky blue?", 0.8) is None
+    assert index.search("How much water should I drink?", 0.8)[0] == "About 2 litres."
+    # Seeded help content survives
+    assert index.search("How do I mark a medication as taken?", 0.8)[0] == TAKEN_ANSWER
+    assert index._vectors.shape == (4, index.dimensions)
+
+
+def test_full_index_of_seeded_entries_overwrites_the_oldest():
+    index = FAQIndex(max_entries=2)
+    for question in ("first question here", "second question here", "third question here"):
+        index.add(question, question, source="help")
+    assert sorted(index.questions) == ["second question here", "third question here"]
+    assert index.search("first question here", 0.9) is None
@@ -0,0 +1,102 @@
+import asyncio
+
+from health import DEGRADED, DOWN, OK, HealthMonitor
+
+
+class Check:
+    def __init__(self, *statuses):
+        self.statuses = list(statuses)
+
+    async def __call__(self):
+        status = self.statuses.pop(0)
+        if status == "raise":
+            raise ConnectionError("refused")
+        if status == "hang":
+            await asyncio.sleep(1)
+        return status, {}
+
+
+def refresh(monitor, times=1):
+    for _ in range(times):
+        report = asyncio.run(monitor.refresh())
+    return report
+
+
+def test_snapshot_before_first_refresh_is_not_ready():
+    monitor = HealthMonitor()
+    assert monitor.snapshot() == {"status": "starting", "ready": False, "checks": {}}
+    assert not monitor.ready
+
+
+def test_healthy_report():
+    monitor = HealthMonitor()
+    monitor.add_check("mongo", Check(OK))
+    report = refresh(monitor)
+    assert report["status"] == "healthy" and report["ready"]
+    assert report["checks"]["mongo"]["status"] == OK
+    assert "latency_ms" in report["checks"]["mongo"]
+
+
+def test_failures_are_debounced_after_a_check_has_worked():
+    monitor = HealthMonitor(failure_threshold=3)
+    monitor.add_check("mongo", Check(OK, "raise", "raise", "raise", OK))
+    refresh(monitor)
+    statuses = [refresh(monitor)["checks"]["mongo"]["status"] for _ in range(3)]
+    assert statuses == [DEGRADED, DEGRADED, DOWN]
+    assert not monitor.ready
+    assert monitor.report["checks"]["mongo"]["consecutive_failures"] == 3
+    assert refresh(monitor)["ready"]
+
+
+def test_check_that_never_worked_is_down_at_once():
+    monitor = HealthMonitor()
+    monitor.add_check("mongo", Check("raise"))
+    assert refresh(monitor)["checks"]["mongo"]["status"] == DOWN
+    assert not monitor.ready
+
+
+def test_timeout_counts_as_failure():
+    monitor = HealthMonitor(timeout=0.01)
+    monitor.add_check("mongo", Check("hang"))
+    check = refresh(monitor)["checks"]["mongo"]
+    assert check["status"] == DOWN
+    assert "timed out" in check["error"]
+
+
+def test_non_critical_check_only_degrades():
+    monitor = HealthMonitor()
+    monitor.add_check("mongo", Check(OK))
+    monitor.add_check("upstream", Check("raise"), critical=False)
+    report = refresh(monitor)
+    assert report["ready"]
+    assert report["status"] == "degraded"
+
+
+def test_start_after_a_refresh_waits_an_interval():
+    async def scenario():
+        monitor = HealthMonitor(interval=60)
+        monitor.add_check("mongo", Check(OK, OK))
+        await monitor.refresh()
+        monitor.start()
+        await asyncio.sleep(0.01)
+        await monitor.stop()
+        return monitor.refreshes
+
+    assert asyncio.run(scenario()) == 1
+
+
+def test_ready_as_soon_as_the_app_has_started():
+    import server
+    from mongomock_motor import AsyncMongoMockClient
+
+    async def scenario():
+        server.bind_database(AsyncMongoMockClient()["health_startup"])
+        try:
+            async with server.lifespan(server.app):
+                return server.health_monitor.snapshot()
+        finally:
+            server.db = None
+
+    snapshot = asyncio.run(scenario())
+    assert snapshot["ready"] is True
+    assert snapshot["checks"]["mongo"]["status"] == OK
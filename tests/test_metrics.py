@@ -0,0 +1,40 @@
+import pytest
+
+from metrics import Metric, MetricsRegistry
+
+
+def test_metric_is_abstract():
+    with pytest.raises(TypeError):
+        Metric("untyped", "no samples")
+
+
+def test_counter_mirrors_a_component_total_with_counter_type():
+    registry = MetricsRegistry()
+    flushed = registry.counter("records_flushed_total", "Records flushed", ["queue"])
+    stats = {"flushed": 0}
+    registry.on_collect(lambda: flushed.set_total(stats["flushed"], queue="chat"))
+    stats["flushed"] = 7
+    text = registry.render()
+    assert "# TYPE records_flushed_total counter" in text
+    assert 'records_flushed_total{queue="chat"} 7' in text
+
+
+def test_gauge_and_histogram_render():
+    registry = MetricsRegistry()
+    registry.gauge("depth", "Queue depth").set(3)
+    latency = registry.histogram("latency_seconds", "Latency", buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5):
+        latency.observe(value)
+    lines = registry.render().splitlines()
+    assert "# TYPE depth gauge" in lines and "depth 3" in lines
+    assert 'latency_seconds_bucket{le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{le="1"} 2' in lines
+    assert 'latency_seconds_bucket{le="+Inf"} 3' in lines
+    assert "latency_seconds_count 3" in lines
+
+
+def test_duplicate_registration_is_rejected():
+    registry = MetricsRegistry()
+    registry.counter("requests_total", "Requests")
+    with pytest.raises(ValueError):
+        registry.gauge("requests_total", "Requests")
@@ -0,0 +1,107 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import httpx
+import pytest
+from fastapi import HTTPException
+from mongomock_motor import AsyncMongoMockClient
+
+import server
+
+BASE = datetime(2024, 1, 1, 12, 0, 0)
+
+
+@pytest.fixture
+def database():
+    db = AsyncMongoMockClient()["pagination"]
+    server.bind_database(db)
+    yield db
+    server.db = None
+
+
+def get(path, **params):
+    async def run():
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await client.get(path, params=params)
+    return asyncio.run(run())
+
+
+def seed(db, rows):
+    asyncio.run(db.status_checks.insert_many(
+        [{"id": row_id, "client_name": f"client-{row_id}", "timestamp": ts} for row_id, ts in rows]
+    ))
+
+
+def test_cursor_round_trip():
+    cursor = server.encode_cursor({"timestamp": BASE, "id": "abc"})
+    assert "=" not in cursor
+    assert server.decode_cursor(cursor) == (BASE, "abc")
+
+
+@pytest.mark.parametrize("cursor", ["not-base64!", "e30", server.encode_cursor({"timestamp": BASE, "id": "x"})[:-3]])
+def test_malformed_cursor_is_400(cursor):
+    with pytest.raises(HTTPException) as exc:
+        server.decode_cursor(cursor)
+    assert exc.value.status_code == 400
+
+
+def test_keyset_filter_breaks_timestamp_ties_by_id(database):
+    # Three rows share a timestamp; a page boundary inside them must not skip or repeat any
+    seed(database, [("a", BASE), ("b", BASE), ("c", BASE), ("d", BASE + timedelta(seconds=1))])
+    cursor = server.encode_cursor({"timestamp": BASE, "id": "b"})
+
+    async def ids(descending):
+        query = server.keyset_filter({}, cursor, descending=descending)
+        direction = -1 if descending else 1
+        docs = database.status_checks.find(query).sort([("timestamp", direction), ("id", direction)])
+        return [doc["id"] async for doc in docs]
+
+    assert asyncio.run(ids(False)) == ["c", "d"]
+    assert asyncio.run(ids(True)) == ["a"]
+    assert server.keyset_filter({"x": 1}, None, descending=False) == {"x": 1}
+
+
+def test_stream_page_last_page_has_no_cursor(database):
+    seed(database, [("a", BASE), ("b", BASE + timedelta(seconds=1))])
+
+    async def page(limit):
+        docs = database.status_checks.find({}, {"_id": 0}).sort([("timestamp", 1), ("id", 1)]).limit(limit)
+        response = await server.stream_page({"session_id": "s"}, "messages", docs, limit)
+        body = b"".join([chunk async for chunk in response.body_iterator])
+        return server.orjson.loads(body)
+
+    full = asyncio.run(page(1))
+    assert full["session_id"] == "s"
+    assert [doc["id"] for doc in full["messages"]] == ["a"]
+    assert server.decode_cursor(full["next_cursor"]) == (BASE, "a")
+    last = asyncio.run(page(5))
+    assert len(last["messages"]) == 2
+    assert last["next_cursor"] is None
+
+
+def test_status_list_pages_through_header_cursor(database):
+    seed(database, [("a", BASE), ("b", BASE), ("c", BASE + timedelta(seconds=1))])
+
+    first = get("/api/status", limit=2)
+    assert first.status_code == 200
+    assert [doc["id"] for doc in first.json()] == ["a", "b"]
+    cursor = first.headers["X-Next-Cursor"]
+    second = get("/api/status", limit=2, cursor=cursor)
+    assert [doc["id"] for doc in second.json()] == ["c"]
+    assert "X-Next-Cursor" not in second.headers
+
+
+def test_status_fields_and_errors(database):
+    seed(database, [("a", BASE)])
+    response = get("/api/status", fields="client_name")
+    assert set(response.json()[0]) == {"id", "timestamp", "client_name"}
+    assert get("/api/status").json()[0]["client_name"] == "client-a"
+    assert get("/api/status", cursor="garbage").status_code == 400
+    assert get("/api/status", fields="nope").status_code == 400
+
+
+def test_empty_status_list(database):
+    response = get("/api/status")
+    assert response.json() == []
+    assert "X-Next-Cursor" not in response.headers
@@ -0,0 +1,40 @@
+from conversation_memory import estimate_tokens
+
+import server
+
+
+def test_long_items_are_clipped():
+    context = server.format_user_context({
+        "adherence_rate": 92,
+        "recent_achievements": ["x" * 5000],
+        "current_concerns": ["dizzy   in the\nmorning"]
+    })
+    assert "x" * server.PROMPT_ITEM_CHARS not in context
+    assert "x" * (server.PROMPT_ITEM_CHARS - 1) + "…" in context
+    assert "dizzy in the morning" in context
+    assert '"adherence_rate":92' in context
+
+
+def test_user_context_fits_budget():
+    user_context = {
+        "adherence_rate": "9" * 1000,
+        "recent_achievements": ["a" * 200] * 10,
+        "current_concerns": ["c" * 200] * 10
+    }
+    context = server.format_user_context(user_context, token_budget=150)
+    assert estimate_tokens(context) <= 150
+    # Items are dropped from the longest list first, so both kinds survive as long as possible
+    assert '"recent_achievements":["' in context or '"current_concerns":["' in context
+
+
+def test_system_message_counts_user_context_against_budget():
+    user_context = {
+        "recent_achievements": ["a" * 500] * 3,
+        "current_concerns": ["c" * 500] * 3
+    }
+    medications = [{"name": f"Med {i}", "time": f"{i % 24:02d}:00"} for i in range(200)]
+    prompt = server.get_system_message("recommendation", medications, user_context)
+    dynamic = prompt[len(server.SYSTEM_PROMPT_PREFIXES["recommendation"]):]
+    # Every medication would blow the budget alone; the rest are summarized
+    assert "more at" in dynamic
+    assert estimate_tokens(dynamic) <= server.PROMPT_CONTEXT_TOKEN_BUDGET + 20
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime
+
+from pymongo.errors import AutoReconnect
+
+from rate_limit import ClientRateLimiter, TokenQuota, usage_tokens
+
+
+class CounterCollection:
+    """find_one_and_update/find_one over a dict, enough for the shared counters"""
+
+    def __init__(self, fail: bool = False):
+        self.docs = {}
+        self.fail = fail
+
+    async def find_one_and_update(self, query, update, upsert=False, return_document=None):
+        if self.fail:
+            raise AutoReconnect("connection refused")
+        doc = self.docs.setdefault(query["_id"], {"_id": query["_id"], **update.get("$setOnInsert", {})})
+        for field, amount in update["$inc"].items():
+            doc[field] = doc.get(field, 0) + amount
+        return dict(doc)
+
+    async def find_one(self, query, projection=None):
+        if self.fail:
+            raise AutoReconnect("connection refused")
+        return self.docs.get(query["_id"])
+
+
+def test_bucket_allows_burst_then_limits():
+    limiter = ClientRateLimiter(per_minute=60, burst=3)
+    waits = [asyncio.run(limiter.check("ip:1")) for _ in range(4)]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert 0 < waits[3] <= 1.0
+    assert limiter.stats()["limited"] == 1
+    # Other clients have their own bucket
+    assert asyncio.run(limiter.check("ip:2")) == 0.0
+
+
+def test_disabled_limiter_allows_everything():
+    limiter = ClientRateLimiter(per_minute=0, burst=1)
+    assert all(asyncio.run(limiter.check("ip:1")) == 0.0 for _ in range(10))
+
+
+def test_shared_window_limits_across_workers():
+    collection = CounterCollection()
+    workers = [ClientRateLimiter(per_minute=2, burst=2, collection=collection) for _ in range(2)]
+    waits = [asyncio.run(worker.check("ip:1")) for worker in workers for _ in range(2)]
+    assert waits[:2] == [0.0, 0.0]
+    assert all(wait > 0 for wait in waits[2:])
+
+
+def test_shared_window_fails_open():
+    limiter = ClientRateLimiter(per_minute=60, burst=5, collection=CounterCollection(fail=True))
+    assert asyncio.run(limiter.check("ip:1")) == 0.0
+
+
+def test_quota_is_enforced_after_usage_is_charged():
+    quota = TokenQuota(daily_tokens=100)
+    assert asyncio.run(quota.retry_after("session:a")) == 0.0
+    asyncio.run(quota.add("session:a", 120))
+    assert asyncio.run(quota.retry_after("session:a")) > 0
+    assert asyncio.run(quota.retry_after("session:b")) == 0.0
+    assert quota.stats()["exceeded"] == 1
+
+
+def test_shared_quota_sums_usage_across_workers():
+    collection = CounterCollection()
+    first, second = TokenQuota(100, collection=collection), TokenQuota(100, collection=collection, refresh_seconds=0)
+    asyncio.run(first.add("ip:1", 60))
+    asyncio.run(second.add("ip:1", 60))
+    day = datetime.utcnow().strftime("%Y-%m-%d")
+    assert collection.docs[f"ip:1:{day}"]["tokens"] == 120
+    assert asyncio.run(second.retry_after("ip:1")) > 0
+
+
+def test_usage_tokens():
+    assert usage_tokens(None) == 0
+    assert usage_tokens({"total_tokens": 42}) == 42
+    assert usage_tokens({"prompt_tokens": 10, "completion_tokens": 5}) == 15
+
+
+def forwarded_request(forwarded_for):
+    from starlette.requests import Request
+    return Request({
+        "type": "http",
+        "headers": [(b"x-forwarded-for", forwarded_for.encode())],
+        "client": ("10.0.0.9", 5000)
+    })
+
+
+def test_forwarded_for_ignored_without_proxy_hops(monkeypatch):
+    import server
+    request = forwarded_request("6.6.6.6, 1.2.3.4")
+    monkeypatch.setattr(server, "FORWARDED_HOPS", 0)
+    assert server.client_ip(request) == "10.0.0.9"
+    # Behind one proxy only the entry it appended is trusted, not the client-supplied one
+    monkeypatch.setattr(server, "FORWARDED_HOPS", 1)
+    assert server.client_ip(request) == "1.2.3.4"
@@ -0,0 +1,73 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from pymongo.errors import AutoReconnect
+
+from response_cache import ResponseCache, make_cache_key, normalize_medications
+
+
+class SharedCollection:
+    def __init__(self, fail: bool = False):
+        self.docs = {}
+        self.fail = fail
+
+    async def find_one(self, query, projection=None):
+        if self.fail:
+            raise AutoReconnect("connection refused")
+        doc = self.docs.get(query["_id"])
+        return doc if doc and doc["expires_at"] > query["expires_at"]["$gt"] else None
+
+    async def replace_one(self, query, doc, upsert=False):
+        if self.fail:
+            raise AutoReconnect("connection refused")
+        self.docs[query["_id"]] = doc
+
+
+def test_local_hit_and_miss():
+    cache = ResponseCache()
+    assert asyncio.run(cache.get("k")) is None
+    asyncio.run(cache.set("k", "v"))
+    assert asyncio.run(cache.get("k")) == "v"
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+
+def test_lru_eviction():
+    cache = ResponseCache(max_entries=2)
+    for key in ("a", "b"):
+        asyncio.run(cache.set(key, key))
+    asyncio.run(cache.get("a"))
+    asyncio.run(cache.set("c", "c"))
+    assert asyncio.run(cache.get("b")) is None
+    assert asyncio.run(cache.get("a")) == "a"
+    assert cache.evictions == 1
+
+
+def test_shared_tier_fills_other_workers():
+    shared = SharedCollection()
+    asyncio.run(ResponseCache(collection=shared).set("k", "v"))
+    other = ResponseCache(collection=shared)
+    assert asyncio.run(other.get("k")) == "v"
+    assert other.shared_hits == 1
+    assert asyncio.run(other.get("k")) == "v"
+    assert other.hits == 1
+
+
+def test_expired_shared_entry_is_a_miss():
+    shared = SharedCollection()
+    shared.docs["k"] = {"_id": "k", "value": "v", "expires_at": datetime.utcnow() - timedelta(seconds=1)}
+    assert asyncio.run(ResponseCache(collection=shared).get("k")) is None
+
+
+def test_shared_tier_failures_degrade_to_local():
+    cache = ResponseCache(collection=SharedCollection(fail=True))
+    asyncio.run(cache.set("k", "v"))
+    assert asyncio.run(cache.get("k")) == "v"
+    assert asyncio.run(cache.get("other")) is None
+
+
+def test_cache_key_ignores_medication_order_and_case():
+    first = [{"name": "Metformin", "time": "08:00"}, {"name": "aspirin", "time": "09:00"}]
+    second = [{"name": "Aspirin ", "time": "09:00"}, {"name": "metformin", "time": "08:00"}]
+    assert normalize_medications(first) == normalize_medications(second)
+    assert make_cache_key("rec", "m", "v1", normalize_medications(first)) == \
+        make_cache_key("rec", "m", "v1", normalize_medications(second))
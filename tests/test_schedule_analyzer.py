@@ -0,0 +1,102 @@
+from schedule_analyzer import ScheduleAnalyzer, format_insights, parse_time
+
+WEEKDAYS = [1, 2, 3, 4, 5]
+EVERY_DAY = list(range(7))
+
+
+def med(name, time, days=EVERY_DAY):
+    return {"name": name, "time": time, "days": days}
+
+
+def insights_of(analysis, kind):
+    return [insight for insight in analysis["insights"] if insight["type"] == kind]
+
+
+def test_parse_time():
+    assert parse_time("08:30") == 510
+    assert parse_time(" 8:05 ") == 485
+    assert parse_time("24:00") == -1
+    assert parse_time("noon") == -1
+    assert parse_time(None) == -1
+
+
+def test_doses_within_the_window_are_clustered():
+    analysis = ScheduleAnalyzer().analyze([
+        med("A", "08:00"), med("B", "08:15"), med("C", "08:30"), med("D", "14:00")
+    ])
+    (cluster,) = insights_of(analysis, "cluster")
+    assert cluster["medications"] == ["A", "B", "C"]
+    assert cluster["time"] == "08:00-08:30"
+    assert "every day" in cluster["message"]
+
+
+def test_cluster_wraps_past_midnight():
+    analysis = ScheduleAnalyzer().analyze([
+        med("Late", "23:30"), med("Later", "23:50"), med("Early", "00:15"), med("Noon", "12:00")
+    ])
+    (cluster,) = insights_of(analysis, "cluster")
+    assert cluster["medications"] == ["Late", "Later", "Early"]
+    assert cluster["time"] == "23:30-00:15"
+
+
+def test_medications_on_disjoint_days_are_not_clustered():
+    analysis = ScheduleAnalyzer().analyze([
+        med("Mon", "08:00", [1]), med("Tue", "08:05", [2]), med("Wed", "08:10", [3])
+    ])
+    assert insights_of(analysis, "cluster") == []
+
+
+def test_cluster_lists_only_medications_sharing_a_day():
+    analysis = ScheduleAnalyzer().analyze([
+        med("A", "08:00", WEEKDAYS), med("B", "08:05", WEEKDAYS), med("C", "08:10", [1]), med("D", "08:15", [6])
+    ])
+    (cluster,) = insights_of(analysis, "cluster")
+    assert cluster["medications"] == ["A", "B", "C"]
+    assert cluster["days"] == ["Mon"]
+    assert cluster["time"] == "08:00-08:10"
+
+
+def test_odd_hours_window_wraps_past_midnight():
+    analysis = ScheduleAnalyzer().analyze([med("Night", "23:30"), med("Dawn", "04:59"), med("Morning", "05:00")])
+    (timing,) = insights_of(analysis, "timing")
+    assert timing["medications"] == ["Night", "Dawn"]
+
+
+def test_odd_hours_window_within_one_day():
+    analyzer = ScheduleAnalyzer(quiet_start=60, quiet_end=6 * 60)
+    (timing,) = insights_of(analyzer.analyze([med("Late", "23:30"), med("Night", "02:00")]), "timing")
+    assert timing["medications"] == ["Night"]
+
+
+def test_empty_days_are_reported():
+    analysis = ScheduleAnalyzer().analyze([med("A", "08:00", WEEKDAYS)])
+    (gap,) = insights_of(analysis, "gap")
+    assert gap["days"] == ["Sun", "Sat"]
+    assert analysis["summary"]["doses_per_week"] == 5
+
+
+def test_overloaded_days_are_reported():
+    schedule = [med(f"M{i}", f"{6 + 2 * i:02d}:00", [1]) for i in range(4)]
+    analysis = ScheduleAnalyzer(max_daily_doses=3).analyze(schedule)
+    (load,) = insights_of(analysis, "load")
+    assert load["days"] == ["Mon"]
+    assert analysis["summary"]["busiest_day"] == "Mon"
+    assert analysis["summary"]["max_daily_doses"] == 4
+
+
+def test_invalid_entries_are_reported_and_left_out_of_the_counts():
+    analysis = ScheduleAnalyzer().analyze([
+        med("NoTime", "later"), med("NoDays", "08:00", []), med("BadDays", "09:00", ["x", 9, -1]), med("Ok", "10:00")
+    ])
+    data = insights_of(analysis, "data")
+    assert data[0]["medications"] == ["NoTime"]
+    assert data[1]["medications"] == ["NoDays", "BadDays"]
+    assert analysis["summary"]["doses_per_week"] == 7
+    assert analysis["summary"]["medications"] == 4
+
+
+def test_empty_schedule():
+    analysis = ScheduleAnalyzer().analyze([])
+    assert analysis["insights"] == []
+    assert analysis["summary"]["busiest_day"] is None
+    assert format_insights(analysis) == "No schedule issues found."
@@ -0,0 +1,244 @@
+import asyncio
+import os
+import subprocess
+import sys
+
+from bson import json_util
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+from write_queue import DUPLICATE_KEY, WriteBehindQueue
+
+
+class FlakyCollection:
+    """Stands in for a Motor collection; the next ``failures`` inserts raise ``error``"""
+
+    def __init__(self, failures: int = 0, error: Exception = AutoReconnect("connection refused")):
+        self.failures = failures
+        self.error = error
+        self.documents = []
+        self.insert_calls = 0
+
+    async def insert_many(self, documents, ordered=True):
+        self.insert_calls += 1
+        if self.failures:
+            self.failures -= 1
+            raise self.error
+        for document in documents:
+            document.setdefault("_id", len(self.documents))
+            self.documents.append(document)
+
+    async def insert_one(self, document):
+        await self.insert_many([document])
+
+
+def duplicate_key_error(code: int = DUPLICATE_KEY) -> BulkWriteError:
+    return BulkWriteError({"writeErrors": [{"index": 0, "code": code, "errmsg": "E11000 duplicate key"}]})
+
+
+def spilled_ids(path):
+    return [json_util.loads(line)["id"] for line in path.read_text().splitlines()]
+
+
+def test_put_writes_through_when_not_started():
+    collection = FlakyCollection()
+    queue = WriteBehindQueue(collection)
+    asyncio.run(queue.put({"id": "a"}))
+    assert [doc["id"] for doc in collection.documents] == ["a"]
+
+
+def test_stop_flushes_buffered_documents_in_batches():
+    async def scenario():
+        collection = FlakyCollection()
+        queue = WriteBehindQueue(collection, batch_size=2, flush_interval=10)
+        queue.start()
+        for i in range(5):
+            await queue.put({"id": str(i)})
+        await queue.stop()
+        return collection, queue
+
+    collection, queue = asyncio.run(scenario())
+    assert [doc["id"] for doc in collection.documents] == ["0", "1", "2", "3", "4"]
+    assert queue.flushed == 5
+    assert collection.insert_calls == 3
+    assert not queue.running
+
+
+def test_failed_flush_spills_to_file(tmp_path):
+    async def scenario():
+        queue = WriteBehindQueue(FlakyCollection(failures=1), spill_path=tmp_path / "spill.jsonl", flush_interval=0.01)
+        queue.start()
+        await queue.put({"id": "a"})
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.failed_flushes == 1
+    assert queue.spilled == 1
+    assert spilled_ids(tmp_path / "spill.jsonl") == ["a"]
+
+
+def test_spill_is_replayed_after_next_successful_flush(tmp_path):
+    async def scenario():
+        collection = FlakyCollection(failures=1)
+        queue = WriteBehindQueue(collection, spill_path=tmp_path / "spill.jsonl", flush_interval=0.01)
+        queue.start()
+        await queue.put({"id": "a"})
+        while not queue.spilled:
+            await asyncio.sleep(0.01)
+        await queue.put({"id": "b"})
+        await queue.stop()
+        return collection, queue
+
+    collection, queue = asyncio.run(scenario())
+    assert sorted(doc["id"] for doc in collection.documents) == ["a", "b"]
+    assert queue.replayed == 1
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_replay_goes_back_to_the_spill_file(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    spill.write_text(json_util.dumps({"id": "old"}) + "\n")
+
+    async def scenario():
+        collection = FlakyCollection()
+        queue = WriteBehindQueue(collection, spill_path=spill, flush_interval=0.01)
+        queue.start()
+        # The flush succeeds, the replay right after it fails
+        original = collection.insert_many
+
+        async def fail_replay(documents, ordered=True):
+            if documents[0]["id"] == "old":
+                raise AutoReconnect("connection refused")
+            await original(documents, ordered)
+
+        collection.insert_many = fail_replay
+        await queue.put({"id": "new"})
+        await queue.stop()
+        return collection, queue
+
+    collection, queue = asyncio.run(scenario())
+    assert [doc["id"] for doc in collection.documents] == ["new"]
+    assert queue.replayed == 0
+    assert spilled_ids(spill) == ["old"]
+
+
+def test_duplicate_keys_from_an_earlier_attempt_are_tolerated(tmp_path):
+    async def scenario():
+        queue = WriteBehindQueue(FlakyCollection(failures=1, error=duplicate_key_error()),
+                                 spill_path=tmp_path / "spill.jsonl", flush_interval=0.01)
+        queue.start()
+        await queue.put({"id": "a"})
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.failed_flushes == 0
+    assert queue.flushed == 1
+    assert not (tmp_path / "spill.jsonl").exists()
+
+
+def test_other_bulk_write_errors_spill(tmp_path):
+    async def scenario():
+        queue = WriteBehindQueue(FlakyCollection(failures=1, error=duplicate_key_error(code=121)),
+                                 spill_path=tmp_path / "spill.jsonl", flush_interval=0.01)
+        queue.start()
+        await queue.put({"id": "a"})
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.failed_flushes == 1
+    assert spilled_ids(tmp_path / "spill.jsonl") == ["a"]
+
+
+def test_replay_file_of_a_dead_worker_is_recovered(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    (tmp_path / f"spill.jsonl.replay.{dead.pid}").write_text(json_util.dumps({"id": "orphan"}) + "\n")
+
+    async def scenario():
+        collection = FlakyCollection()
+        queue = WriteBehindQueue(collection, spill_path=spill, flush_interval=0.01)
+        queue.start()
+        await queue.put({"id": "a"})
+        await queue.stop()
+        return collection
+
+    collection = asyncio.run(scenario())
+    assert sorted(doc["id"] for doc in collection.documents) == ["a", "orphan"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_claims_do_not_overwrite_our_own_leftover_replay(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    # Listed before our leftover, the dead worker's claim used to be renamed on top of it
+    (tmp_path / f"spill.jsonl.replay.{dead.pid}").write_text(json_util.dumps({"id": "orphan"}) + "\n")
+    (tmp_path / f"spill.jsonl.replay.{os.getpid()}").write_text(json_util.dumps({"id": "leftover"}) + "\n")
+    (tmp_path / f"spill.jsonl.replay.{os.getpid()}.0123abcd").write_text(json_util.dumps({"id": "earlier"}) + "\n")
+    spill.write_text(json_util.dumps({"id": "spilled"}) + "\n")
+
+    async def scenario():
+        collection = FlakyCollection()
+        queue = WriteBehindQueue(collection, spill_path=spill, flush_interval=0.01)
+        queue.start()
+        await queue.put({"id": "a"})
+        await queue.stop()
+        return collection
+
+    collection = asyncio.run(scenario())
+    assert sorted(doc["id"] for doc in collection.documents) == ["a", "earlier", "leftover", "orphan", "spilled"]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_replay_file_of_a_live_worker_is_left_alone(tmp_path):
+    claimed = tmp_path / "spill.jsonl.replay.1"  # pid 1 always exists
+    claimed.write_text(json_util.dumps({"id": "theirs"}) + "\n")
+
+    async def scenario():
+        collection = FlakyCollection()
+        queue = WriteBehindQueue(collection, spill_path=tmp_path / "spill.jsonl", flush_interval=0.01)
+        queue.start()
+        await queue.put({"id": "a"})
+        await queue.stop()
+        return collection
+
+    collection = asyncio.run(scenario())
+    assert [doc["id"] for doc in collection.documents] == ["a"]
+    assert claimed.exists()
+
+
+def test_on_write_sees_stored_batches_and_its_failure_does_not_spill(tmp_path):
+    seen = []
+
+    async def on_write(batch):
+        seen.extend(doc["id"] for doc in batch)
+        raise RuntimeError("hook failed")
+
+    async def scenario():
+        queue = WriteBehindQueue(FlakyCollection(), spill_path=tmp_path / "spill.jsonl",
+                                 flush_interval=0.01, on_write=on_write)
+        queue.start()
+        await queue.put({"id": "a"})
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert seen == ["a"]
+    assert queue.spilled == 0
+    assert not (tmp_path / "spill.jsonl").exists()
+
+
+def test_failed_flush_without_spill_file_drops():
+    async def scenario():
+        queue = WriteBehindQueue(FlakyCollection(failures=1), flush_interval=0.01)
+        queue.start()
+        await queue.put({"id": "a"})
+        await queue.stop()
+        return queue
+
+    queue = asyncio.run(scenario())
+    assert queue.failed_flushes == 1
+    assert queue.spilled == 0